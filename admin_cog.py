@@ -0,0 +1,206 @@
+# admin_cog.py
+import discord
+from discord.ext import commands
+import io
+import logging
+import time
+import metrics
+import cog_handoff
+import bot_config
+import loop_watchdog
+import profiler
+import memory_tracker
+import executors
+import supervisor
+
+log = logging.getLogger(__name__)
+
+# --- Gateway intents ที่ Cog นี้ต้องใช้ (bot.py รวมจากทุก extension) ---
+# คำสั่งแบบ prefix ใน guild ต้องอ่านเนื้อหาข้อความได้
+REQUIRED_INTENTS = ('guilds', 'guild_messages', 'message_content')
+
+
+class AdminCog(commands.Cog):
+    """Diagnostic commands for the running bot (Admin only)."""
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+        log.info("AdminCog: โหลดสำเร็จ")
+
+    @commands.command(name="eventstats")
+    @commands.has_permissions(administrator=True)
+    @commands.guild_only()
+    async def event_stats(self, ctx: commands.Context):
+        """Shows how many events each listener handled vs. dropped early. (Admin only)"""
+        counts = metrics.event_counts()
+        if not counts:
+            await ctx.send("No listener events recorded yet.")
+            return
+
+        name_width = max(len("listener"), *(len(name) for name in counts))
+        lines = [f"{'listener':<{name_width}} {'handled':>10} {'dropped':>10} {'dropped %':>10}"]
+        total_handled = total_dropped = 0
+        for listener, outcome in sorted(counts.items()):
+            handled, dropped = int(outcome["handled"]), int(outcome["dropped"])
+            total_handled += handled
+            total_dropped += dropped
+            dropped_pct = 100 * dropped / (handled + dropped) if handled + dropped else 0
+            lines.append(f"{listener:<{name_width}} {handled:>10} {dropped:>10} {dropped_pct:>9.1f}%")
+        lines.append(f"{'total':<{name_width}} {total_handled:>10} {total_dropped:>10}")
+
+        enabled_intents = ", ".join(name for name, value in self.bot.intents if value)
+        await ctx.send("```\n" + "\n".join(lines) + f"\n```\nIntents: `{enabled_intents}`")
+
+    @commands.command(name="reload")
+    @commands.has_permissions(administrator=True)
+    @commands.guild_only()
+    async def reload_cog(self, ctx: commands.Context, extension: str):
+        """Reloads an extension in place, handing its in-memory state to the new instance. (Admin only)
+        Usage: !reload bidrune_cog  (หรือ !reload bidrune)
+        """
+        if extension not in self.bot.extensions and f"{extension}_cog" in self.bot.extensions:
+            extension = f"{extension}_cog"
+        if extension not in self.bot.extensions:
+            loaded = ", ".join(f"`{name}`" for name in sorted(self.bot.extensions))
+            await ctx.send(f"Extension `{extension}` is not loaded. Loaded: {loaded}")
+            return
+
+        try:
+            result = await cog_handoff.reload_with_handoff(self.bot, extension)
+        except commands.ExtensionError as e:
+            log.exception(f"AdminCog: Reload '{extension}' failed, previous version restored.")
+            await ctx.send(f"❌ Reload `{extension}` failed, previous version is still running: {e}")
+            return
+
+        handoff_note = "state handed off" if result["handed_off"] else "no state handoff"
+        await ctx.send(f"✅ Reloaded `{extension}` in {result['elapsed_ms']:.1f} ms ({handoff_note}).")
+
+    @commands.command(name="reloadconfig")
+    @commands.has_permissions(administrator=True)
+    @commands.guild_only()
+    async def reload_config(self, ctx: commands.Context):
+        """Re-reads bot_config.json and env overrides; cogs pick up the new IDs on their next event. (Admin only)"""
+        try:
+            config = bot_config.load()
+        except ValueError as e:
+            await ctx.send(f"❌ Config not reloaded, previous config is still active: {e}")
+            return
+        problems = bot_config.validate(self.bot)
+        note = f", {problems} channel(s) not found in their guild (see log)" if problems else ""
+        await ctx.send(f"✅ Config reloaded: {len(config.guilds)} guild(s), {len(config.channel_guild_index)} channel(s){note}.")
+
+    @commands.command(name="looplag")
+    @commands.has_permissions(administrator=True)
+    @commands.guild_only()
+    async def loop_lag(self, ctx: commands.Context):
+        """Shows event-loop lag and which cog/listener blocked the loop recently. (Admin only)"""
+        if not loop_watchdog.LOOP_WATCHDOG:
+            await ctx.send("Loop watchdog is disabled (LOOP_WATCHDOG=off).")
+            return
+        lag = loop_watchdog.lag_summary()
+        lines = [
+            f"Heartbeat lag (last {lag['samples']} samples): p50 {lag['p50_ms']:.1f} ms, "
+            f"p99 {lag['p99_ms']:.1f} ms, max {lag['max_ms']:.1f} ms",
+            f"Stalls > {loop_watchdog.LOOP_LAG_THRESHOLD_MS:.0f} ms by owner:",
+        ]
+        by_owner = loop_watchdog.slow_callbacks_by_owner()
+        for owner, stats in sorted(by_owner.items(), key=lambda item: -item[1]["total_ms"]):
+            lines.append(f"  {owner}: {int(stats['count'])}x, total {stats['total_ms']:.0f} ms, max {stats['max_ms']:.0f} ms")
+        if not by_owner:
+            lines.append("  (none)")
+
+        message = "```\n" + "\n".join(lines) + "\n```"
+        incidents = loop_watchdog.recent_incidents(1)
+        if incidents:
+            last = incidents[-1]
+            stack = last["stack"][-1400:]
+            message += f"Last stall: {last['duration'] * 1000:.0f} ms in `{last['owner']}`\n```py\n{stack}\n```"
+        await ctx.send(message[:2000])
+
+    @commands.command(name="tasks")
+    @commands.has_permissions(administrator=True)
+    @commands.guild_only()
+    async def background_tasks(self, ctx: commands.Context):
+        """Shows background tasks per group and the most recent task failures. (Admin only)"""
+        stats = supervisor.stats()
+        if not stats:
+            await ctx.send("No background tasks started yet.")
+            return
+        lines = [f"{'group':<10} {'running':>8} {'queued':>8} {'limit':>6} {'rejected':>9}"]
+        for group, row in sorted(stats.items()):
+            lines.append(f"{group:<10} {row['running']:>8} {row['queued']:>8} {row['limit']:>6} {row['rejected']:>9}")
+        failures = supervisor.recent_failures()
+        lines.append("Recent failures:")
+        for failure in failures:
+            at = time.strftime('%H:%M:%S', time.localtime(failure['at']))
+            lines.append(f"  {at} {failure['task']} ({failure['group']}): {failure['error'][:150]}")
+        if not failures:
+            lines.append("  (none)")
+        await ctx.send(("```\n" + "\n".join(lines) + "\n```")[:2000])
+
+    @commands.command(name="profile")
+    @commands.has_permissions(administrator=True)
+    @commands.guild_only()
+    async def profile_loop(self, ctx: commands.Context, seconds: float = 30.0):
+        """Profiles everything running on the event loop for N seconds and sends the report as files. (Admin only)
+        Usage: !profile 60
+        """
+        if not 0 < seconds <= profiler.PROFILE_MAX_SECONDS:
+            await ctx.send(f"Seconds must be between 0 and {profiler.PROFILE_MAX_SECONDS}.")
+            return
+        if profiler.is_active():
+            await ctx.send("A profile session is already running.")
+            return
+
+        await ctx.send(f"⏱️ Profiling the event loop for {seconds:g}s (Python code runs slower while profiling)...")
+        log.info(f"AdminCog: {ctx.author} เริ่ม profile {seconds:g}s")
+        try:
+            session, elapsed = await profiler.profile(seconds)
+            report, raw_stats, owners = await executors.run('diagnostics', profiler.build_report, session, elapsed)
+        except Exception as e:
+            log.exception("AdminCog: Profile session failed.")
+            await ctx.send(f"❌ Profile failed: {e}")
+            return
+
+        stamp = discord.utils.utcnow().strftime("%Y%m%d-%H%M%S")
+        files = [
+            discord.File(io.BytesIO(report.encode("utf-8")), filename=f"profile-{stamp}.txt"),
+            discord.File(io.BytesIO(raw_stats), filename=f"profile-{stamp}.prof"), # เปิดด้วย pstats/snakeviz
+        ]
+        summary = profiler.format_owners(owners, limit=8)
+        await ctx.send(f"Profile of {elapsed:.1f}s, time by module:\n```\n{summary}\n```"[:2000], files=files)
+
+
+    @commands.command(name="memory")
+    @commands.has_permissions(administrator=True)
+    @commands.guild_only()
+    async def memory_report(self, ctx: commands.Context):
+        """Shows retained memory per cog/module and what grew since the previous snapshot. (Admin only)"""
+        if not memory_tracker.MEMORY_TRACKING:
+            rss = memory_tracker.resident_bytes()
+            rss_note = f" RSS: {rss / 1048576:.1f} MB." if rss is not None else ""
+            await ctx.send(f"Memory tracking is disabled (set MEMORY_TRACKING=on and restart).{rss_note}")
+            return
+        try:
+            current, previous = await memory_tracker.take_snapshot()
+        except Exception as e:
+            log.exception("AdminCog: Memory snapshot failed.")
+            await ctx.send(f"❌ Memory snapshot failed: {e}")
+            return
+
+        report = memory_tracker.build_report(current, previous)
+        summary = memory_tracker.format_modules(current, previous, limit=10)
+        growth = memory_tracker.format_growth(current, previous, limit=5)
+        stamp = discord.utils.utcnow().strftime("%Y%m%d-%H%M%S")
+        await ctx.send(
+            f"{report.splitlines()[0]}\n```\n{summary}\n```Top growth since previous snapshot:\n```\n{growth}\n```"[:2000],
+            file=discord.File(io.BytesIO(report.encode("utf-8")), filename=f"memory-{stamp}.txt"),
+        )
+
+# --- ฟังก์ชัน Setup สำหรับ Cog ---
+async def setup(bot: commands.Bot):
+    """Loads the AdminCog."""
+    try:
+        await bot.add_cog(AdminCog(bot))
+        log.info("AdminCog: Setup complete, Cog added to bot.")
+    except Exception as e:
+        log.exception("AdminCog: Failed to load Cog.")
@@ -0,0 +1,182 @@
+# benchmarks/bench_cogs.py
+"""
+throughput/latency ของทุก cog บนบอทตัวจริง (bot.py) ผ่าน Discord stand-in ใน harness.py ไม่ต้องต่อ network
+
+รัน:  python benchmarks/bench_cogs.py [--voice 2000] [--clicks 500] [--images 20] [--tts 5] [--json] [--calls-out calls.jsonl]
+
+สถานการณ์ (seed คงที่):
+  voice       สมาชิกสุ่มเข้า/ย้าย/ออกช่องเสียง (รวมช่องที่ไม่ได้ตรวจจับ) -> VoiceLoggingCog
+  bid_click   กดปุ่มรูน/🔃 บนข้อความประมูลที่สร้างด้วย !startbiddingrune -> BiddingView
+  dm_image    ส่งรูปใน DM -> ImageAnalyzerCog (Pillow จริง, Gemini ปลอม)
+  tts_job     ยิง job จาก tts_schedule.json -> TextToSpeechSchedulerCog (gTTS/voice ปลอม)
+latency คือเวลาตั้งแต่ event เข้า ConnectionState จนทุก handler ของ event นั้นทำงานเสร็จ
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from typing import Dict, List
+
+import fakes  # ต้องมาก่อน import โมดูลของบอท (ตั้ง sys.path)
+import harness
+
+RANDOM_SEED = 1234
+VOICE_USERS = range(10_000, 10_300)
+BID_USERS = range(20_000, 20_400)
+
+
+def _summarize(name: str, latencies: List[float], elapsed: float, api_calls: Dict[str, int]) -> Dict[str, object]:
+    ordered = sorted(latencies) or [0.0]
+    pick = lambda q: round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 3)
+    return {
+        "scenario": name,
+        "events": len(latencies),
+        "events_per_sec": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": pick(0.50),
+        "p99_ms": pick(0.99),
+        "max_ms": round(ordered[-1] * 1000, 3),
+        "api_calls": sum(api_calls.values()),
+        "api_calls_by_route": api_calls,
+    }
+
+
+async def _run_scenario(standin, name: str, events, concurrency: int) -> Dict[str, object]:
+    """events = รายการ coroutine function ไม่มี argument; ยิงชุดละ concurrency ตัวพร้อมกัน"""
+    latencies: List[float] = []
+    first_call = len(standin.recorder.calls)
+
+    async def one(event):
+        started = time.perf_counter()
+        await event()
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    for index in range(0, len(events), concurrency):
+        await asyncio.gather(*(one(event) for event in events[index:index + concurrency]))
+    await standin.settle() # แจ้งเตือนที่ส่งเป็นงานเบื้องหลัง (supervisor) ต้องเสร็จก่อนนับ API call
+    elapsed = time.perf_counter() - started
+    return _summarize(name, latencies, elapsed, standin.recorder.counts(since=first_call))
+
+
+def _voice_events(standin, count: int, rng: random.Random):
+    channels = [None, fakes.BENCH_UNMONITORED_CHANNEL_ID, *fakes.BENCH_VOICE_CHANNEL_IDS]
+    return [
+        (lambda user_id=rng.choice(VOICE_USERS), channel_id=rng.choice(channels): standin.voice_state_update(user_id, channel_id))
+        for _ in range(count)
+    ]
+
+
+async def _bid_events(standin, count: int, rng: random.Random, round_size: int):
+    """สร้างข้อความประมูลด้วยคำสั่งจริงก่อน แล้วคลิกปุ่มบนข้อความนั้น (รีเซ็ตการประมูลทุก round_size คลิก)"""
+    await standin.send_message("!startbiddingrune")
+    cog = standin.bot.get_cog("BiddingCog")
+    if cog is None or not cog.bidding_message_id:
+        raise RuntimeError("!startbiddingrune ไม่ได้สร้างข้อความประมูล")
+    bidrune_cog = sys.modules[type(cog).__module__]
+    rune_ids = [f"bid_rune_{''.join(c for c in rune if c.isalnum())[:50]}" for rune in bidrune_cog.BIDDING_RUNES]
+    clicks = {"n": 0}
+
+    async def click(user_id, custom_id):
+        clicks["n"] += 1
+        if clicks["n"] % round_size == 0:
+            await cog.restart_bidding()
+        await standin.click_button(custom_id, user_id, cog.bidding_message_id)
+
+    return [
+        (lambda user_id=rng.choice(BID_USERS), custom_id=rng.choice(rune_ids * 9 + ["bid_refresh"]): click(user_id, custom_id))
+        for _ in range(count)
+    ]
+
+
+def _image_events(standin, count: int, rng: random.Random):
+    image = harness.sample_image()
+    return [(lambda user_id=rng.choice(VOICE_USERS): standin.dm_image(user_id, image)) for _ in range(count)]
+
+
+def _tts_events(standin, count: int):
+    """ยิง job ตามลำดับใน tts_schedule.json (วนซ้ำ) รอเล่นเสียงจบก่อนยิงตัวถัดไป"""
+    cog = standin.bot.get_cog("TextToSpeechSchedulerCog")
+    job_ids = [job.id for job in cog.scheduler.get_jobs()] if cog and cog.scheduler else []
+    if not job_ids:
+        return []
+
+    async def fire(job_id):
+        await standin.fire_job(job_id)
+        while cog.is_playing:
+            await asyncio.sleep(0.001)
+
+    return [(lambda job_id=job_ids[index % len(job_ids)]: fire(job_id)) for index in range(count)]
+
+
+async def run_suite(args) -> Dict[str, object]:
+    rng = random.Random(RANDOM_SEED)
+    results = []
+    async with harness.offline_bot(
+        db_latency=args.db_latency_ms / 1000, gemini_latency=args.gemini_latency_ms / 1000, gtts_latency=args.gtts_latency_ms / 1000,
+        api_latency=args.api_latency_ms / 1000, playback_seconds=args.playback_ms / 1000,
+    ) as standin:
+        startup_calls = standin.recorder.counts()
+        if args.voice:
+            results.append(await _run_scenario(standin, "voice", _voice_events(standin, args.voice, rng), args.concurrency))
+        if args.clicks:
+            results.append(await _run_scenario(standin, "bid_click", await _bid_events(standin, args.clicks, rng, args.bid_round), args.concurrency))
+        if args.images:
+            results.append(await _run_scenario(standin, "dm_image", _image_events(standin, args.images, rng), args.concurrency))
+        if args.tts:
+            results.append(await _run_scenario(standin, "tts_job", _tts_events(standin, args.tts), 1))
+
+    if args.calls_out:
+        standin.recorder.write_jsonl(args.calls_out)
+    return {
+        "python": sys.version.split()[0],
+        "extensions": standin.extensions,
+        "startup_api_calls": startup_calls,
+        "db_writes": standin.database.calls,
+        "gemini_calls": standin.gemini.calls,
+        "gtts_calls": standin.tts.calls,
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--voice", type=int, default=2000, help="จำนวน voice state update")
+    parser.add_argument("--clicks", type=int, default=500, help="จำนวนการกดปุ่มบนข้อความประมูล")
+    parser.add_argument("--images", type=int, default=20, help="จำนวนรูปที่ส่งใน DM")
+    parser.add_argument("--tts", type=int, default=5, help="จำนวนครั้งที่ยิง TTS job")
+    parser.add_argument("--concurrency", type=int, default=20, help="จำนวน event ที่ยิงพร้อมกันต่อชุด")
+    parser.add_argument("--bid-round", type=int, default=60, help="รีเซ็ตการประมูลทุกกี่คลิก")
+    parser.add_argument("--api-latency-ms", type=float, default=0.0, help="เวลาตอบกลับของ Discord API ปลอม")
+    parser.add_argument("--db-latency-ms", type=float, default=0.5, help="เวลาตอบกลับของ Postgres ปลอม")
+    parser.add_argument("--gemini-latency-ms", type=float, default=50.0, help="เวลาตอบกลับของ Gemini ปลอม")
+    parser.add_argument("--gtts-latency-ms", type=float, default=200.0, help="เวลาสร้างไฟล์เสียงของ gTTS ปลอม")
+    parser.add_argument("--playback-ms", type=float, default=5.0, help="ความยาวเสียงที่ voice client ปลอม 'เล่น'")
+    parser.add_argument("--calls-out", help="เขียน API call ทั้งหมด (พร้อมเวลา) เป็น JSON lines")
+    parser.add_argument("--json", action="store_true", help="พิมพ์ผลเป็น JSON")
+    args = parser.parse_args()
+    if args.calls_out:
+        args.calls_out = os.path.abspath(args.calls_out)
+
+    harness.configure_environment()
+    with harness.temp_workdir():
+        report = asyncio.run(run_suite(args))
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False))
+        return
+    print(f"\n== bot.py ({', '.join(report['extensions'])}) ==")
+    print(f"startup API calls: {sum(report['startup_api_calls'].values())}  db writes: {report['db_writes']}  "
+          f"gemini: {report['gemini_calls']}  gtts: {report['gtts_calls']}")
+    print(f"{'scenario':<12} {'events':>7} {'events/s':>10} {'p50 ms':>9} {'p99 ms':>9} {'max ms':>9} {'api calls':>10}")
+    for row in report["results"]:
+        print(f"{row['scenario']:<12} {row['events']:>7} {row['events_per_sec']:>10} {row['p50_ms']:>9} "
+              f"{row['p99_ms']:>9} {row['max_ms']:>9} {row['api_calls']:>10}")
+        for route, count in sorted(row["api_calls_by_route"].items()):
+            print(f"{'':<12}   {count:>6}  {route}")
+
+
+if __name__ == "__main__":
+    main()
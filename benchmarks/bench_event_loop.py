@@ -0,0 +1,174 @@
+# benchmarks/bench_event_loop.py
+"""
+เปรียบเทียบ event loop (asyncio vs uvloop) บน hot path ของ VoiceLoggingCog และ BiddingCog
+
+รัน:  python benchmarks/bench_event_loop.py [--events 5000] [--concurrency 50] [--loops asyncio uvloop] [--json]
+
+ใช้ event สังเคราะห์และ seed คงที่ จึงเทียบผลข้ามเครื่อง/ข้ามการแก้โค้ดได้
+ไม่ต่อ Discord หรือ Postgres (ดู fakes.py) และเขียน bidding_state.json ลงโฟลเดอร์ชั่วคราว
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+import fakes  # ต้องมาก่อน import โมดูลของบอท (ตั้ง sys.path)
+
+import discord
+from discord.ext import commands
+
+import loop_runtime
+import voice_logging_cog
+import bidrune_cog
+import db_manager
+
+RANDOM_SEED = 1234
+
+
+def _percentile(samples: List[float], q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def _summarize(name: str, latencies: List[float], elapsed: float) -> Dict[str, float]:
+    return {
+        "path": name,
+        "events": len(latencies),
+        "events_per_sec": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(_percentile(latencies, 0.50) * 1000, 3),
+        "p99_ms": round(_percentile(latencies, 0.99) * 1000, 3),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 3),
+    }
+
+
+async def _drive(handler, payloads, concurrency: int) -> Dict[str, object]:
+    """เรียก handler กับ payload ทีละชุด (ชุดละ concurrency ตัวพร้อมกัน) และวัด latency ต่อ event"""
+    latencies: List[float] = []
+
+    async def one(payload):
+        started = time.perf_counter()
+        await handler(*payload)
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    for index in range(0, len(payloads), concurrency):
+        await asyncio.gather(*(one(payload) for payload in payloads[index:index + concurrency]))
+    return {"latencies": latencies, "elapsed": time.perf_counter() - started}
+
+
+def _voice_payloads(count: int, rng: random.Random):
+    """ผสม join/leave/move ระหว่างช่องที่ตรวจจับ และ event ที่ถูกทิ้ง (ช่องที่ไม่ตรวจจับ)"""
+    channels = [fakes.fake_voice_channel(cid) for cid in fakes.BENCH_VOICE_CHANNEL_IDS]
+    outside = fakes.fake_voice_channel(fakes.BENCH_UNMONITORED_CHANNEL_ID)
+    payloads = []
+    for _ in range(count):
+        member = fakes.fake_member(rng.randrange(10_000, 10_500))
+        before, after = rng.choice([
+            (None, rng.choice(channels)),          # JOIN
+            (rng.choice(channels), None),          # LEAVE
+            (channels[0], channels[1]),            # MOVE_INTERNAL
+            (outside, rng.choice(channels)),       # MOVE_IN
+            (None, outside),                       # ไม่เกี่ยวกับช่องที่ตรวจจับ
+        ])
+        payloads.append((member, fakes.fake_voice_state(before), fakes.fake_voice_state(after)))
+    return payloads
+
+
+async def _bench_voice(bot, count, concurrency, rng) -> Dict[str, object]:
+    """
+    handler แค่ใส่ event ลง buffer ของ db_manager การเขียน DB จริงอยู่ที่ flush
+    จึงรวมเวลา flush ชุดสุดท้ายไว้ใน elapsed (events/s) และแยกรายงานเป็น flush_ms ด้วย
+    """
+    cog = voice_logging_cog.VoiceLoggingCog(bot)
+    result = await _drive(cog.on_voice_state_update, _voice_payloads(count, rng), concurrency)
+    started = time.perf_counter()
+    await db_manager.flush_voice_events()
+    result["flush"] = time.perf_counter() - started
+    result["elapsed"] += result["flush"]
+    return result
+
+
+async def _bench_bidding(bot, count, concurrency, rng, round_size: int) -> Dict[str, object]:
+    """คลิกปุ่มรูน: add_or_update_bid + แก้ข้อความประมูล (เหมือน RuneButton.callback) รีเซ็ตทุก round_size คลิก"""
+    cog = bidrune_cog.BiddingCog(bot)
+    message = fakes.FakeMessage(555)
+    rune = bidrune_cog.BIDDING_RUNES[0]
+    clicks = {"n": 0}
+
+    async def click(user):
+        clicks["n"] += 1
+        if clicks["n"] % round_size == 0:
+            await cog.restart_bidding()
+        if await cog.add_or_update_bid(rune, user, int(time.time())):
+            await cog.update_bidding_message(msg_to_edit=message)
+
+    payloads = [(fakes.fake_member(rng.randrange(20_000, 20_400)),) for _ in range(count)]
+    return await _drive(click, payloads, concurrency)
+
+
+async def run_benchmark(events: int, concurrency: int, db_latency: float, bid_round: int) -> List[Dict[str, float]]:
+    rng = random.Random(RANDOM_SEED)
+    database = fakes.FakeDatabase(latency=db_latency)
+    database.install()
+    notify_channel = fakes.FakeTextChannel(fakes.BENCH_NOTIFY_CHANNEL_ID)
+    bot = commands.Bot(command_prefix="!", intents=discord.Intents(guilds=True))
+    bot.get_channel = lambda channel_id: notify_channel if channel_id == notify_channel.id else None
+    try:
+        async with bot:  # ตั้ง bot.loop ให้ cogs (run_in_executor)
+            voice = await _bench_voice(bot, events, concurrency, rng)
+            bidding = await _bench_bidding(bot, events, concurrency, rng, bid_round)
+    finally:
+        database.uninstall()
+    voice_row = _summarize("voice_state_update", voice["latencies"], voice["elapsed"])
+    voice_row["flush_ms"] = round(voice["flush"] * 1000, 3)
+    return [voice_row, _summarize("bid_click", bidding["latencies"], bidding["elapsed"])]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=5000, help="จำนวน event ต่อ hot path")
+    parser.add_argument("--concurrency", type=int, default=50, help="จำนวน event ที่ยิงพร้อมกันต่อชุด")
+    parser.add_argument("--db-latency-ms", type=float, default=0.5, help="เวลาตอบกลับของ Postgres ปลอม")
+    parser.add_argument("--bid-round", type=int, default=60, help="รีเซ็ตการประมูลทุกกี่คลิก")
+    parser.add_argument("--loops", nargs="+", default=list(loop_runtime.SUPPORTED_LOOPS), choices=loop_runtime.SUPPORTED_LOOPS)
+    parser.add_argument("--json", action="store_true", help="พิมพ์ผลเป็น JSON หนึ่งบรรทัดต่อ loop")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    for noisy in ("discord", "bidrune_cog"):  # คำเตือนเรื่อง intents/ไฟล์ state ที่ไม่เกี่ยวกับผลวัด
+        logging.getLogger(noisy).setLevel(logging.ERROR)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        original_cwd = os.getcwd()
+        os.chdir(workdir)  # bidding_state.json ไปอยู่ในโฟลเดอร์ชั่วคราว
+        fakes.write_bench_config(workdir)
+        try:
+            for requested in args.loops:
+                loop_name, _ = loop_runtime.resolve(requested)
+                if loop_name != requested:
+                    print(f"# {requested}: ไม่พร้อมใช้งาน ข้าม", file=sys.stderr)
+                    continue
+                results = loop_runtime.run(
+                    run_benchmark(args.events, args.concurrency, args.db_latency_ms / 1000, args.bid_round), loop_name
+                )
+                if args.json:
+                    print(json.dumps({"loop": loop_name, "python": sys.version.split()[0], "results": results}))
+                    continue
+                print(f"\n== {loop_name} ({args.events} events/path, concurrency {args.concurrency}) ==")
+                print(f"{'path':<20} {'events/s':>10} {'p50 ms':>9} {'p99 ms':>9} {'mean ms':>9} {'flush ms':>9}")
+                for row in results:
+                    print(f"{row['path']:<20} {row['events_per_sec']:>10} {row['p50_ms']:>9} {row['p99_ms']:>9} {row['mean_ms']:>9} "
+                          f"{row.get('flush_ms', '-'):>9}")
+        finally:
+            os.chdir(original_cwd)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+# benchmarks/bench_shards.py
+"""
+แยกงานต่อ guild/shard: guild เดียวที่มี voice event ถล่มเข้ามาต้องไม่ทำให้ guild อื่นช้าตาม
+
+รัน:  python benchmarks/bench_shards.py [--guilds 8] [--shards 2] [--guild-quotas 0,100] [--hot-events 3000] [--json]
+
+บอทจริงจาก bot.py ผ่าน stand-in (harness.py) กับ guild ทดสอบหลายตัว (fakes.bench_guild) ที่กระจายตาม --shards
+และ Postgres ปลอมที่รัน query พร้อมกันได้ไม่เกิน --db-pool (เท่า max_size ของ pool จริง)
+  hot    guild แรก: voice state update ทีละ --hot-concurrency ตัวพร้อมกันจนครบ --hot-events
+  quiet  guild ที่เหลือ: สมาชิกเข้า/ออกช่องทีละคนทุก --quiet-interval-ms ระหว่างที่ hot ถล่มอยู่
+voice event เข้า write-behind buffer ของ db_manager ขนาด --buffer-max แถว (VOICE_LOG_BUFFER_MAX, เล็กกว่าค่าจริง
+เพื่อให้ hot เติม buffer จนเต็มได้) แต่ละค่าใน --guild-quotas (VOICE_LOG_GUILD_BUFFER_MAX, 0 = ไม่จำกัดต่อ guild)
+รันใน process แยก เพราะ bot.py สร้าง bot ตอน import
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+import fakes  # ต้องมาก่อน import โมดูลของบอท (ตั้ง sys.path)
+import harness
+
+RANDOM_SEED = 1234
+HOT_USERS = range(30_000, 30_500)
+QUIET_USERS = range(40_000, 40_050)
+
+
+def _percentiles(latencies: List[float]) -> Dict[str, float]:
+    ordered = sorted(latencies) or [0.0]
+    pick = lambda q: round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 3)
+    return {"events": len(latencies), "p50_ms": pick(0.50), "p99_ms": pick(0.99), "max_ms": round(ordered[-1] * 1000, 3)}
+
+
+async def run_once(args) -> Dict[str, object]:
+    import db_manager
+    import guild_state
+
+    rng = random.Random(RANDOM_SEED)
+    guilds = [fakes.bench_guild(index) for index in range(args.guilds)]
+    hot, quiet = guilds[0], guilds[1:]
+    hot_latencies: List[float] = []
+    quiet_latencies: Dict[int, List[float]] = {guild.guild_id: [] for guild in quiet}
+    flood_done = asyncio.Event()
+
+    async def timed(event, sink: List[float]):
+        started = time.perf_counter()
+        await event
+        sink.append(time.perf_counter() - started)
+
+    async with harness.offline_bot(
+        guild_count=args.guilds, shard_count=args.shards, db_latency=args.db_latency_ms / 1000, db_pool_size=args.db_pool,
+        api_latency=args.api_latency_ms / 1000,
+    ) as standin:
+        async def flood():
+            channels = [None, hot.unmonitored_channel_id, *hot.voice_channel_ids]
+            try:
+                for index in range(0, args.hot_events, args.hot_concurrency):
+                    batch = min(args.hot_concurrency, args.hot_events - index)
+                    await asyncio.gather(*(
+                        timed(standin.voice_state_update(rng.choice(HOT_USERS), rng.choice(channels), hot.guild_id), hot_latencies)
+                        for _ in range(batch)
+                    ))
+            finally:
+                flood_done.set()
+
+        async def trickle(guild, offset: int):
+            # สลับเข้า/ออกช่องที่ตรวจจับ ทุก event จึงถูกบันทึกจริง (ไม่ถูกทิ้งเพราะช่องไม่เปลี่ยน)
+            step = offset
+            while not flood_done.is_set():
+                channel_id = guild.voice_channel_ids[step % len(guild.voice_channel_ids)] if step % 2 == 0 else None
+                user_id = QUIET_USERS[(step // 2) % len(QUIET_USERS)]
+                await timed(standin.voice_state_update(user_id, channel_id, guild.guild_id), quiet_latencies[guild.guild_id])
+                step += 1
+                await asyncio.sleep(args.quiet_interval_ms / 1000)
+
+        started = time.perf_counter()
+        await asyncio.gather(flood(), *(trickle(guild, index) for index, guild in enumerate(quiet)))
+        elapsed = time.perf_counter() - started
+
+        by_shard: Dict[int, List[float]] = {}
+        for guild_id, latencies in quiet_latencies.items():
+            by_shard.setdefault(guild_state.shard_id_for(standin.bot, guild_id), []).extend(latencies)
+        hot_shard = guild_state.shard_id_for(standin.bot, hot.guild_id)
+
+    return {
+        "guild_buffer_max": db_manager.VOICE_LOG_GUILD_BUFFER_MAX,
+        "buffer_max": db_manager.VOICE_LOG_BUFFER_MAX,
+        "guilds": args.guilds,
+        "shards": args.shards,
+        "hot_shard": hot_shard,
+        "elapsed_s": round(elapsed, 3),
+        "hot": dict(_percentiles(hot_latencies), events_per_sec=round(len(hot_latencies) / elapsed, 1) if elapsed else 0.0),
+        "quiet": _percentiles([value for latencies in quiet_latencies.values() for value in latencies]),
+        "quiet_by_shard": {shard_id: _percentiles(latencies) for shard_id, latencies in sorted(by_shard.items())},
+        "db_writes": standin.database.calls,
+    }
+
+
+def _run_mode(args, guild_quota: int) -> Dict[str, object]:
+    """รันหนึ่งโหมดใน process ใหม่ (VOICE_LOG_*_BUFFER_MAX ถูกอ่านตอน import db_manager)"""
+    command = [sys.executable, os.path.abspath(__file__), "--single", "--json"]
+    for name in ("guilds", "shards", "hot_events", "hot_concurrency", "quiet_interval_ms", "db_pool", "db_latency_ms", "api_latency_ms"):
+        command += [f"--{name.replace('_', '-')}", str(getattr(args, name))]
+    env = dict(os.environ, VOICE_LOG_GUILD_BUFFER_MAX=str(guild_quota), VOICE_LOG_BUFFER_MAX=str(args.buffer_max))
+    completed = subprocess.run(command, env=env, capture_output=True, text=True, check=True)
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--guilds", type=int, default=8, help="จำนวน guild (guild แรกคือ hot)")
+    parser.add_argument("--shards", type=int, default=2, help="จำนวน shard ที่จำลอง")
+    parser.add_argument("--guild-quotas", default="0,100", help="ค่า VOICE_LOG_GUILD_BUFFER_MAX ที่จะเทียบกัน (คั่นด้วย ,)")
+    parser.add_argument("--buffer-max", type=int, default=300, help="VOICE_LOG_BUFFER_MAX ของทุกโหมด")
+    parser.add_argument("--hot-events", type=int, default=3000, help="จำนวน voice event ของ guild ที่ถล่ม")
+    parser.add_argument("--hot-concurrency", type=int, default=300, help="จำนวน event ของ guild ที่ถล่มที่ค้างพร้อมกัน")
+    parser.add_argument("--quiet-interval-ms", type=float, default=20.0, help="ระยะห่างระหว่าง event ของแต่ละ guild ปกติ")
+    parser.add_argument("--db-pool", type=int, default=10, help="จำนวน query ที่ Postgres ปลอมรันพร้อมกันได้")
+    parser.add_argument("--db-latency-ms", type=float, default=50.0, help="เวลาตอบกลับของ Postgres ปลอม (ช้าพอให้ buffer เต็มระหว่างถูกถล่ม)")
+    parser.add_argument("--api-latency-ms", type=float, default=0.0, help="เวลาตอบกลับของ Discord API ปลอม")
+    parser.add_argument("--single", action="store_true", help="รันโหมดเดียวตาม VOICE_LOG_*_BUFFER_MAX ใน env ปัจจุบัน")
+    parser.add_argument("--json", action="store_true", help="พิมพ์ผลเป็น JSON")
+    args = parser.parse_args()
+
+    if args.single:
+        harness.configure_environment()
+        with harness.temp_workdir():
+            report = asyncio.run(run_once(args))
+        print(json.dumps(report))
+        return
+
+    reports = [_run_mode(args, int(quota)) for quota in args.guild_quotas.split(",") if quota.strip()]
+    if args.json:
+        print(json.dumps(reports, ensure_ascii=False))
+        return
+    print(f"\n== {args.guilds} guilds / {args.shards} shards, hot guild: {args.hot_events} events x{args.hot_concurrency}, "
+          f"db pool {args.db_pool} @ {args.db_latency_ms} ms, buffer {args.buffer_max} rows ==")
+    print(f"{'guild quota':>11} {'hot ev/s':>9} {'hot p99':>9} {'quiet n':>8} {'quiet p50':>10} {'quiet p99':>10} {'quiet max':>10}  quiet p99 by shard")
+    for report in reports:
+        hot, quiet = report["hot"], report["quiet"]
+        shards = "  ".join(f"{shard_id}{'*' if int(shard_id) == report['hot_shard'] else ''}: {row['p99_ms']}"
+                           for shard_id, row in report["quiet_by_shard"].items())
+        quota = report["guild_buffer_max"] or "off"
+        print(f"{quota:>11} {hot['events_per_sec']:>9} {hot['p99_ms']:>9} {quiet['events']:>8} {quiet['p50_ms']:>10} "
+              f"{quiet['p99_ms']:>10} {quiet['max_ms']:>10}  {shards}")
+    print("(ms, * = shard เดียวกับ guild ที่ถล่ม)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+# benchmarks/fakes.py
+"""
+ของปลอมขนาดเล็กสำหรับ benchmark: ผู้ใช้/ช่อง/ข้อความ และ db_manager/Gemini/gTTS ที่ไม่ต่อบริการจริง
+ทำงานได้โดยไม่ต้องต่อ Discord, ฐานข้อมูล หรืออินเทอร์เน็ต
+"""
+import asyncio
+import json
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+import discord
+
+# ให้ import โมดูลของบอท (db_manager, cogs) จากโฟลเดอร์หลักได้
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_DIR not in sys.path:
+    sys.path.insert(0, PROJECT_DIR)
+
+import bot_config
+import db_manager
+import lazy_imports
+
+BENCH_GUILD_ID = 900000000000000001
+BENCH_NOTIFY_CHANNEL_ID = 900000000000000010
+BENCH_BIDDING_CHANNEL_ID = 900000000000000011
+BENCH_VOICE_CHANNEL_IDS = (900000000000000100, 900000000000000101, 900000000000000102)
+BENCH_UNMONITORED_CHANNEL_ID = 900000000000000199
+
+
+def bench_guild(index: int = 0) -> SimpleNamespace:
+    """
+    ID ของ guild ทดสอบลำดับที่ index (0 = ค่า BENCH_* ด้านบน)
+    เลื่อนทีละ index << 22 ให้แต่ละ guild ตกคนละ shard ((guild_id >> 22) % shard_count) และ ID ช่องไม่ซ้ำกัน
+    """
+    offset = index << 22
+    return SimpleNamespace(
+        guild_id=BENCH_GUILD_ID + offset,
+        notify_channel_id=BENCH_NOTIFY_CHANNEL_ID + offset,
+        bidding_channel_id=BENCH_BIDDING_CHANNEL_ID + offset,
+        voice_channel_ids=tuple(channel_id + offset for channel_id in BENCH_VOICE_CHANNEL_IDS),
+        unmonitored_channel_id=BENCH_UNMONITORED_CHANNEL_ID + offset,
+    )
+
+
+def write_bench_config(directory: str, guild_count: int = 1) -> str:
+    """เขียน bot_config.json สำหรับ guild ปลอม guild_count ตัว แล้วโหลดเป็น config ปัจจุบัน"""
+    path = os.path.join(directory, "bot_config.json")
+    guilds = {}
+    for index in range(guild_count):
+        guild = bench_guild(index)
+        guilds[str(guild.guild_id)] = {
+            "monitored_voice_channel_ids": list(guild.voice_channel_ids),
+            "notification_text_channel_ids": [guild.notify_channel_id],
+            "tts_voice_channel_id": guild.voice_channel_ids[0],
+            "bidding_channel_id": guild.bidding_channel_id,
+        }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"guilds": guilds}, f)
+    bot_config.load(path, environ={})
+    return path
+
+
+class FakeTextChannel(discord.TextChannel):
+    """TextChannel ที่ผ่าน isinstance ของ cogs แต่ send() แค่นับจำนวน"""
+    def __init__(self, channel_id: int, name: str = "bench-notify", send_delay: float = 0.0):
+        self.id = channel_id
+        self.name = name
+        self.send_delay = send_delay
+        self.sent = 0
+
+    async def send(self, *args, **kwargs):
+        self.sent += 1
+        await asyncio.sleep(self.send_delay)
+
+
+class FakeMessage(discord.Message):
+    """Message ที่ edit() แค่นับจำนวน (ใช้เป็นข้อความประมูล)"""
+    def __init__(self, message_id: int, edit_delay: float = 0.0):
+        self.id = message_id
+        self.edit_delay = edit_delay
+        self.edits = 0
+
+    async def edit(self, **kwargs):
+        self.edits += 1
+        await asyncio.sleep(self.edit_delay)
+
+
+def fake_guild(guild_id: int = BENCH_GUILD_ID):
+    return SimpleNamespace(id=guild_id)
+
+
+def fake_voice_channel(channel_id: int):
+    return SimpleNamespace(id=channel_id, name=f"voice-{channel_id % 1000}")
+
+
+def fake_member(user_id: int, guild=None):
+    avatar = SimpleNamespace(url=f"https://cdn.discordapp.com/embed/avatars/{user_id % 5}.png")
+    return SimpleNamespace(
+        id=user_id, bot=False, name=f"user{user_id}", display_name=f"User {user_id}", global_name=f"User {user_id}",
+        mention=f"<@{user_id}>", display_avatar=avatar, default_avatar=avatar, guild=guild or fake_guild(),
+    )
+
+
+def fake_voice_state(channel):
+    return SimpleNamespace(channel=channel)
+
+
+class FakeDatabase:
+    """
+    แทนที่ฟังก์ชันเขียนของ db_manager ด้วยตัวที่หน่วงเวลาเท่า round-trip ที่กำหนด (write-behind: 1 call ต่อชุด)
+    pool_size จำกัดจำนวน query ที่รันพร้อมกัน (เหมือน max_size ของ asyncpg pool) None = ไม่จำกัด
+    """
+    def __init__(self, latency: float = 0.0005, pool_size: int = None):
+        self.latency = latency
+        self.calls = 0
+        self._pool = asyncio.Semaphore(pool_size) if pool_size else None
+        self._originals = {}
+
+    async def _fake_write(self, *args, **kwargs):
+        self.calls += 1
+        if self._pool is None:
+            await asyncio.sleep(self.latency)
+            return
+        async with self._pool:
+            await asyncio.sleep(self.latency)
+
+    def install(self):
+        for name in ("initialize_database", "upsert_discord_user", "add_voice_log", "_write_voice_batch"):
+            self._originals[name] = getattr(db_manager, name)
+            setattr(db_manager, name, self._fake_write)
+
+    def uninstall(self):
+        for name, original in self._originals.items():
+            setattr(db_manager, name, original)
+        self._originals.clear()
+
+
+class FakeGemini:
+    """แทน Gemini model ของ image_analyzer_cog: หน่วงเวลาเท่าที่กำหนดแล้วตอบ JSON ค่า stat คงที่"""
+    RESPONSE_TEXT = '```json\n{"ATK": 512, "MATK": 301, "HIT": 188, "FLEE": 240, "CRI": 45, "ASPD": 190}\n```'
+
+    def __init__(self, latency: float = 0.05):
+        self.latency = latency
+        self.calls = 0
+        self._module = None
+        self._original = None
+
+    async def generate_content_async(self, contents):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return SimpleNamespace(text=self.RESPONSE_TEXT, prompt_feedback=SimpleNamespace(block_reason=None))
+
+    def install(self):
+        # image_analyzer_cog ที่ load_extension โหลดแล้ว (ต้องเรียกหลังโหลด extension)
+        self._module = sys.modules["image_analyzer_cog"]
+        self._original = self._module._gemini_model
+        self._module._gemini_model = self
+
+    def uninstall(self):
+        if self._module is not None:
+            self._module._gemini_model = self._original
+            self._module = None
+
+
+class FakeTTS:
+    """แทน gtts.gTTS: save() หน่วงเวลาเท่า round-trip ที่กำหนด (ใน executor เหมือนของจริง) แล้วเขียนไฟล์เสียงเปล่า"""
+    def __init__(self, latency: float = 0.2):
+        self.latency = latency
+        self.calls = 0
+        self._module = None
+        self._original = None
+
+    def _make(self, text: str, lang: str = "en", slow: bool = False):
+        def save(path: str):
+            self.calls += 1
+            time.sleep(self.latency)
+            with open(path, "wb") as f:
+                f.write(b"ID3")
+        return SimpleNamespace(text=text, lang=lang, save=save)
+
+    def install(self):
+        self._module = lazy_imports.load("gtts")
+        self._original = self._module.gTTS
+        self._module.gTTS = self._make
+
+    def uninstall(self):
+        if self._module is not None:
+            self._module.gTTS = self._original
+            self._module = None
@@ -0,0 +1,549 @@
+# benchmarks/harness.py
+"""
+Discord stand-in: รันบอทจริงจาก bot.py (INITIAL_EXTENSIONS, listeners, views, scheduler) แบบ offline
+
+- HTTP (bot.http.request, CDN, interaction webhooks) ตอบด้วย payload ปลอม
+- gateway ปลอม: READY/GUILD_CREATE ของ guild ทดสอบ และรับ presence/voice/chunk request จากบอท
+- voice ปลอม: connect/move/play ไม่ต่อ voice server และไม่เรียก FFmpeg
+- ทุก call ที่บอทส่งออกถูกบันทึกพร้อมเวลา (ApiRecorder)
+
+ฉีด event ได้ด้วย voice_state_update(), click_button(), dm_image(), send_message() และ fire_job()
+แต่ละตัวรอจน task ที่ event นั้นสร้าง (listener/view callback) ทำงานเสร็จ จึงใช้วัด latency ต่อ event ได้
+offline_bot() รวมทุกอย่าง (bot.py + extensions + Postgres/Gemini/gTTS ปลอม) ให้ benchmark ใช้
+"""
+import asyncio
+import io
+import itertools
+import json
+import os
+import re
+import tempfile
+import time
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import asdict, dataclass
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+import fakes  # ต้องมาก่อน import โมดูลของบอท (ตั้ง sys.path)
+
+import discord
+from discord.ext import commands
+from discord.webhook.async_ import AsyncWebhookAdapter
+
+import db_manager
+
+STANDIN_TOKEN = "stand-in-token"
+BOT_USER_ID = 900000000000000900
+APPLICATION_ID = 900000000000000901
+ADMIN_USER_ID = 900000000000000902 # เจ้าของ guild ปลอม (มีสิทธิ์ administrator)
+SNOWFLAKE_START = 950000000000000000
+JOINED_AT = "2024-01-01T00:00:00+00:00"
+EPHEMERAL_FLAG = 64
+
+
+# --- บันทึก call ที่บอทส่งออก ---
+@dataclass
+class ApiCall:
+    at: float          # วินาทีนับจากสร้าง recorder
+    transport: str     # http | webhook | gateway | voice | cdn
+    method: str
+    route: str         # path template เช่น /channels/{channel_id}/messages
+    target: Optional[int] = None
+
+
+class ApiRecorder:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.calls: List[ApiCall] = []
+
+    def record(self, transport: str, method: str, route: str, target: Optional[int] = None):
+        self.calls.append(ApiCall(round(time.perf_counter() - self.started, 6), transport, method, route, target))
+
+    def counts(self, since: int = 0) -> Dict[str, int]:
+        """{'http POST /channels/{channel_id}/messages': n, ...} ของ call ตั้งแต่ index since"""
+        summary: Dict[str, int] = {}
+        for call in self.calls[since:]:
+            key = f"{call.transport} {call.method} {call.route}"
+            summary[key] = summary.get(key, 0) + 1
+        return summary
+
+    def write_jsonl(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            for call in self.calls:
+                f.write(json.dumps(asdict(call)) + "\n")
+
+
+# --- payload แบบที่ Discord ส่งมา ---
+def user_payload(user_id: int, *, bot: bool = False) -> Dict[str, Any]:
+    return {
+        "id": str(user_id), "username": f"user{user_id}", "global_name": f"User {user_id}",
+        "discriminator": "0", "avatar": None, "bot": bot,
+    }
+
+
+def member_payload(user_id: int, *, permissions: Optional[int] = None) -> Dict[str, Any]:
+    payload = {
+        "user": user_payload(user_id, bot=user_id == BOT_USER_ID), "roles": [], "joined_at": JOINED_AT,
+        "deaf": False, "mute": False, "nick": None, "flags": 0, "avatar": None,
+    }
+    if permissions is not None:
+        payload["permissions"] = str(permissions)
+    return payload
+
+
+def guild_payload(index: int = 0) -> Dict[str, Any]:
+    """guild ทดสอบลำดับที่ index ที่ตรงกับ config จาก fakes.write_bench_config()"""
+    ids = fakes.bench_guild(index)
+    guild_id = ids.guild_id
+    channels = [
+        {"id": str(ids.notify_channel_id), "type": 0, "name": "voice-log", "position": 0},
+        {"id": str(ids.bidding_channel_id), "type": 0, "name": "bidding", "position": 1},
+        {"id": str(ids.unmonitored_channel_id), "type": 2, "name": "afk", "position": 2, "bitrate": 64000, "user_limit": 0},
+    ]
+    for position, channel_id in enumerate(ids.voice_channel_ids, start=3):
+        channels.append({"id": str(channel_id), "type": 2, "name": f"voice-{channel_id % 1000}", "position": position, "bitrate": 64000, "user_limit": 0})
+    for channel in channels:
+        channel.update(guild_id=str(guild_id), permission_overwrites=[], nsfw=False, parent_id=None)
+    return {
+        "id": str(guild_id), "name": f"Stand-in Guild {index}", "owner_id": str(ADMIN_USER_ID), "unavailable": False,
+        "member_count": 2, "large": False, "features": [], "emojis": [], "stickers": [],
+        "roles": [{"id": str(guild_id), "name": "@everyone", "permissions": str(discord.Permissions.general().value),
+                   "position": 0, "color": 0, "hoist": False, "managed": False, "mentionable": False}],
+        "channels": channels, "threads": [], "voice_states": [], "presences": [],
+        "members": [member_payload(BOT_USER_ID), member_payload(ADMIN_USER_ID)],
+    }
+
+
+def application_payload() -> Dict[str, Any]:
+    return {
+        "id": str(APPLICATION_ID), "name": "stand-in", "icon": None, "description": "", "bot_public": True,
+        "bot_require_code_grant": False, "verify_key": "", "flags": 0, "owner": user_payload(ADMIN_USER_ID),
+    }
+
+
+# --- Gateway / Voice ปลอม ---
+class FakeGateway:
+    """แทน DiscordWebSocket: บันทึก opcode ที่บอทส่ง และตอบ request_chunks ด้วย GUILD_MEMBERS_CHUNK"""
+    open = False # Client.close() จะไม่พยายามปิด websocket จริง
+
+    def __init__(self, standin: "DiscordStandIn"):
+        self.standin = standin
+        self.latency = 0.0
+        self.shard_id = None
+
+    def is_ratelimited(self) -> bool:
+        return False
+
+    async def change_presence(self, *, activity=None, status=None, since=0.0):
+        self.standin.recorder.record("gateway", "OP3", "PRESENCE_UPDATE")
+
+    async def voice_state(self, guild_id, channel_id, self_mute=False, self_deaf=False):
+        self.standin.recorder.record("gateway", "OP4", "VOICE_STATE_UPDATE", channel_id)
+
+    async def request_chunks(self, guild_id, query=None, *, limit, user_ids=None, presences=False, nonce=None):
+        self.standin.recorder.record("gateway", "OP8", "REQUEST_GUILD_MEMBERS", guild_id)
+        members = self.standin.guilds[int(guild_id)].get("members", [])
+        chunk = {"guild_id": str(guild_id), "members": members, "chunk_index": 0, "chunk_count": 1, "nonce": nonce}
+        asyncio.get_running_loop().call_soon(self.standin.parse, "GUILD_MEMBERS_CHUNK", chunk)
+
+    async def close(self, code=1000):
+        pass
+
+
+class FakeAudioSource(discord.AudioSource):
+    """แทน FFmpegPCMAudio (ไม่ spawn FFmpeg)"""
+    def __init__(self, source, **kwargs):
+        self.filename = source
+
+    def read(self) -> bytes:
+        return b""
+
+
+class FakeVoiceClient:
+    """VoiceClient ที่ 'เล่น' เสียงครบตาม playback_seconds ของ stand-in แล้วเรียก after เหมือนของจริง"""
+    def __init__(self, standin: "DiscordStandIn", channel):
+        self.standin = standin
+        self.channel = channel
+        self.guild = channel.guild
+        self._connected = True
+        self._playing = False
+
+    def is_connected(self) -> bool:
+        return self._connected
+
+    def is_playing(self) -> bool:
+        return self._playing
+
+    async def move_to(self, channel, *, timeout: float = 30.0):
+        self.standin.recorder.record("gateway", "OP4", "VOICE_STATE_UPDATE", channel.id if channel else None)
+        self.channel = channel
+
+    def play(self, source, *, after=None, **kwargs):
+        if self._playing:
+            raise discord.ClientException("Already playing audio.")
+        self.standin.recorder.record("voice", "PLAY", "audio", self.channel.id)
+        self._playing = True
+        asyncio.get_running_loop().call_later(self.standin.playback_seconds, self._finish, after)
+
+    def _finish(self, after):
+        self._playing = False
+        if after is not None:
+            after(None)
+
+    def stop(self):
+        self._playing = False
+
+    async def disconnect(self, *, force: bool = False):
+        self.standin.recorder.record("gateway", "OP4", "VOICE_STATE_UPDATE", None)
+        self._connected = False
+        self.guild._state._remove_voice_client(self.guild.id)
+
+
+# --- ตัว stand-in หลัก ---
+class DiscordStandIn:
+    """
+    ห่อ commands.Bot ตัวจริง: install() แทน HTTP/webhook/voice ด้วยของปลอม, connect() ทำหน้าที่แทน bot.start()
+    ใช้ภายใน `async with bot` หลังโหลด extensions แล้ว (ลำดับเดียวกับ bot.main)
+    """
+    def __init__(self, bot: commands.Bot, *, guilds: Optional[List[Dict[str, Any]]] = None, api_latency: float = 0.0,
+                 voice_connect_latency: float = 0.0, playback_seconds: float = 0.0, cdn_fallback: Optional[bytes] = None):
+        self.bot = bot
+        self.api_latency = api_latency
+        self.voice_connect_latency = voice_connect_latency
+        self.playback_seconds = playback_seconds
+        self.cdn_fallback = cdn_fallback # ตอบไฟล์แนบที่ไม่รู้จัก (เช่น URL จากไฟล์ที่บันทึกไว้) ด้วย bytes นี้
+        self.recorder = ApiRecorder()
+        self.gateway = FakeGateway(self)
+        # GUILD_CREATE payload ของแต่ละ guild (ค่าเริ่มต้น: guild ทดสอบที่ตรงกับ fakes.write_bench_config)
+        self.guilds: Dict[int, Dict[str, Any]] = {int(guild["id"]): guild for guild in guilds or [guild_payload()]}
+        self.guild = next(iter(self.guilds.values())) # guild ที่ injector ใช้เมื่อไม่ได้ระบุ
+        self.bot_user = user_payload(BOT_USER_ID, bot=True)
+        self.events_injected = 0
+        self._ids = itertools.count(SNOWFLAKE_START)
+        self._messages: Dict[int, Dict[str, Any]] = {}      # message id -> payload (ให้ fetch_message/edit ตอบได้)
+        self._interactions: Dict[str, Dict[str, Any]] = {}  # token -> message ของ component ที่ถูกกด
+        self._dm_channels: Dict[int, int] = {}              # user id -> DM channel id
+        self._cdn: Dict[str, bytes] = {}                    # attachment url -> bytes
+        self._patched: List[tuple] = []
+
+    def next_id(self) -> int:
+        return next(self._ids)
+
+    # --- ติดตั้ง/ถอด ของปลอม ---
+    def _patch(self, owner, name: str, value):
+        self._patched.append((owner, name, owner.__dict__.get(name)))
+        setattr(owner, name, value)
+
+    def install(self):
+        standin = self
+
+        async def webhook_request(adapter, route, session=None, **kwargs):
+            return await standin._webhook_request(route, **kwargs)
+
+        async def connect(channel, *, timeout=60.0, reconnect=True, cls=None, self_deaf=False, self_mute=False):
+            return await standin._voice_connect(channel)
+
+        self._patch(self.bot.http, "request", self._http_request)
+        self._patch(self.bot.http, "get_from_cdn", self._get_from_cdn)
+        self._patch(AsyncWebhookAdapter, "request", webhook_request)
+        self._patch(discord.abc.Connectable, "connect", connect)
+        self._patch(discord, "FFmpegPCMAudio", FakeAudioSource)
+        self.bot._connection.guild_ready_timeout = 0.05 # ไม่ต้องรอ GUILD_CREATE ที่จะไม่มาอีก
+
+    def uninstall(self):
+        for owner, name, original in reversed(self._patched):
+            if original is None:
+                delattr(owner, name)
+            else:
+                setattr(owner, name, original)
+        self._patched.clear()
+
+    # --- login + READY ---
+    async def connect(self):
+        """แทน bot.start(): login ผ่าน HTTP ปลอม, ส่ง READY + GUILD_CREATE แล้วรอ on_ready ของทุก cog ทำงานเสร็จ"""
+        await self.bot.login(STANDIN_TOKEN)
+        self.bot.ws = self.gateway
+        self.parse("READY", {
+            "v": 10, "user": self.bot_user, "session_id": "stand-in", "resume_gateway_url": "ws://stand-in",
+            "guilds": [{"id": guild["id"], "unavailable": True} for guild in self.guilds.values()],
+            "application": {"id": str(APPLICATION_ID), "flags": 0}, "shard": [0, 1],
+        })
+        for guild in self.guilds.values():
+            self.parse("GUILD_CREATE", guild)
+        await self.bot.wait_until_ready()
+        await self.settle("discord.py: on_ready")
+
+    async def settle(self, task_prefix=("discord.py: ", "supervisor: ")):
+        """
+        รอ event handler และงานเบื้องหลังที่ยังรันอยู่ (task ที่ชื่อขึ้นต้นด้วย prefix นี้, รับ tuple ได้)
+        ไม่รองานของ supervisor แบบ restart='always' (เช่น publisher ของ voice worker) ที่รันจนปิดบอท
+        voice log ที่ค้างใน write-behind buffer ของ db_manager ถูก flush ทันทีโดยไม่รอ VOICE_LOG_FLUSH_MS
+        """
+        import supervisor
+        current = asyncio.current_task()
+        while True:
+            pending = [task for task in asyncio.all_tasks() if task is not current and task not in supervisor._forever
+                       and task.get_name().startswith(task_prefix)]
+            if not pending:
+                buffer = db_manager._voice_buffer
+                if buffer is None or not buffer.rows:
+                    return
+                await db_manager.flush_voice_events()
+                continue
+            await asyncio.wait(pending)
+
+    def parse(self, event: str, data: Dict[str, Any]):
+        self.bot._connection.parsers[event](data)
+
+    async def dispatch(self, event: str, data: Dict[str, Any]):
+        """ส่ง event เข้า ConnectionState แล้วรอทุก task ที่ event นี้สร้าง (listeners, view callbacks) จนเสร็จ"""
+        if event == "INTERACTION_CREATE": # ให้ webhook ปลอมรู้ว่า @original คือข้อความไหน/ช่องไหน
+            self._interactions[data["token"]] = data.get("message") or {"id": str(self.next_id()), "channel_id": data.get("channel_id", "0")}
+        before = asyncio.all_tasks()
+        self.parse(event, data) # parser เป็น sync: task ที่เพิ่มขึ้นมาจึงมาจาก event นี้เท่านั้น
+        self.events_injected += 1
+        spawned = asyncio.all_tasks() - before
+        if spawned:
+            await asyncio.gather(*spawned, return_exceptions=True)
+
+    # --- ฉีด event ---
+    async def voice_state_update(self, user_id: int, channel_id: Optional[int], guild_id: Optional[int] = None):
+        """สมาชิก user_id เข้า/ย้าย/ออก (channel_id=None) ช่องเสียง ของ guild_id (ค่าเริ่มต้น: self.guild)"""
+        await self.dispatch("VOICE_STATE_UPDATE", {
+            "guild_id": str(guild_id) if guild_id else self.guild["id"], "channel_id": str(channel_id) if channel_id else None, "user_id": str(user_id),
+            "member": member_payload(user_id), "session_id": f"session-{user_id}", "deaf": False, "mute": False,
+            "self_deaf": False, "self_mute": False, "self_video": False, "suppress": False, "request_to_speak_timestamp": None,
+        })
+
+    async def click_button(self, custom_id: str, user_id: int, message_id: int, channel_id: int = fakes.BENCH_BIDDING_CHANNEL_ID,
+                           guild_id: Optional[int] = None):
+        """กดปุ่ม (component type 2) บนข้อความ message_id"""
+        message = self._messages.get(message_id) or self._message_payload(channel_id, {"content": ""}, message_id=message_id)
+        token = f"token-{self.next_id()}"
+        await self.dispatch("INTERACTION_CREATE", {
+            "id": str(self.next_id()), "application_id": str(APPLICATION_ID), "type": 3, "token": token, "version": 1,
+            "guild_id": str(guild_id) if guild_id else self.guild["id"], "channel_id": str(channel_id), "channel": {"id": str(channel_id), "type": 0},
+            "member": member_payload(user_id, permissions=discord.Permissions.general().value),
+            "data": {"custom_id": custom_id, "component_type": 2}, "message": message,
+            "locale": "en-US", "guild_locale": "en-US", "app_permissions": str(discord.Permissions.all().value), "entitlements": [],
+        })
+
+    async def send_message(self, content: str, user_id: int = ADMIN_USER_ID, channel_id: int = fakes.BENCH_BIDDING_CHANNEL_ID,
+                           guild_id: Optional[int] = None):
+        """ข้อความใน guild (เช่นคำสั่ง !startbiddingrune จาก admin)"""
+        payload = self._message_payload(channel_id, {"content": content}, author=user_payload(user_id))
+        payload.update(guild_id=str(guild_id) if guild_id else self.guild["id"], member=member_payload(user_id))
+        del payload["member"]["user"]
+        await self.dispatch("MESSAGE_CREATE", payload)
+
+    async def dm_image(self, user_id: int, image_bytes: bytes, filename: str = "stats.png", content_type: str = "image/png"):
+        """ผู้ใช้ส่งรูปใน DM (ไฟล์แนบถูกอ่านผ่าน CDN ปลอม)"""
+        channel_id = self._dm_channels.setdefault(user_id, self.next_id())
+        attachment_id = self.next_id()
+        url = f"https://cdn.discordapp.com/attachments/{channel_id}/{attachment_id}/{filename}"
+        self._cdn[url] = image_bytes
+        payload = self._message_payload(channel_id, {"content": ""}, author=user_payload(user_id))
+        payload["attachments"] = [{
+            "id": str(attachment_id), "filename": filename, "size": len(image_bytes), "url": url, "proxy_url": url,
+            "content_type": content_type,
+        }]
+        await self.dispatch("MESSAGE_CREATE", payload)
+
+    async def fire_job(self, job_id: str):
+        """ยิง job ของ APScheduler ทันที (await job.func แบบเดียวกับ AsyncIOExecutor)"""
+        cog = self.bot.get_cog("TextToSpeechSchedulerCog")
+        job = cog.scheduler.get_job(job_id) if cog and cog.scheduler else None
+        if job is None:
+            raise LookupError(f"ไม่พบ scheduler job '{job_id}'")
+        self.events_injected += 1
+        await job.func(*job.args, **job.kwargs)
+
+    # --- HTTP ปลอม ---
+    def _message_payload(self, channel_id: int, body: Dict[str, Any], *, message_id: Optional[int] = None, author: Optional[Dict] = None) -> Dict[str, Any]:
+        return {
+            "id": str(message_id or self.next_id()), "channel_id": str(channel_id), "author": author or self.bot_user,
+            "content": body.get("content") or "", "timestamp": discord.utils.utcnow().isoformat(), "edited_timestamp": None,
+            "tts": False, "mention_everyone": False, "mentions": [], "mention_roles": [], "attachments": [],
+            "embeds": body.get("embeds") or [], "components": body.get("components") or [], "pinned": False, "type": 0,
+            "flags": body.get("flags") or 0,
+        }
+
+    def _store_message(self, channel_id: int, body: Dict[str, Any], message_id: Optional[int] = None) -> Dict[str, Any]:
+        payload = self._message_payload(channel_id, body, message_id=message_id)
+        self._messages[int(payload["id"])] = payload
+        return payload
+
+    def _edit_message(self, channel_id: int, message_id: int, body: Dict[str, Any]) -> Dict[str, Any]:
+        payload = self._messages.get(message_id) or self._store_message(channel_id, {}, message_id)
+        for key in ("content", "embeds", "components", "flags"):
+            if key in body and body[key] is not None:
+                payload[key] = body[key]
+        payload["edited_timestamp"] = discord.utils.utcnow().isoformat()
+        return payload
+
+    @staticmethod
+    def _body(json_body, form=None, multipart=None) -> Dict[str, Any]:
+        """payload ของ request (แบบ multipart ใช้ field payload_json)"""
+        if json_body is not None:
+            return json_body
+        for field in form or multipart or []:
+            if field.get("name") == "payload_json":
+                return json.loads(field["value"])
+        return {}
+
+    @staticmethod
+    def _not_found(route):
+        return discord.NotFound(SimpleNamespace(status=404, reason="Not Found"), {"code": 10008, "message": f"Unknown ({route.path})"})
+
+    async def _http_request(self, route, *, files=None, form=None, **kwargs):
+        self.recorder.record("http", route.method, route.path, route.channel_id or route.guild_id)
+        if self.api_latency:
+            await asyncio.sleep(self.api_latency)
+        body = self._body(kwargs.get("json"), form)
+        path, method = route.path, route.method
+        if path == "/users/@me":
+            return self.bot_user
+        if path == "/oauth2/applications/@me":
+            return application_payload()
+        if path == "/users/@me/channels":
+            recipient_id = int(body["recipient_id"])
+            channel_id = self._dm_channels.setdefault(recipient_id, self.next_id())
+            return {"id": str(channel_id), "type": 1, "recipients": [user_payload(recipient_id)], "last_message_id": None}
+        if path == "/channels/{channel_id}":
+            channels = (c for guild in self.guilds.values() for c in guild["channels"])
+            channel = next((c for c in channels if int(c["id"]) == int(route.channel_id)), None)
+            if channel is None:
+                raise self._not_found(route)
+            return channel
+        if path == "/channels/{channel_id}/messages" and method == "POST":
+            return self._store_message(int(route.channel_id), body)
+        if path == "/channels/{channel_id}/messages/{message_id}":
+            message_id = int(route.url.rsplit("/", 1)[1])
+            if method == "PATCH":
+                return self._edit_message(int(route.channel_id), message_id, body)
+            if message_id not in self._messages:
+                raise self._not_found(route)
+            if method == "DELETE":
+                del self._messages[message_id]
+                return None
+            return self._messages[message_id]
+        return None
+
+    async def _get_from_cdn(self, url: str) -> bytes:
+        self.recorder.record("cdn", "GET", re.sub(r"/\d+/\d+/", "/{channel_id}/{attachment_id}/", url.split("?")[0]))
+        if self.api_latency:
+            await asyncio.sleep(self.api_latency)
+        try:
+            return self._cdn[url]
+        except KeyError:
+            if self.cdn_fallback is not None:
+                return self.cdn_fallback
+            raise discord.NotFound(SimpleNamespace(status=404, reason="Not Found"), "attachment not found") from None
+
+    async def _webhook_request(self, route, *, payload=None, multipart=None, files=None, params=None, **kwargs):
+        self.recorder.record("webhook", route.method, route.path, route.webhook_id)
+        if self.api_latency:
+            await asyncio.sleep(self.api_latency)
+        body = self._body(payload, multipart=multipart)
+        clicked = self._interactions.get(route.webhook_token)
+        channel_id = int(clicked["channel_id"]) if clicked else 0
+        if route.path.endswith("/callback"):
+            response_type = body.get("type")
+            data = body.get("data") or {}
+            if response_type == 7 and clicked: # UPDATE_MESSAGE แก้ข้อความที่ถูกกด
+                self._edit_message(channel_id, int(clicked["id"]), data)
+            return {"interaction": {
+                "id": str(route.webhook_id), "type": 3, "response_message_loading": response_type == 5,
+                "response_message_ephemeral": bool((data.get("flags") or 0) & EPHEMERAL_FLAG),
+            }}
+        if route.path == "/webhooks/{webhook_id}/{webhook_token}" and route.method == "POST": # followup
+            return self._store_message(channel_id, body)
+        if "/messages/" in route.path: # {message_id} หรือ @original
+            target = route.url.rsplit("/", 1)[1]
+            message_id = int(clicked["id"]) if target == "@original" and clicked else int(target) if target.isdigit() else self.next_id()
+            if route.method == "DELETE":
+                self._messages.pop(message_id, None)
+                return None
+            return self._edit_message(channel_id, message_id, body)
+        return None
+
+    # --- voice ---
+    async def _voice_connect(self, channel):
+        self.recorder.record("gateway", "OP4", "VOICE_STATE_UPDATE", channel.id)
+        if self.voice_connect_latency:
+            await asyncio.sleep(self.voice_connect_latency)
+        voice_client = FakeVoiceClient(self, channel)
+        channel._state._add_voice_client(channel.guild.id, voice_client)
+        return voice_client
+
+
+def sample_image(width: int = 640, height: int = 360) -> bytes:
+    """รูป PNG สำหรับ dm_image() (ใช้ Pillow ตัวเดียวกับ image_analyzer_cog)"""
+    from PIL import Image
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), (40, 90, 160)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+# --- รันบอททั้งตัวแบบ offline (ใช้ร่วมกันโดย bench_cogs.py / replay_gateway.py) ---
+def configure_environment():
+    """bot.py/cogs ตรวจว่ามี token/DSN/API key ก่อนโหลด (ใช้จริงแค่ของปลอม) และ log ของ cog ทุกตัวจะท่วมผลวัด"""
+    os.environ.setdefault("DISCORD_BOT_TOKEN", STANDIN_TOKEN)
+    os.environ.setdefault("POSTGRES_CONNECTION_STRING", "postgresql://stand-in/bench")
+    os.environ.setdefault("GEMINI_API_KEY", "stand-in")
+    os.environ.setdefault("LOG_LEVEL", "ERROR")
+    os.environ.setdefault("PREWARM_IMPORTS", "off")
+
+
+@contextmanager
+def temp_workdir():
+    """temp_tts/, bidding_state.json ของ cog ไปอยู่ในโฟลเดอร์ชั่วคราว (ต้องเข้าก่อน import bot)"""
+    original_cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        try:
+            yield workdir
+        finally:
+            os.chdir(original_cwd)
+
+
+@asynccontextmanager
+async def offline_bot(*, guilds: Optional[List[Dict[str, Any]]] = None, guild_count: int = 1, db_latency: float = 0.0005,
+                      db_pool_size: Optional[int] = None, gemini_latency: float = 0.05, gtts_latency: float = 0.2,
+                      shard_count: Optional[int] = None, **standin_options):
+    """
+    bot จาก bot.py ที่โหลด INITIAL_EXTENSIONS แล้ว connect กับ stand-in เสร็จ (on_ready ของทุก cog ทำงานแล้ว)
+    guilds=None ใช้ guild/config ทดสอบ guild_count ตัว ไม่งั้นใช้ GUILD_CREATE ที่ให้มากับ bot_config.json ตามปกติ
+    shard_count จำลองการแบ่ง shard ให้ guild_state (gateway ปลอมยังเป็น connection เดียว)
+    APScheduler ถูก pause ไว้: job รันเฉพาะตอนเรียก fire_job()
+    """
+    import bot as bot_main # bot.py โหลด config และสร้าง bot ตอน import
+
+    if guilds is None:
+        fakes.write_bench_config(os.getcwd(), guild_count) # แทน config ที่ bot.py โหลดจาก bot_config.json
+        guilds = [guild_payload(index) for index in range(guild_count)]
+    if shard_count:
+        bot_main.bot.shard_count = shard_count
+    standin = DiscordStandIn(bot_main.bot, guilds=guilds, **standin_options)
+    standin.database = fakes.FakeDatabase(latency=db_latency, pool_size=db_pool_size)
+    standin.gemini = fakes.FakeGemini(latency=gemini_latency)
+    standin.tts = fakes.FakeTTS(latency=gtts_latency)
+    standin.extensions = list(bot_main.INITIAL_EXTENSIONS)
+    standin.database.install()
+    standin.install()
+    try:
+        async with bot_main.bot:
+            for wave in bot_main._plan_extension_waves(bot_main.INITIAL_EXTENSIONS):
+                await asyncio.gather(*(bot_main._load_extension(ext) for ext in wave))
+            standin.gemini.install() # image_analyzer_cog ต้องโหลดก่อน
+            standin.tts.install()
+            await standin.connect()
+            tts_cog = bot_main.bot.get_cog("TextToSpeechSchedulerCog")
+            if tts_cog and tts_cog.scheduler:
+                tts_cog.scheduler.pause()
+            yield standin
+    finally:
+        standin.gemini.uninstall()
+        standin.tts.uninstall()
+        standin.uninstall()
+        standin.database.uninstall()
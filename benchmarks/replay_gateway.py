@@ -0,0 +1,218 @@
+# benchmarks/replay_gateway.py
+"""
+เล่น event ที่บันทึกด้วย GATEWAY_RECORD_FILE ซ้ำกับบอทตัวจริง (bot.py) แบบ offline เร็วกว่าเวลาจริงได้
+
+รัน:  python benchmarks/replay_gateway.py gateway.jsonl --list
+      python benchmarks/replay_gateway.py gateway.jsonl --peak 600 --speed 10 [--session -1] [--json] [--calls-out calls.jsonl]
+      python benchmarks/replay_gateway.py gateway.jsonl --start 3600 --duration 900 --speed 100
+
+- guild/ช่อง/role มาจาก GUILD_CREATE ใน session นั้น และสมาชิกที่อยู่ในช่องเสียงตอนเริ่มช่วง
+  ถูกรวมจาก VOICE_STATE_UPDATE ก่อนหน้า (คนที่อยู่ในช่องอยู่แล้วตอนเริ่ม replay จะไม่ถูกนับว่า "เข้า" ใหม่)
+- config ใช้ bot_config.json ตามปกติ (หรือ --config) เพราะ id ในไฟล์เป็น id จริง
+- Discord API/Postgres/Gemini/gTTS เป็นของปลอมจาก harness.py/fakes.py, ไฟล์แนบใน DM ตอบด้วยรูปตัวอย่าง
+- job ของ APScheduler ไม่ใช่ gateway traffic จึงไม่ถูกเล่นซ้ำ (scheduler ถูก pause)
+
+latency ต่อ event คือเวลาตั้งแต่ event เข้า ConnectionState จนทุก handler ทำงานเสร็จ
+lateness คือ event ถูกส่งช้ากว่ากำหนดเท่าไร (loop ตามไม่ทัน speed ที่ขอ)
+"""
+import argparse
+import asyncio
+import copy
+import json
+import os
+import sys
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, List, Tuple
+
+import harness  # import fakes (ตั้ง sys.path) ก่อนโมดูลของบอท
+
+import bot_config
+import gateway_recorder
+
+Event = Tuple[float, str, Dict[str, Any]]
+
+
+# --- เลือกช่วงเวลา ---
+def busiest_window(events: List[Event], seconds: float) -> float:
+    """ms เริ่มต้นของช่วงยาว seconds ที่มี event (ไม่นับ GUILD_CREATE) มากที่สุด"""
+    times = [ms for ms, event, _ in events if event != "GUILD_CREATE"]
+    best_start, best_count, left = 0.0, 0, 0
+    for right, end in enumerate(times):
+        while end - times[left] > seconds * 1000:
+            left += 1
+        if right - left + 1 > best_count:
+            best_start, best_count = times[left], right - left + 1
+    return best_start
+
+
+def guilds_at(events: List[Event], start_ms: float) -> List[Dict[str, Any]]:
+    """GUILD_CREATE ล่าสุดก่อน start_ms (หรือตัวแรกของ guild) ของแต่ละ guild + voice state/สมาชิกจาก VOICE_STATE_UPDATE ก่อนหน้า"""
+    guilds: Dict[str, Dict[str, Any]] = {}
+    for ms, event, payload in events:
+        if event == "GUILD_CREATE" and (ms <= start_ms or payload["id"] not in guilds): # snapshot แรกมาหลัง header เล็กน้อย
+            guilds[payload["id"]] = copy.deepcopy(payload)
+        elif event == "VOICE_STATE_UPDATE" and ms <= start_ms and payload.get("guild_id") in guilds:
+            guild = guilds[payload["guild_id"]]
+            guild["voice_states"] = [state for state in guild.get("voice_states", []) if state["user_id"] != payload["user_id"]]
+            if payload.get("channel_id"):
+                guild["voice_states"].append({key: value for key, value in payload.items() if key not in ("guild_id", "member")})
+            member = payload.get("member")
+            if member and all(m["user"]["id"] != payload["user_id"] for m in guild["members"]):
+                guild["members"].append(member)
+    for guild in guilds.values():
+        # บอทต้องเป็นสมาชิกของ guild ที่ stand-in สร้าง (Guild.me) และ id บอทใน stand-in ไม่ตรงกับที่บันทึกไว้
+        guild["members"].append(harness.member_payload(harness.BOT_USER_ID))
+    return list(guilds.values())
+
+
+def describe_session(index: int, session: Dict[str, Any], peak_seconds: float) -> Dict[str, Any]:
+    events = session["events"]
+    duration = events[-1][0] / 1000 if events else 0.0
+    peak_start = busiest_window(events, peak_seconds)
+    peak_events = sum(1 for ms, event, _ in events if event != "GUILD_CREATE" and peak_start <= ms <= peak_start + peak_seconds * 1000)
+    return {
+        "session": index,
+        "started_at": datetime.fromtimestamp(session["header"].get("started_at", 0)).isoformat(timespec="seconds"),
+        "duration_sec": round(duration, 1),
+        "events": dict(Counter(event for _, event, _ in events)),
+        "peak_window_sec": peak_seconds,
+        "peak_start_sec": round(peak_start / 1000, 1),
+        "peak_events": peak_events,
+    }
+
+
+# --- replay ---
+def _summarize(latencies: List[float]) -> Dict[str, float]:
+    ordered = sorted(latencies) or [0.0]
+    pick = lambda q: round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 3)
+    return {"events": len(latencies), "p50_ms": pick(0.50), "p99_ms": pick(0.99), "max_ms": round(ordered[-1] * 1000, 3)}
+
+
+async def replay(args, window: List[Event], guilds: List[Dict[str, Any]]) -> Dict[str, Any]:
+    latencies: Dict[str, List[float]] = {}
+    lateness: List[float] = []
+    failures = Counter()
+    t0 = window[0][0] if window else 0.0
+
+    async with harness.offline_bot(
+        guilds=guilds or None, db_latency=args.db_latency_ms / 1000, gemini_latency=args.gemini_latency_ms / 1000,
+        gtts_latency=args.gtts_latency_ms / 1000, api_latency=args.api_latency_ms / 1000,
+        playback_seconds=args.playback_ms / 1000, cdn_fallback=harness.sample_image(),
+    ) as standin:
+        first_call = len(standin.recorder.calls)
+
+        async def one(event: str, payload: Dict[str, Any]):
+            started = time.perf_counter()
+            try:
+                await standin.dispatch(event, copy.deepcopy(payload)) # parser ของ discord.py แก้ dict ที่ได้รับ
+            except Exception:
+                failures[event] += 1 # event ที่อ้างถึงสิ่งที่ไม่มีใน snapshot (เช่น guild ที่ไม่ได้บันทึก)
+                return
+            latencies.setdefault(event, []).append(time.perf_counter() - started)
+
+        loop = asyncio.get_running_loop()
+        pending = []
+        started = loop.time()
+        for ms, event, payload in window:
+            due = started + (ms - t0) / 1000 / args.speed
+            delay = due - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            lateness.append(max(0.0, loop.time() - due))
+            pending.append(asyncio.create_task(one(event, payload)))
+        await asyncio.gather(*pending)
+        await standin.settle()
+        elapsed = loop.time() - started
+
+    if args.calls_out:
+        standin.recorder.write_jsonl(args.calls_out)
+    recorded_span = (window[-1][0] - t0) / 1000 if window else 0.0
+    return {
+        "python": sys.version.split()[0],
+        "guilds": len(guilds),
+        "window_start_sec": round(t0 / 1000, 1),
+        "recorded_sec": round(recorded_span, 1),
+        "replay_sec": round(elapsed, 2),
+        "speed_requested": args.speed,
+        "speed_achieved": round(recorded_span / elapsed, 1) if elapsed else 0.0,
+        "lateness": _summarize(lateness),
+        "by_event": {event: _summarize(values) for event, values in sorted(latencies.items())},
+        "failed_events": dict(failures),
+        "api_calls_by_route": standin.recorder.counts(since=first_call),
+        "db_writes": standin.database.calls,
+        "gemini_calls": standin.gemini.calls,
+        "gtts_calls": standin.tts.calls,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("file", help="ไฟล์จาก GATEWAY_RECORD_FILE")
+    parser.add_argument("--list", action="store_true", help="แสดง session ในไฟล์และช่วงที่มี event มากที่สุด แล้วจบ")
+    parser.add_argument("--session", type=int, default=-1, help="session ที่จะเล่น (ค่าเริ่มต้น: ล่าสุด)")
+    parser.add_argument("--start", type=float, default=0.0, help="วินาทีเริ่มต้นนับจากต้น session")
+    parser.add_argument("--duration", type=float, help="ความยาวช่วงที่เล่น (วินาที, ค่าเริ่มต้น: ถึงท้าย session)")
+    parser.add_argument("--peak", type=float, help="เล่นช่วง N วินาทีที่มี event มากที่สุดแทน --start/--duration")
+    parser.add_argument("--speed", type=float, default=10.0, help="ความเร็วเทียบเวลาจริง (1, 10, 100, ...)")
+    parser.add_argument("--config", help="bot_config.json ที่จะใช้ (ค่าเริ่มต้น: ของ repo)")
+    parser.add_argument("--api-latency-ms", type=float, default=0.0, help="เวลาตอบกลับของ Discord API ปลอม")
+    parser.add_argument("--db-latency-ms", type=float, default=0.5, help="เวลาตอบกลับของ Postgres ปลอม")
+    parser.add_argument("--gemini-latency-ms", type=float, default=50.0, help="เวลาตอบกลับของ Gemini ปลอม")
+    parser.add_argument("--gtts-latency-ms", type=float, default=200.0, help="เวลาสร้างไฟล์เสียงของ gTTS ปลอม")
+    parser.add_argument("--playback-ms", type=float, default=5.0, help="ความยาวเสียงที่ voice client ปลอม 'เล่น'")
+    parser.add_argument("--calls-out", help="เขียน API call ทั้งหมด (พร้อมเวลา) เป็น JSON lines")
+    parser.add_argument("--json", action="store_true", help="พิมพ์ผลเป็น JSON")
+    args = parser.parse_args()
+    if args.speed <= 0:
+        parser.error("--speed ต้องมากกว่า 0")
+
+    sessions = gateway_recorder.read_sessions(args.file)
+    if not sessions:
+        parser.error(f"ไม่พบ session ใน {args.file}")
+    if args.list:
+        rows = [describe_session(index, session, args.peak or 600) for index, session in enumerate(sessions)]
+        if args.json:
+            print(json.dumps(rows, ensure_ascii=False))
+            return
+        for row in rows:
+            counts = ", ".join(f"{event}={count}" for event, count in sorted(row["events"].items()))
+            print(f"[{row['session']}] {row['started_at']}  {row['duration_sec']}s  {counts}")
+            print(f"     busiest {row['peak_window_sec']:g}s: เริ่มที่ {row['peak_start_sec']}s ({row['peak_events']} events)")
+        return
+
+    events = sessions[args.session]["events"]
+    start_ms = busiest_window(events, args.peak) if args.peak else args.start * 1000
+    duration = args.peak or args.duration
+    end_ms = start_ms + duration * 1000 if duration else float("inf")
+    window = [(ms, event, payload) for ms, event, payload in events if event != "GUILD_CREATE" and start_ms <= ms <= end_ms]
+    guilds = guilds_at(events, start_ms)
+
+    if args.config:
+        bot_config.CONFIG_FILE = os.path.abspath(args.config) # bot.py เรียก bot_config.load() ตอน import
+    if args.calls_out:
+        args.calls_out = os.path.abspath(args.calls_out)
+    harness.configure_environment()
+    with harness.temp_workdir():
+        report = asyncio.run(replay(args, window, guilds))
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False))
+        return
+    print(f"\n== replay {args.file} [session {args.session}] {report['recorded_sec']}s จาก {report['window_start_sec']}s ==")
+    print(f"guilds: {report['guilds']}  speed: {report['speed_achieved']}x (ขอ {report['speed_requested']:g}x) ใน {report['replay_sec']}s")
+    print(f"lateness p50/p99/max: {report['lateness']['p50_ms']} / {report['lateness']['p99_ms']} / {report['lateness']['max_ms']} ms")
+    print(f"db writes: {report['db_writes']}  gemini: {report['gemini_calls']}  gtts: {report['gtts_calls']}")
+    print(f"{'event':<20} {'events':>7} {'p50 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for event, row in report["by_event"].items():
+        print(f"{event:<20} {row['events']:>7} {row['p50_ms']:>9} {row['p99_ms']:>9} {row['max_ms']:>9}")
+    for event, count in report["failed_events"].items():
+        print(f"{event:<20} {count:>7} failed")
+    print("api calls:")
+    for route, count in sorted(report["api_calls_by_route"].items()):
+        print(f"   {count:>6}  {route}")
+
+
+if __name__ == "__main__":
+    main()
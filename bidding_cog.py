@@ -22,6 +22,9 @@ BIDDING_CARDS: List[str] = [
 BIDDING_CHANNEL_ID = 1288876995836510322 # <<< ใส่ ID ช่องที่ถูกต้อง
 GUIDE_FILENAME = "bidding_guide.txt" # <<< ชื่อไฟล์คู่มือ
 
+# --- Gateway intents ที่ Cog นี้ต้องใช้ (bot.py รวมจากทุก extension) ---
+REQUIRED_INTENTS = ('guilds', 'members', 'guild_messages', 'message_content')
+
 # --- โครงสร้างข้อมูลสำหรับเก็บการประมูล ---
 # card_name -> list of bids
 # bid = {'user_id': int, 'user_mention': str, 'user_display_name': str, 'quantity': int, 'timestamp': int, 'done': bool}
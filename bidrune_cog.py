@@ -8,6 +8,12 @@ import logging
 import os # <<< สำหรับอ่านไฟล์
 from typing import Dict, List, Optional # เพิ่ม type hinting
 import json # <<< ADD THIS IMPORT
+import cog_handoff
+import bot_config
+import metrics
+import executors
+import guild_state
+import shutdown
 
 # ตั้งค่า logger สำหรับ Cog นี้
 log = logging.getLogger(__name__)
@@ -18,17 +24,65 @@ BIDDING_RUNES: List[str] = [
     "Netherforce"
 ]
 MAX_BIDS_PER_ITEM = 3 # <<< จำนวนสูงสุดของการประมูลต่อรูน
-# ID ของช่องที่จะส่งข้อความเริ่มต้นและข้อความประมูล (สำคัญ: แก้ไขเป็น ID ช่องของคุณ)
-BIDDING_CHANNEL_ID = 1387457247105515621 # <<< ใส่ ID ช่องที่ถูกต้อง
+# ID ของช่องประมูลตั้งค่าใน bot_config.json (field: bidding_channel_id ของแต่ละ guild)
 GUIDE_FILENAME = "bidding_guide.txt" # <<< ชื่อไฟล์คู่มือ
+# state การประมูลแยกไฟล์ต่อ guild: guild หลัก (guild แรกที่ตั้ง bidding_channel_id) ใช้ชื่อไฟล์เดิม
+# ส่วน guild อื่นใช้ bidding_state_<guild_id>.json (process ที่รันคนละ SHARD_IDS จึงไม่เขียนไฟล์เดียวกัน)
+STATE_FILENAME = "bidding_state.json"
+
+# --- Gateway intents ที่ Cog นี้ต้องใช้ (bot.py รวมจากทุก extension) ---
+# members สำหรับแปลง @User ในคำสั่ง Admin, guild_messages + message_content สำหรับคำสั่งแบบ prefix
+REQUIRED_INTENTS = ('guilds', 'members', 'guild_messages', 'message_content')
+
+# --- Metrics ---
+BID_CLICKS_METRIC = "bid_button_clicks_total"
+BID_EDIT_METRIC = "bid_message_edit_seconds"
+metrics.describe(BID_CLICKS_METRIC, "counter", "Clicks on the persistent bidding buttons, by button.")
+metrics.describe(BID_EDIT_METRIC, "histogram", "Latency of editing the bidding message, by edit path.")
 
 # --- โครงสร้างข้อมูลสำหรับเก็บการประมูล ---
 # rune_name -> list of bids
 # bid = {'user_id': int, 'user_mention': str, 'user_display_name': str, 'quantity': int, 'timestamp': int, 'done': bool}
 BiddingDataType = Dict[str, List[Dict[str, any]]]
 
+# --- state ต่อ guild ---
+class GuildBidding:
+    """การประมูลของ guild หนึ่ง: แต่ละ guild มีรายการ bid, ข้อความประมูล, สถานะ pause และ lock ของตัวเอง"""
+    def __init__(self, guild_id: int):
+        self.guild_id = guild_id
+        self.rune_bids: BiddingDataType = {rune: [] for rune in BIDDING_RUNES}
+        self.rune_bid_order: List[str] = []
+        self.bidding_message_id: Optional[int] = None
+        self.is_paused: bool = False
+        self.message_lock = asyncio.Lock()
+
+    def to_dict(self) -> Dict[str, any]:
+        return {
+            'rune_bids': self.rune_bids,
+            'rune_bid_order': self.rune_bid_order,
+            'bidding_message_id': self.bidding_message_id,
+            'is_paused': self.is_paused,
+        }
+
+
+def _guild_attribute(name: str):
+    """attribute ของ Cog ที่อ่าน/เขียน state ของ guild ปัจจุบัน (ดู BiddingCog.state)"""
+    return property(lambda self: getattr(self.state, name), lambda self, value: setattr(self.state, name, value))
+
+
 # --- คลาส UI Components (Buttons, Select, View) ---
 
+class GuildScopedView(View):
+    """
+    View ที่ callback ทำงานกับการประมูลของ guild ที่ interaction มาจาก
+    discord.py รัน interaction_check กับ callback ของปุ่มใน task เดียวกัน ค่า current_guild_id จึงอยู่ถึง callback
+    (View ทุกตัวของ Cog นี้ รวมถึง View ย่อยแบบ ephemeral ต้องสืบทอดจากคลาสนี้)
+    """
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        guild_state.current_guild_id.set(interaction.guild_id)
+        return True
+
+
 class RuneButton(Button):
     def __init__(self, rune_label: str, *, cog_instance, disabled: bool = False):
         safe_label = "".join(c for c in rune_label if c.isalnum())
@@ -37,6 +91,7 @@ class RuneButton(Button):
         self.cog = cog_instance
 
     async def callback(self, interaction: discord.Interaction):
+        metrics.inc(BID_CLICKS_METRIC, button="rune")
         if self.cog.is_paused:
             await interaction.response.send_message("Bidding is currently paused. // ระบบประมูลกำลังหยุดชั่วคราว", ephemeral=True)
             return
@@ -68,6 +123,7 @@ class ClearBidsButton(Button):
         self.cog = cog_instance
 
     async def callback(self, interaction: discord.Interaction):
+        metrics.inc(BID_CLICKS_METRIC, button="clear")
         if self.cog.is_paused:
             await interaction.response.send_message("Bidding is currently paused. // ระบบประมูลกำลังหยุดชั่วคราว", ephemeral=True)
             return
@@ -86,7 +142,7 @@ class ClearBidsButton(Button):
             return
 
         # --- Create a custom View class that accepts the cog instance ---
-        class ChoiceView(View):
+        class ChoiceView(GuildScopedView):
             def __init__(self, cog_instance):
                 super().__init__(timeout=60)
                 self.cog = cog_instance # Store the cog instance
@@ -131,6 +187,7 @@ class DoneBiddingButton(Button):
         self.cog = cog_instance
 
     async def callback(self, interaction: discord.Interaction):
+        metrics.inc(BID_CLICKS_METRIC, button="done")
         if self.cog.is_paused:
             await interaction.response.send_message("Bidding is currently paused. // ระบบประมูลกำลังหยุดชั่วคราว", ephemeral=True)
             return
@@ -198,13 +255,13 @@ class DoneBiddingButton(Button):
 
             bid_select.callback = bid_select_callback
             
-            bid_view = View(timeout=180)
+            bid_view = GuildScopedView(timeout=180)
             bid_view.add_item(bid_select)
             await rune_interaction.followup.send("Now, select the specific bids to mark as done:", view=bid_view, ephemeral=True)
 
         rune_select.callback = rune_select_callback
         
-        rune_view = View(timeout=180)
+        rune_view = GuildScopedView(timeout=180)
         rune_view.add_item(rune_select)
         await interaction.response.send_message("First, choose the item whose bids you want to manage:", view=rune_view, ephemeral=True)
 
@@ -215,6 +272,7 @@ class RestartButton(Button):
         self.cog = cog_instance
 
     async def callback(self, interaction: discord.Interaction):
+        metrics.inc(BID_CLICKS_METRIC, button="restart")
         if not interaction.user.guild_permissions.administrator:
             await interaction.response.send_message("You do not have permission to restart bidding.", ephemeral=True)
             return
@@ -253,12 +311,13 @@ class RefreshButton(Button):
         self.cog = cog_instance
 
     async def callback(self, interaction: discord.Interaction):
+        metrics.inc(BID_CLICKS_METRIC, button="refresh")
         await interaction.response.defer()
         # <<< [แก้ไข] เอา `view=self.view` ออกจากการเรียกฟังก์ชัน
         await self.cog.update_bidding_message(interaction=interaction, is_interaction_edit=True)
 
 
-class BiddingView(View):
+class BiddingView(GuildScopedView):
     # ทำให้ View สามารถถูกสร้างใหม่ได้ง่าย และจัดการปุ่มต่างๆ
     ## <<< [แก้ไข] รับ is_paused เพื่อกำหนดสถานะปุ่ม
     def __init__(self, cog_instance, *, is_paused: bool = False, timeout=None):
@@ -281,7 +340,7 @@ class BiddingView(View):
         # ปุ่ม Restart สำหรับ Admin ไม่ต้อง disable
         self.add_item(RestartButton(cog_instance=self.cog))
 
-class ConfirmRestartView(View):
+class ConfirmRestartView(GuildScopedView):
     def __init__(self, cog_instance):
         super().__init__(timeout=30)  # Short timeout for safety
         self.cog = cog_instance
@@ -323,93 +382,156 @@ class ConfirmRestartView(View):
 
 # --- คลาส Cog หลัก ---
 class BiddingCog(commands.Cog):
+    # state ของ guild ปัจจุบัน: โค้ดในคำสั่ง/ปุ่มใช้ self.rune_bids ฯลฯ ได้เหมือนตอนมี guild เดียว
+    rune_bids = _guild_attribute('rune_bids')
+    rune_bid_order = _guild_attribute('rune_bid_order')
+    bidding_message_id = _guild_attribute('bidding_message_id')
+    is_paused = _guild_attribute('is_paused')
+    message_lock = _guild_attribute('message_lock')
+
     def __init__(self, bot: commands.Bot):
         self.bot = bot
-        # Assign the constant from the top of the file to this instance of the cog
-        self.bidding_channel_id: int = BIDDING_CHANNEL_ID
-        log.info(f"BiddingCog: Initializing with channel ID: {self.bidding_channel_id}")
-        # Default empty values before loading
-        self.rune_bids: BiddingDataType = {}
-        self.rune_bid_order: List[str] = []
-        self.bidding_message_id: Optional[int] = None
-        self.is_paused: bool = False
-        
-        self.persistent_view_added = False
-        self.message_lock = asyncio.Lock()
+        log.info(f"BiddingCog: Initializing with channel ID: {bot_config.get().bidding_channel_id()}")
+        # (shard, guild) -> GuildBidding (guild ที่ยังไม่เคยใช้จะโหลดจากไฟล์ของตัวเองตอนใช้ครั้งแรก)
+        self.guilds: guild_state.GuildStateMap[GuildBidding] = guild_state.GuildStateMap(bot, self._load_state)
         
-        self._load_state() # <<< LOAD THE SAVED STATE HERE
-
-        log.info(f"BiddingCog: โหลดสำเร็จ จัดการประมูลสำหรับช่อง ID: {self.bidding_channel_id}")
-
-    
-    def _load_state(self):
-        """Loads state from file, or initializes fresh state if file not found."""
+        handoff_state = cog_handoff.take(__name__) # มีค่าเมื่อถูก !reload จาก instance เดิม
+        if handoff_state is not None:
+            self.import_state(handoff_state)
+        else:
+            # โหลด guild ที่ตั้งค่าไว้ล่วงหน้า เพื่อให้ cog_load ผูก Persistent View กับข้อความประมูลของทุก guild ได้
+            for guild_id, guild in bot_config.get().guilds.items():
+                if guild.bidding_channel_id:
+                    self.guilds.get(guild_id) # <<< LOAD THE SAVED STATE HERE
+
+        log.info(f"BiddingCog: โหลดสำเร็จ จัดการประมูล {len(self.guilds)} guild")
+
+    @property
+    def default_guild_id(self) -> int:
+        """guild หลัก (guild แรกที่ตั้ง bidding_channel_id) ใช้เมื่อไม่มี interaction/คำสั่งระบุ guild เช่น benchmark/admin script"""
+        return next((guild_id for guild_id, guild in bot_config.get().guilds.items() if guild.bidding_channel_id), 0)
+
+    @property
+    def state(self) -> GuildBidding:
+        """การประมูลของ guild ที่ task ปัจจุบันทำงานให้ (ตั้งจาก cog_before_invoke / GuildScopedView)"""
+        return self.guilds.get(guild_state.current_guild_id.get() or self.default_guild_id)
+
+    @property
+    def bidding_channel_id(self) -> Optional[int]:
+        """ช่องประมูลของ guild ปัจจุบันจาก config (อ่านทุกครั้ง จึงเปลี่ยนได้ด้วย !reloadconfig)"""
+        return bot_config.get().bidding_channel_id(self.state.guild_id)
+
+    async def cog_before_invoke(self, ctx: commands.Context):
+        # คำสั่ง (เช่น !pause) ทำงานกับการประมูลของ guild ที่พิมพ์คำสั่ง
+        guild_state.current_guild_id.set(ctx.guild.id if ctx.guild else None)
+
+    def _state_filename(self, guild_id: int) -> str:
+        if not guild_id or guild_id == self.default_guild_id:
+            return STATE_FILENAME
+        return f"bidding_state_{guild_id}.json"
+
+    def _load_state(self, guild_id: int) -> GuildBidding:
+        """Loads a guild's state from its file, or initializes fresh state if file not found."""
+        state = GuildBidding(guild_id)
+        filename = self._state_filename(guild_id)
         try:
-            with open("bidding_state.json", 'r', encoding='utf-8') as f:
-                state = json.load(f)
+            with open(filename, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
             # If file is found, load data from it
-            self.rune_bids = state.get('rune_bids', {rune: [] for rune in BIDDING_RUNES})
-            self.rune_bid_order = state.get('rune_bid_order', [])
-            self.bidding_message_id = state.get('bidding_message_id')
-            self.is_paused = state.get('is_paused', False)
-            log.info(f"Successfully loaded state from bidding_state.json. Message ID: {self.bidding_message_id}")
+            state.rune_bids = saved.get('rune_bids', {rune: [] for rune in BIDDING_RUNES})
+            state.rune_bid_order = saved.get('rune_bid_order', [])
+            state.bidding_message_id = saved.get('bidding_message_id')
+            state.is_paused = saved.get('is_paused', False)
+            log.info(f"Successfully loaded state from {filename} (guild {guild_id}). Message ID: {state.bidding_message_id}")
 
         except FileNotFoundError:
-            # If file is NOT found, this is a fresh start. Initialize all data.
-            log.warning("bidding_state.json not found. Initializing a fresh state.")
-            self.rune_bids = {rune: [] for rune in BIDDING_RUNES}
-            self.rune_bid_order = []
-            self.bidding_message_id = None
-            self.is_paused = False
+            # If file is NOT found, this is a fresh start.
+            log.warning(f"{filename} not found. Initializing a fresh state for guild {guild_id}.")
             
         except (json.JSONDecodeError, IOError) as e:
-            log.error(f"Error loading state from bidding_state.json: {e}. Starting with a fresh state.")
-            # Also initialize a fresh state on error
-            self.rune_bids = {rune: [] for rune in BIDDING_RUNES}
-            self.rune_bid_order = []
-            self.bidding_message_id = None
-            self.is_paused = False
+            log.error(f"Error loading state from {filename}: {e}. Starting guild {guild_id} with a fresh state.")
+            state = GuildBidding(guild_id)
+        # รูนที่เพิ่มเข้ามาในโค้ดใหม่ยังไม่มีรายการ bid
+        for rune in BIDDING_RUNES:
+            state.rune_bids.setdefault(rune, [])
+        return state
+
+    # --- ส่งต่อ state ระหว่าง !reload (ดู cog_handoff.py) ---
+    async def export_state(self) -> Dict[str, any]:
+        """Hands the live bidding state to the reloaded instance without a round-trip through the state files."""
+        guilds = dict(self.guilds.items())
+        for state in guilds.values():
+            async with state.message_lock: # รอการแก้ไขที่กำลังทำอยู่ของแต่ละ guild ให้เสร็จ
+                pass
+        # ส่ง GuildBidding ตัวเดิมต่อ (รวม lock) เพื่อให้ interaction ที่ยังค้างอยู่กับ instance เก่าไม่ชนกับตัวใหม่
+        return {'guilds': guilds}
+
+    def import_state(self, state: Dict[str, any]):
+        if 'guilds' not in state:
+            # state จากโค้ดรุ่นก่อนที่มีการประมูลชุดเดียว: เป็นของ guild หลัก
+            legacy = GuildBidding(self.default_guild_id)
+            legacy.rune_bids = state['rune_bids']
+            legacy.rune_bid_order = state['rune_bid_order']
+            legacy.bidding_message_id = state['bidding_message_id']
+            legacy.is_paused = state['is_paused']
+            legacy.message_lock = state['message_lock']
+            state = {'guilds': {legacy.guild_id: legacy}}
+        for guild_id, guild_bidding in state['guilds'].items():
+            for rune in BIDDING_RUNES:
+                guild_bidding.rune_bids.setdefault(rune, [])
+            self.guilds.put(guild_id, guild_bidding)
+        log.info(f"BiddingCog: รับ state ต่อจาก instance เดิม ({len(self.guilds)} guild)")
+
+    async def cog_load(self):
+        # ผูก Persistent View ครั้งเดียวตอนโหลด Cog (ก่อน login หรือตอน !reload) ไม่ต้องรอ on_ready ที่เกิดซ้ำทุกครั้งที่ reconnect
+        self._add_persistent_view()
+        shutdown.register("bidding_state", self._drain, deadline=5.0)
+        for guild_id, state in self.guilds.items():
+            if state.bidding_message_id:
+                log.info(f"พบ Bidding Message ID ที่บันทึกไว้ของ guild {guild_id}: {state.bidding_message_id}")
+            else:
+                log.warning(f"ไม่พบ Bidding Message ID ที่บันทึกไว้ของ guild {guild_id}. อาจต้องใช้ !startbiddingrune เพื่อสร้างใหม่")
+
+    async def cog_unload(self):
+        shutdown.unregister("bidding_state", self._drain)
+
+    async def _drain(self):
+        """ตอนปิดบอท: รอปุ่ม/คำสั่งที่กำลังแก้การประมูลและเขียน state file ของทุก guild ให้เสร็จ (ไม่ให้ไฟล์ถูกตัดกลางคัน)"""
+        for _, state in self.guilds.items():
+            async with state.message_lock:
+                pass
+
+    def _add_persistent_view(self):
+        # add_view แทนที่ view เดิมที่ใช้ custom_id เดียวกัน ปุ่มจึงเรียก instance ใหม่ทันที
+        # view ทั่วไปตัวเดียวใช้ได้ทุก guild เพราะ GuildScopedView เลือก state ตาม guild ของ interaction
+        self.bot.add_view(BiddingView(cog_instance=self, timeout=None))
+        for guild_id, state in self.guilds.items():
+            if state.bidding_message_id:
+                # view ที่ผูกกับ message id (จาก message.edit) มีลำดับก่อน view ทั่วไป จึงต้องแทนที่ด้วย
+                persistent_view = BiddingView(cog_instance=self, is_paused=state.is_paused, timeout=None)
+                self.bot.add_view(persistent_view, message_id=state.bidding_message_id)
 
     async def _save_state(self):
-        """Saves the current bidding state to a JSON file asynchronously."""
+        """Saves the current guild's bidding state to its JSON file asynchronously."""
         # Use the lock to prevent race conditions while saving
         async with self.message_lock:
             await self._save_state_nolock()
 
     async def _save_state_nolock(self):
-        """Saves the current bidding state. ASSUMES a lock is already held."""
+        """Saves the current guild's bidding state. ASSUMES its lock is already held."""
+        state = self.state
+        filename = self._state_filename(state.guild_id)
         try:
-            state = {
-                'rune_bids': self.rune_bids,
-                'rune_bid_order': self.rune_bid_order,
-                'bidding_message_id': self.bidding_message_id,
-                'is_paused': self.is_paused
-            }
-            # (If you implemented the async file I/O from the previous review, keep it here)
+            data = state.to_dict()
+            # lock ของ guild ถูกถืออยู่ตลอดการเขียน จึงไม่มีการเขียนไฟล์เดียวกันซ้อนกัน (guild อื่นเขียนไฟล์ของตัวเองได้พร้อมกัน)
             def dump_to_file():
-                with open("bidding_state.json", 'w', encoding='utf-8') as f:
-                    json.dump(state, f, indent=4)
-            await self.bot.loop.run_in_executor(None, dump_to_file)
+                with open(filename, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, indent=4)
+            await executors.run('disk', dump_to_file)
             
-            log.debug("State successfully saved to bidding_state.json (nolock)")
+            log.debug(f"State successfully saved to {filename} (nolock)")
         except (IOError, TypeError) as e:
-            log.error(f"Failed to save state (nolock): {e}")
-
-    # --- Listener สำหรับ View แบบถาวร ---
-    @commands.Cog.listener()
-    async def on_ready(self):
-        if not self.persistent_view_added:
-             log.info("BiddingCog: on_ready - กำลังตรวจสอบ/เพิ่ม Persistent View...")
-             ## <<< [แก้ไข] ส่งสถานะ is_paused ปัจจุบัน (ซึ่งคือ False ตอนเริ่ม)
-             persistent_view = BiddingView(cog_instance=self, is_paused=self.is_paused, timeout=None)
-             self.bot.add_view(persistent_view)
-             self.persistent_view_added = True
-             log.info("BiddingCog: Persistent View ถูกเพิ่ม/ตรวจสอบแล้ว")
-             if self.bidding_message_id:
-                  log.info(f"พบ Bidding Message ID ที่บันทึกไว้: {self.bidding_message_id}")
-             else:
-                  log.warning("ไม่พบ Bidding Message ID ที่บันทึกไว้. อาจต้องใช้ !startbiddingrune เพื่อสร้างใหม่")
-
+            log.error(f"Failed to save state to {filename} (nolock): {e}")
 
     ## <<< [เพิ่ม] คำสั่ง !pause
     @commands.command(name="pause")
@@ -526,8 +648,8 @@ class BiddingCog(commands.Cog):
         """
         try:
             # We assume the message is in the same channel as the command is used,
-            # or in the globally configured BIDDING_CHANNEL_ID.
-            channel = self.bot.get_channel(self.bidding_channel_id) or ctx.channel
+            # or in the bidding channel configured for this guild.
+            channel = self.bot.get_channel(bot_config.get().bidding_channel_id(ctx.guild.id)) or ctx.channel
             
             msg_to_delete = await channel.fetch_message(message_id)
             await msg_to_delete.delete()
@@ -606,7 +728,7 @@ class BiddingCog(commands.Cog):
     @commands.guild_only()
     async def start_bidding(self, ctx: commands.Context, channel: Optional[discord.TextChannel] = None):
         """Creates the initial bidding messages in the specified channel (Admin only)."""
-        target_channel = channel or ctx.guild.get_channel(self.bidding_channel_id) or ctx.channel
+        target_channel = channel or ctx.guild.get_channel(bot_config.get().bidding_channel_id(ctx.guild.id)) or ctx.channel
         if not target_channel or not isinstance(target_channel, discord.TextChannel):
             await ctx.send("Could not find a valid text channel to send the bidding message.", ephemeral=True)
             return
@@ -924,17 +1046,21 @@ class BiddingCog(commands.Cog):
 
         try:
             if isinstance(edit_target, discord.Interaction):
-                await edit_target.edit_original_response(content=new_content, view=current_view)
+                with metrics.timer(BID_EDIT_METRIC, path="interaction"):
+                    await edit_target.edit_original_response(content=new_content, view=current_view)
                 message_edited = True
             elif isinstance(edit_target, discord.Message):
-                await edit_target.edit(content=new_content, view=current_view)
+                with metrics.timer(BID_EDIT_METRIC, path="message"):
+                    await edit_target.edit(content=new_content, view=current_view)
                 message_edited = True
             elif target_message_id:
-                channel = self.bot.get_channel(self.bidding_channel_id) or await self.bot.fetch_channel(self.bidding_channel_id)
-                if channel and isinstance(channel, discord.TextChannel):
-                    msg = await channel.fetch_message(target_message_id)
-                    await msg.edit(content=new_content, view=current_view)
-                    message_edited = True
+                # รวมเวลา fetch ช่อง/ข้อความ เพราะเป็นส่วนหนึ่งของ latency ที่ผู้ใช้เห็น
+                with metrics.timer(BID_EDIT_METRIC, path="fetch"):
+                    channel = self.bot.get_channel(self.bidding_channel_id) or await self.bot.fetch_channel(self.bidding_channel_id)
+                    if channel and isinstance(channel, discord.TextChannel):
+                        msg = await channel.fetch_message(target_message_id)
+                        await msg.edit(content=new_content, view=current_view)
+                        message_edited = True
         except discord.NotFound:
             log.error(f"Cannot update message (nolock): Not Found (ID: {target_message_id})")
             if target_message_id and target_message_id == self.bidding_message_id:
@@ -945,7 +1071,7 @@ class BiddingCog(commands.Cog):
             log.exception(f"Unexpected error updating message (nolock) (ID: {target_message_id}): {e}")
 
         if message_edited:
-            log.info(f"Successfully updated bidding message (nolock) (ID: {target_message_id or 'unknown'})")
+            log.debug(f"Successfully updated bidding message (nolock) (ID: {target_message_id or 'unknown'})")
         else:
             log.warning("Failed to update bidding message (nolock)")
 
@@ -1,19 +1,36 @@
 import os
+import ast
 import asyncio
+import importlib.util
 import logging # <<< เพิ่ม logging
+import time
 from dotenv import load_dotenv
+
+# Load environment variables from .env file
+# ต้องโหลดก่อน import โมดูลภายใน (log_setup, metrics, db_manager ฯลฯ อ่าน env ตอน import)
+load_dotenv()
+
+import log_setup
 import discord
 from discord.ext import commands
 import db_manager
+import startup_timing
+import lazy_imports
+import bot_config
+import metrics
+import loop_watchdog
+import loop_runtime
+import gateway_recorder
+import executors
+import memory_tracker
+import shutdown
+import supervisor
 
 # --- ตั้งค่า Logging ---
-# ตั้งค่าพื้นฐานเพื่อให้เห็น log จาก Cog อื่นๆ ด้วย
-logging.basicConfig(level=logging.INFO, format='%(asctime)s:%(levelname)s:%(name)s: %(message)s')
+# ตั้งค่าที่ root logger เพื่อให้เห็น log จาก Cog อื่นๆ ด้วย (LOG_MODE=json = เขียน log ผ่านคิวใน thread แยก, ดู log_setup.py)
+log_setup.configure()
 log = logging.getLogger(__name__) # Logger สำหรับ bot.py
 
-# Load environment variables from .env file
-load_dotenv()
-
 # Get the bot token from the environment variables
 BOT_TOKEN = os.getenv('DISCORD_BOT_TOKEN')
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY') # ยังคงเช็คเพื่อให้แน่ใจว่ามีสำหรับ Image Cog
@@ -24,18 +41,13 @@ if not BOT_TOKEN:
 if not GEMINI_API_KEY:
      log.warning("!!! คำเตือน: ไม่พบ GEMINI_API_KEY ใน .env ไฟล์, Image Analyzer Cog อาจไม่ทำงาน")
 
+# --- โหลด Config (bot_config.json + env overrides) ก่อน Cog ใดๆ ---
+try:
+    bot_config.load()
+except ValueError as e:
+    log.critical(f"!!! ข้อผิดพลาด: {e}")
+    exit()
 
-# --- ตั้งค่า Intents ---
-intents = discord.Intents.default()
-intents.messages = True
-intents.guilds = True
-intents.members = True           # <<< สำคัญสำหรับ voice logging และ bidding เพื่อดึงข้อมูล member
-intents.voice_states = True      # <<< สำคัญสำหรับ voice logging
-intents.message_content = True   # <<< สำคัญสำหรับ image analyzer (และอาจจะคำสั่งบางอย่าง)
-intents.dm_messages = True       # <<< สำคัญสำหรับ image analyzer ใน DM
-
-# --- สร้าง Bot Instance ---
-bot = commands.Bot(command_prefix="!", intents=intents)
 
 # --- รายการ Cogs ที่จะโหลด ---
 # ใส่ชื่อไฟล์ cog (ไม่ต้องมี .py)
@@ -45,9 +57,181 @@ INITIAL_EXTENSIONS = [
     # 'bidding_cog',         # <<< คอมเมนต์ออกเพื่อ disable Bidding System ชั่วคราว
     'tts_scheduler_cog',
     'bidrune_cog',  # Cog สำหรับระบบประมูล Rune
+    'admin_cog',    # คำสั่งสำหรับ Admin (สถิติ/วินิจฉัยบอท)
 ]
 
+# --- ตั้งค่า Intents ---
+# แต่ละ cog ประกาศ REQUIRED_INTENTS ไว้ในไฟล์ของตัวเอง บอทจะเปิดเฉพาะ intents ที่ cog ที่โหลดต้องใช้
+# (event ที่ไม่มี cog ไหนใช้ เช่น typing, reactions จะไม่ถูกส่งมาจาก gateway เลย)
+BASE_INTENTS = ('guilds',)
+
+def _read_required_intents(extension):
+    """
+    อ่าน REQUIRED_INTENTS จาก source ของ extension โดยไม่ import (ไม่ให้โค้ดระดับโมดูลของ cog รันสองรอบ
+    และเวลา import ไปอยู่ใน load_extension ที่จับเวลา/แยกหน่วยความจำไว้) ต้องเป็น tuple/list ของ string ตรงๆ
+    คืน None ถ้าไม่ได้ประกาศ
+    """
+    spec = importlib.util.find_spec(extension)
+    if spec is None or not spec.origin:
+        raise ModuleNotFoundError(f"ไม่พบโมดูล '{extension}'")
+    with open(spec.origin, encoding='utf-8') as f:
+        tree = ast.parse(f.read(), filename=spec.origin)
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and any(isinstance(target, ast.Name) and target.id == 'REQUIRED_INTENTS' for target in node.targets):
+            return ast.literal_eval(node.value)
+    return None
+
+def _build_intents(extensions):
+    """รวม REQUIRED_INTENTS จากทุก extension เป็น Intents ชุดที่เล็กที่สุด"""
+    intents = discord.Intents.none()
+    for name in BASE_INTENTS:
+        setattr(intents, name, True)
+    for extension in extensions:
+        try:
+            required = _read_required_intents(extension)
+        except Exception as e:
+            # load_extension จะรายงานข้อผิดพลาดนี้อีกครั้งตอนโหลดจริง
+            log.error(f"❌ ไม่สามารถอ่าน REQUIRED_INTENTS ของ Extension '{extension}': {e}")
+            continue
+        if required is None:
+            log.warning(f"⚠️ Extension '{extension}' ไม่ได้ประกาศ REQUIRED_INTENTS จะใช้ Intents.default() แทน")
+            intents.value |= discord.Intents.default().value
+            continue
+        for name in required:
+            setattr(intents, name, True)
+    return intents
+
+intents = _build_intents(INITIAL_EXTENSIONS)
+log.info(f"Gateway intents: {', '.join(name for name, value in intents if value)}")
+
+# --- นโยบาย cache สมาชิก ---
+# MEMBER_CACHE_MODE=full (ค่าเริ่มต้น): chunk ทุก guild ตอน login และ cache สมาชิกทุกคน (พฤติกรรมเดิม)
+# MEMBER_CACHE_MODE=lean: ไม่ chunk ตอน startup และ cache เฉพาะสมาชิกที่อยู่ในช่องเสียง
+#   คำสั่งที่รับ discord.Member จะ query สมาชิกที่ไม่อยู่ใน cache จาก gateway เอง (converter ของ discord.py)
+MEMBER_CACHE_MODE = os.getenv('MEMBER_CACHE_MODE', 'full').lower()
+if MEMBER_CACHE_MODE == 'lean':
+    member_cache_flags = discord.MemberCacheFlags.none()
+    member_cache_flags.voice = intents.voice_states
+    chunk_guilds_at_startup = False
+else:
+    member_cache_flags = discord.MemberCacheFlags.from_intents(intents)
+    chunk_guilds_at_startup = intents.members # chunk ได้เฉพาะเมื่อเปิด members intent
+
+# --- Sharding ---
+# SHARDING=off (ค่าเริ่มต้น): commands.Bot ต่อ gateway connection เดียว
+# SHARDING=auto: commands.AutoShardedBot แบ่ง guild ตาม shard (Discord แนะนำจำนวน shard ให้ หรือกำหนด SHARD_COUNT)
+#   ทุก shard ยังรันบน event loop เดียวกันใน process นี้ ถ้าต้องการกระจายไปหลาย process/เครื่อง
+#   ให้รันหลาย process ที่ใช้ SHARD_COUNT เดียวกัน แต่ละตัวกำหนด SHARD_IDS ของตัวเอง (เช่น SHARD_IDS=0,1 และ SHARD_IDS=2,3)
+# Cog ที่มี state เก็บแยกตาม (shard, guild) ผ่าน guild_state.py
+SHARDING = os.getenv('SHARDING', 'off').lower()
+SHARD_COUNT = int(os.getenv('SHARD_COUNT', '0')) or None
+SHARD_IDS = [int(part) for part in os.getenv('SHARD_IDS', '').replace(';', ',').split(',') if part.strip()] or None
+
+if SHARDING == 'auto' and SHARD_IDS and not SHARD_COUNT:
+    log.critical("!!! ข้อผิดพลาด: SHARD_IDS ต้องใช้คู่กับ SHARD_COUNT")
+    exit()
+
+# --- สร้าง Bot Instance ---
+bot_options = dict(
+    command_prefix="!",
+    intents=intents,
+    member_cache_flags=member_cache_flags,
+    chunk_guilds_at_startup=chunk_guilds_at_startup,
+)
+if SHARDING == 'auto':
+    bot = commands.AutoShardedBot(shard_count=SHARD_COUNT, shard_ids=SHARD_IDS, **bot_options)
+    log.info(f"Sharding: AutoShardedBot (shard_count={SHARD_COUNT or 'auto'}, shard_ids={SHARD_IDS or 'all'})")
+else:
+    bot = commands.Bot(**bot_options)
+
+# --- ลำดับการโหลด Extension ---
+# extension -> รายการ extension ที่ต้องโหลดเสร็จก่อน (ที่ไม่ได้ระบุไว้จะโหลดพร้อมกันได้)
+EXTENSION_DEPENDENCIES = {
+}
+
+# --- Module ภายนอกที่หนักของแต่ละ extension ---
+# Cog จะ import module เหล่านี้เองตอนใช้งานครั้งแรก (ดู lazy_imports.py)
+# PREWARM_IMPORTS ใน .env กำหนดว่าจะ import ล่วงหน้าเมื่อไหร่:
+#   'after_ready' (ค่าเริ่มต้น) = import ใน background หลัง on_ready ครั้งแรก (บอทออนไลน์เร็วที่สุด)
+#   'startup' = import ขนานกันใน thread ก่อนโหลด extension (ออนไลน์ช้ากว่า แต่ใช้งานครั้งแรกไม่ต้องรอ)
+#   'off' = ไม่ import ล่วงหน้าเลย
+PREWARM_IMPORTS = os.getenv('PREWARM_IMPORTS', 'after_ready').lower()
+EXTENSION_IMPORTS = {
+    'image_analyzer_cog': ['google.generativeai', 'PIL.Image'],
+    'tts_scheduler_cog': ['gtts', 'apscheduler.schedulers.asyncio', 'apscheduler.triggers.cron'],
+}
+
+
+def _plan_extension_waves(extensions):
+    """แบ่ง extensions เป็นรอบ (wave) ตาม EXTENSION_DEPENDENCIES; extension ในรอบเดียวกันโหลดพร้อมกันได้"""
+    remaining = list(extensions)
+    loaded = set()
+    waves = []
+    while remaining:
+        wave = [
+            ext for ext in remaining
+            if all(dep in loaded or dep not in extensions for dep in EXTENSION_DEPENDENCIES.get(ext, []))
+        ]
+        if not wave:
+            log.error(f"พบ dependency วนกันระหว่าง extensions: {remaining} จะโหลดทีละตัวตามลำดับแทน")
+            waves.extend([ext] for ext in remaining)
+            break
+        waves.append(wave)
+        loaded.update(wave)
+        remaining = [ext for ext in remaining if ext not in loaded]
+    return waves
+
+
+async def _preimport_extension(extension):
+    """import module หนักๆ ของ extension ใน thread แยก เพื่อไม่ให้ต้องรอกันทีละตัว (โหมด 'startup')"""
+    module_names = EXTENSION_IMPORTS.get(extension)
+    if not module_names:
+        return
+    with startup_timing.timed(extension, 'import'):
+        await lazy_imports.prewarm(module_names)
+
+
+_prewarm_started = False
+
+def _start_background_prewarm():
+    """import module หนักๆ ของ extension ที่โหลดอยู่ใน background (โหมด 'after_ready')"""
+    global _prewarm_started
+    if _prewarm_started:
+        return
+    _prewarm_started = True
+    module_names = [name for ext in bot.extensions for name in EXTENSION_IMPORTS.get(ext, [])]
+    supervisor.spawn("prewarm_imports", lambda: lazy_imports.prewarm(module_names))
+
+
+async def _load_extension(extension):
+    """โหลด extension หนึ่งตัว (จับเวลา exec module ของ cog + setup() และ on_ready ครั้งแรกของ Cog)"""
+    with startup_timing.timed(extension, 'setup'):
+        try:
+            await bot.load_extension(extension)
+            startup_timing.time_on_ready_listeners(bot, extension)
+            log.info(f"✅ โหลด Extension '{extension}' สำเร็จ")
+        except commands.ExtensionNotFound:
+            log.error(f"❌ ไม่พบ Extension '{extension}'")
+        except commands.ExtensionAlreadyLoaded:
+            log.warning(f"⚠️ Extension '{extension}' ถูกโหลดไปแล้ว")
+        except commands.NoEntryPointError:
+             log.error(f"❌ Extension '{extension}' ไม่มีฟังก์ชัน setup()")
+        except Exception as e:
+            log.exception(f"❌ เกิดข้อผิดพลาดในการโหลด Extension '{extension}': {e}") # ใช้ exception logger
+            # คุณอาจจะอยากให้บอทหยุดทำงานถ้า Cog สำคัญโหลดไม่สำเร็จ
+            # raise e
+
+
 # --- ฟังก์ชันหลักสำหรับ Setup และ รันบอท ---
+def _gateway_latency_gauge():
+    """heartbeat latency ของ gateway ต่อ shard (ยังไม่มีค่าก่อน heartbeat แรก)"""
+    if isinstance(bot, commands.AutoShardedBot):
+        latencies = [({'shard': shard_id}, latency) for shard_id, latency in bot.latencies]
+    else:
+        latencies = [({}, bot.latency)]
+    return [(labels, latency) for labels, latency in latencies if latency == latency and latency != float('inf')] # ตัด NaN/inf
+
+
 async def main():
     # --- เริ่มต้น Connection Pool ---
     try:
@@ -58,23 +242,21 @@ async def main():
         log.critical(f"❌ ไม่สามารถ initialize PostgreSQL connection pool: {e}. บอทอาจทำงานไม่ถูกต้อง.")
         # คุณอาจจะต้องการให้บอทหยุดทำงานถ้าเชื่อมต่อ DB ไม่ได้
         # return
+
+    # --- เปิด Metrics endpoint (Prometheus text format, ปิดได้ด้วย METRICS_PORT=0) ---
+    metrics.register_gauge_callback("discord_gateway_latency_seconds", _gateway_latency_gauge)
+    await metrics.start_server()
+    memory_tracker.start() # MEMORY_TRACKING=on: เปิด tracemalloc ก่อนโหลด Cog เพื่อแยกหน่วยความจำตามโมดูล (ดู !memory)
+    loop_watchdog.start() # วัด event-loop lag และเก็บ stack ของ callback ที่บล็อก loop (ดู !looplag)
+    gateway_recorder.start(bot) # GATEWAY_RECORD_FILE: บันทึก event สำหรับ benchmarks/replay_gateway.py
     async with bot: # ใช้ async with bot เพื่อจัดการการเชื่อมต่อและ cleanup
-        # โหลด Cogs ทั้งหมด
+        shutdown.install(bot) # SIGTERM/SIGINT: รองานค้างของ Cog (drain hook) ก่อน bot.close() ดู shutdown.py
+        # โหลด Cogs ทั้งหมด: (โหมด 'startup') import module หนักๆ ขนานกันก่อน แล้วโหลด extension ทีละรอบตาม dependency
         log.info("--- กำลังโหลด Extensions ---")
-        for extension in INITIAL_EXTENSIONS:
-            try:
-                await bot.load_extension(extension)
-                log.info(f"✅ โหลด Extension '{extension}' สำเร็จ")
-            except commands.ExtensionNotFound:
-                log.error(f"❌ ไม่พบ Extension '{extension}'")
-            except commands.ExtensionAlreadyLoaded:
-                log.warning(f"⚠️ Extension '{extension}' ถูกโหลดไปแล้ว")
-            except commands.NoEntryPointError:
-                 log.error(f"❌ Extension '{extension}' ไม่มีฟังก์ชัน setup()")
-            except Exception as e:
-                log.exception(f"❌ เกิดข้อผิดพลาดในการโหลด Extension '{extension}': {e}") # ใช้ exception logger
-                # คุณอาจจะอยากให้บอทหยุดทำงานถ้า Cog สำคัญโหลดไม่สำเร็จ
-                # raise e
+        if PREWARM_IMPORTS == 'startup':
+            await asyncio.gather(*(_preimport_extension(ext) for ext in INITIAL_EXTENSIONS))
+        for wave in _plan_extension_waves(INITIAL_EXTENSIONS):
+            await asyncio.gather(*(_load_extension(ext) for ext in wave))
 
         log.info("--- Extensions ทั้งหมดถูกประมวลผล ---")
 
@@ -89,21 +271,84 @@ async def main():
         except Exception as e:
             log.exception(f"!!! เกิดข้อผิดพลาดร้ายแรงในการรันบอท: {e}")
         finally:
+            # bot.start() จบเพราะ error ก็ต้องรองานค้างก่อนปิด pool (ถ้าปิดผ่าน signal จะ drain ไปแล้ว เรียกซ้ำไม่มีผล)
+            await shutdown.drain()
             # --- ปิด Connection Pool เมื่อบอทหยุดทำงาน ---
             log.info("--- กำลังปิด PostgreSQL connection pool ---")
             await db_manager.close_pool()
             log.info("✅ PostgreSQL connection pool closed.")
+            await metrics.stop_server()
+            loop_watchdog.stop()
+            gateway_recorder.stop()
+            memory_tracker.stop()
+            await asyncio.to_thread(executors.shutdown) # รอ gTTS/บันทึก state ที่กำลังรันอยู่ให้เสร็จ (งานที่ยังรอคิวถูกยกเลิก)
+            log_setup.shutdown()
+
+# --- setup_hook (รันครั้งเดียวตอน login ก่อนต่อ gateway; on_ready เกิดซ้ำทุกครั้งที่ reconnect) ---
+async def setup_hook():
+    # apply schema migration ที่ค้างอยู่ก่อนมี voice event เข้ามา (schema ล่าสุดแล้ว = query เดียว ไม่มี DDL)
+    try:
+        with startup_timing.timed('db_migrations', 'setup'):
+            await db_manager.initialize_database()
+    except Exception as e:
+        log.exception(f"❌ apply schema migration ไม่สำเร็จ: {e}. Voice Log อาจบันทึกไม่ได้")
+    else:
+        # สร้าง partition ของ voice_channel_logs ล่วงหน้าและตัดตาม retention เป็นรอบ (รอบแรกรันใน initialize_database แล้ว)
+        supervisor.spawn("db_partition_maintenance", db_manager.run_partition_maintenance, restart="always")
+
+bot.setup_hook = setup_hook
+
+
+# --- Event on_connect (ได้รับ READY จาก gateway แล้ว แต่ยังไม่ chunk/พร้อมใช้งาน) ---
+_last_connect_at = None
+
+@bot.event
+async def on_connect():
+    global _last_connect_at
+    _last_connect_at = time.perf_counter()
+
+
+# --- Event ของแต่ละ shard (SHARDING=auto เท่านั้น) ---
+@bot.event
+async def on_shard_ready(shard_id):
+    guild_count = sum(1 for guild in bot.guilds if guild.shard_id == shard_id)
+    log.info(f"Shard {shard_id} พร้อมทำงาน ({guild_count} guilds)")
+
+
+@bot.event
+async def on_shard_disconnect(shard_id):
+    log.warning(f"Shard {shard_id} หลุดการเชื่อมต่อ (discord.py จะต่อใหม่เอง)")
+
+
+def _member_cache_report():
+    """สรุปขนาด cache สมาชิก/ผู้ใช้ และเวลาตั้งแต่ READY จนถึง on_ready"""
+    ready_to_ready_ms = None
+    if _last_connect_at is not None:
+        ready_to_ready_ms = round((time.perf_counter() - _last_connect_at) * 1000, 1)
+    return {
+        'member_cache_mode': MEMBER_CACHE_MODE,
+        'cached_members': sum(len(guild.members) for guild in bot.guilds),
+        'cached_users': len(bot.users),
+        'ready_to_ready_ms': ready_to_ready_ms,
+    }
+
 
 # --- Event on_ready ---
 @bot.event
 async def on_ready():
     # on_ready อาจถูกเรียกหลายครั้ง ไม่ควรใส่ logic การ setup หนักๆ ที่นี่
-    # การโหลด Cog และ add_view ใน on_ready ของ Cog นั้นเหมาะสมกว่า
+    # งานที่ต้องทำครั้งเดียว (schema migration, add_view) อยู่ใน setup_hook และ cog_load
+    ready_work_start = time.perf_counter()
     print("-" * 30)
     log.info(f'Bot is ready.')
     log.info(f'Logged in as: {bot.user.name} (ID: {bot.user.id})')
     log.info(f'Discord.py Version: {discord.__version__}')
     log.info(f'Connected to {len(bot.guilds)} servers.')
+    cache_report = _member_cache_report()
+    log.info(
+        f"Member cache ({cache_report['member_cache_mode']}): {cache_report['cached_members']} members, "
+        f"{cache_report['cached_users']} users; READY -> ready {cache_report['ready_to_ready_ms']} ms"
+    )
     # แสดงสถานะ "Watching" หรือ "Listening" (Optional)
     try:
         await bot.change_presence(activity=discord.Activity(type=discord.ActivityType.watching, name="the logs & bids"))
@@ -114,11 +359,23 @@ async def on_ready():
     print("-" * 30)
     log.info("บอทพร้อมทำงาน!")
 
+    config_problems = bot_config.validate(bot)
+    if config_problems:
+        log.warning(f"พบปัญหา {config_problems} รายการใน bot_config.json (ดู log ด้านบน)")
+
+    if PREWARM_IMPORTS == 'after_ready':
+        _start_background_prewarm()
+
+    # รายงานเวลา startup (ครั้งแรกเท่านั้น ไม่นับ reconnect)
+    if not startup_timing.is_reported():
+        startup_timing.record('bot', 'on_ready', time.perf_counter() - ready_work_start)
+        startup_timing.schedule_report(time_to_ready_ms=round(startup_timing.elapsed() * 1000, 1), **cache_report)
+
 
 # --- รัน main function ---
 if __name__ == "__main__":
     try:
-        asyncio.run(main())
+        loop_runtime.run(main()) # EVENT_LOOP=uvloop เพื่อใช้ uvloop (ถ้าติดตั้งไว้)
     except KeyboardInterrupt:
         log.info("--- กำลังปิดบอท (ได้รับ KeyboardInterrupt) ---")
     except Exception as e:
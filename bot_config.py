@@ -0,0 +1,169 @@
+# bot_config.py
+import json
+import logging
+import os
+from dataclasses import dataclass, field, replace
+from typing import Dict, FrozenSet, Optional, Tuple
+
+log = logging.getLogger(__name__)
+
+# --- ค่าคงที่ ---
+CONFIG_FILE = os.getenv("BOT_CONFIG_FILE", os.path.join(os.path.dirname(__file__), "bot_config.json"))
+# Override ราย guild ผ่าน env: BOT_GUILD_<guild_id>_<FIELD> เช่น
+# BOT_GUILD_1097740536527470717_MONITORED_VOICE_CHANNEL_IDS=1250561983305224222,1135925419753869312
+ENV_GUILD_PREFIX = "BOT_GUILD_"
+
+
+@dataclass(frozen=True)
+class GuildConfig:
+    """ค่าตั้งต่อ guild (ทุก ID เป็น int)"""
+    guild_id: int
+    monitored_voice_channel_ids: FrozenSet[int] = frozenset()
+    notification_text_channel_ids: Tuple[int, ...] = ()
+    tts_voice_channel_id: Optional[int] = None
+    bidding_channel_id: Optional[int] = None
+
+
+# ชื่อ field -> ตัวแปลงค่าจาก JSON/env
+def _id_list(value) -> Tuple[int, ...]:
+    if isinstance(value, str):
+        value = [part for part in value.replace(";", ",").split(",") if part.strip()]
+    return tuple(int(item) for item in value)
+
+
+def _optional_id(value) -> Optional[int]:
+    if value is None or (isinstance(value, str) and not value.strip()):
+        return None
+    return int(value)
+
+
+_FIELD_PARSERS = {
+    "monitored_voice_channel_ids": lambda value: frozenset(_id_list(value)),
+    "notification_text_channel_ids": _id_list,
+    "tts_voice_channel_id": _optional_id,
+    "bidding_channel_id": _optional_id,
+}
+
+
+@dataclass(frozen=True)
+class BotConfig:
+    """
+    Config ทั้งหมดของบอท พร้อม index ต่อ guild ที่สร้างครั้งเดียวตอนโหลด
+    Cog เรียกผ่าน get() ทุกครั้งที่ใช้ จึงเห็นค่าใหม่หลัง reload() โดยไม่ต้องโหลด Cog ใหม่
+    """
+    guilds: Dict[int, GuildConfig] = field(default_factory=dict)
+    # channel id -> guild id ของทุกช่องที่ตั้งค่าไว้ (ใช้ตรวจว่า ID ใส่ผิด guild หรือไม่)
+    channel_guild_index: Dict[int, int] = field(default_factory=dict)
+    # guild id -> ช่องเสียงเป้าหมายของ Scheduled TTS
+    tts_target_index: Dict[int, int] = field(default_factory=dict)
+
+    def guild(self, guild_id: Optional[int]) -> Optional[GuildConfig]:
+        return self.guilds.get(guild_id)
+
+    def monitored_voice_channels(self, guild_id: int) -> FrozenSet[int]:
+        guild = self.guilds.get(guild_id)
+        return guild.monitored_voice_channel_ids if guild else frozenset()
+
+    def notification_channels(self, guild_id: int) -> Tuple[int, ...]:
+        guild = self.guilds.get(guild_id)
+        return guild.notification_text_channel_ids if guild else ()
+
+    def tts_targets(self) -> Dict[int, int]:
+        """guild id -> ช่องเสียงเป้าหมายของ Scheduled TTS"""
+        return self.tts_target_index
+
+    def bidding_channel_id(self, guild_id: Optional[int] = None) -> Optional[int]:
+        """ช่องประมูลของ guild ที่ระบุ หรือช่องแรกที่ตั้งค่าไว้ถ้าไม่ระบุ guild"""
+        if guild_id is not None:
+            guild = self.guilds.get(guild_id)
+            return guild.bidding_channel_id if guild else None
+        return next((guild.bidding_channel_id for guild in self.guilds.values() if guild.bidding_channel_id), None)
+
+
+def _build(guilds: Dict[int, GuildConfig]) -> BotConfig:
+    channel_guild_index: Dict[int, int] = {}
+    for guild_id, guild in guilds.items():
+        channel_ids = set(guild.monitored_voice_channel_ids) | set(guild.notification_text_channel_ids)
+        channel_ids.update(cid for cid in (guild.tts_voice_channel_id, guild.bidding_channel_id) if cid)
+        for channel_id in channel_ids:
+            channel_guild_index[channel_id] = guild_id
+    tts_target_index = {guild_id: guild.tts_voice_channel_id for guild_id, guild in guilds.items() if guild.tts_voice_channel_id}
+    return BotConfig(guilds=guilds, channel_guild_index=channel_guild_index, tts_target_index=tts_target_index)
+
+
+def _parse_guild(guild_id: int, raw: dict) -> GuildConfig:
+    values = {}
+    for key, value in raw.items():
+        parser = _FIELD_PARSERS.get(key)
+        if parser is None:
+            log.warning(f"Config guild {guild_id}: ไม่รู้จัก field '{key}' (ข้าม)")
+            continue
+        values[key] = parser(value)
+    return GuildConfig(guild_id=guild_id, **values)
+
+
+def _read_file(path: str) -> Dict[int, GuildConfig]:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        log.warning(f"ไม่พบไฟล์ config '{path}' ใช้เฉพาะค่าจาก environment")
+        return {}
+    guilds = {}
+    for guild_key, raw in data.get("guilds", {}).items():
+        guild_id = int(guild_key)
+        guilds[guild_id] = _parse_guild(guild_id, raw)
+    return guilds
+
+
+def _apply_env_overrides(guilds: Dict[int, GuildConfig], environ) -> Dict[int, GuildConfig]:
+    for name, value in environ.items():
+        if not name.startswith(ENV_GUILD_PREFIX):
+            continue
+        guild_part, _, field_part = name[len(ENV_GUILD_PREFIX):].partition("_")
+        field_name = field_part.lower()
+        if not guild_part.isdigit() or field_name not in _FIELD_PARSERS:
+            log.warning(f"Config: ข้าม env '{name}' (รูปแบบต้องเป็น {ENV_GUILD_PREFIX}<guild_id>_<FIELD>)")
+            continue
+        guild_id = int(guild_part)
+        current = guilds.get(guild_id) or GuildConfig(guild_id=guild_id)
+        guilds[guild_id] = replace(current, **{field_name: _FIELD_PARSERS[field_name](value)})
+        log.info(f"Config: ใช้ค่า {field_name} ของ guild {guild_id} จาก environment")
+    return guilds
+
+
+def load(path: Optional[str] = None, environ=None) -> BotConfig:
+    """อ่านไฟล์ config + env overrides แล้วแทนที่ config ปัจจุบัน (ValueError ถ้าค่าไม่ถูกต้อง)"""
+    global _config
+    path = path or CONFIG_FILE
+    try:
+        guilds = _apply_env_overrides(_read_file(path), os.environ if environ is None else environ)
+    except (ValueError, TypeError, AttributeError, json.JSONDecodeError) as e:
+        raise ValueError(f"Config '{path}' ไม่ถูกต้อง: {e}") from e
+    _config = _build(guilds)
+    log.info(f"Config loaded: {len(_config.guilds)} guild(s), {len(_config.channel_guild_index)} channel(s) from '{path}'")
+    return _config
+
+
+_config: Optional[BotConfig] = None
+
+
+def get() -> BotConfig:
+    """คืน config ปัจจุบัน (โหลดครั้งแรกเมื่อถูกเรียก)"""
+    if _config is None:
+        return load()
+    return _config
+
+
+def validate(bot) -> int:
+    """ตรวจว่าช่องที่ตั้งค่าไว้อยู่ใน guild ที่ระบุจริง (เรียกหลัง on_ready) คืนจำนวนปัญหาที่พบ"""
+    problems = 0
+    for channel_id, guild_id in get().channel_guild_index.items():
+        channel = bot.get_channel(channel_id)
+        if channel is None:
+            log.warning(f"Config: ไม่พบช่อง {channel_id} (guild {guild_id}) ในแคชของบอท")
+            problems += 1
+        elif channel.guild.id != guild_id:
+            log.warning(f"Config: ช่อง {channel_id} อยู่ใน guild {channel.guild.id} แต่ถูกตั้งค่าไว้ใต้ guild {guild_id}")
+            problems += 1
+    return problems
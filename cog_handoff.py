@@ -0,0 +1,57 @@
+# cog_handoff.py
+import logging
+import time
+from typing import Any, Dict, Optional
+
+from discord.ext import commands
+
+log = logging.getLogger(__name__)
+
+# --- State ที่รอส่งต่อให้ Cog instance ใหม่ระหว่าง reload ---
+# โมดูลนี้ไม่ถูก reload พร้อม Cog จึงถือ state ข้ามการ reload ได้
+# key: ชื่อ extension (เช่น 'bidrune_cog') -> dict ที่ได้จาก cog.export_state()
+_pending: Dict[str, Dict[str, Any]] = {}
+
+
+def stash(extension: str, state: Dict[str, Any]):
+    _pending[extension] = state
+
+
+def take(extension: str) -> Optional[Dict[str, Any]]:
+    """ให้ Cog ตัวใหม่เรียกตอนสร้าง: คืน state ที่ตัวเก่าส่งมา (ถ้ามี) แล้วลบออกจากคิว"""
+    return _pending.pop(extension, None)
+
+
+def extension_cogs(bot: commands.Bot, extension: str):
+    return [cog for cog in bot.cogs.values() if type(cog).__module__ == extension]
+
+
+async def reload_with_handoff(bot: commands.Bot, extension: str) -> Dict[str, Any]:
+    """
+    Reload extension โดยย้าย state ในหน่วยความจำจาก Cog ตัวเก่าไปตัวใหม่
+
+    Cog ที่รองรับต้องมี `async export_state()` ซึ่งคืน dict และหยุดปล่อยทรัพยากร
+    (scheduler, voice client) ตอน cog_unload, ส่วนตัวใหม่เรียก `take(__name__)` ใน __init__
+    Cog ที่ไม่มี export_state จะถูก reload ตามปกติ
+    """
+    started = time.perf_counter()
+    handed_off = False
+    for cog in extension_cogs(bot, extension):
+        export_state = getattr(cog, "export_state", None)
+        if export_state is None:
+            continue
+        stash(extension, await export_state())
+        handed_off = True
+
+    try:
+        await bot.reload_extension(extension)
+    finally:
+        # discord.py เรียก setup() ของโมดูลเก่าซ้ำถ้าโหลดตัวใหม่ไม่สำเร็จ ซึ่งจะรับ state คืนไปเอง
+        leftover = take(extension)
+        if leftover is not None:
+            log.warning(f"Reload '{extension}': ไม่มี Cog ตัวไหนรับ state ที่ส่งต่อมา (state ถูกทิ้ง)")
+            handed_off = False
+
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    log.info(f"Reloaded '{extension}' in {elapsed_ms:.1f} ms (state handoff: {handed_off})")
+    return {"extension": extension, "elapsed_ms": elapsed_ms, "handed_off": handed_off}
@@ -1,16 +1,67 @@
 # db_manager.py
+import asyncio
+import collections
 import asyncpg # ใช้ asyncpg สำหรับการทำงานแบบ asynchronous กับ discord.py
 import logging
 import os
-from dotenv import load_dotenv
-from datetime import datetime
+import time
+from contextlib import asynccontextmanager
+from datetime import date, datetime, timezone
+from typing import Dict, List, Optional, Tuple
+import metrics
+import db_migrations
+import shutdown
+import voice_sessions
 
-# โหลด Connection String จาก .env
-load_dotenv()
+# Connection String จาก .env (bot.py/voice_worker.py โหลด .env ก่อน import โมดูลนี้)
 DATABASE_URL = os.getenv("POSTGRES_CONNECTION_STRING")
 
 log = logging.getLogger(__name__)
 
+# --- Write-behind ของ voice log ---
+# voice event ถูกพักใน buffer แล้วเขียนเป็นชุด (upsert ผู้ใช้ + insert log ใน statement เดียว ดู INGEST_VOICE_BATCH_SQL)
+# ทุก VOICE_LOG_FLUSH_MS หรือเมื่อครบ VOICE_LOG_BATCH_ROWS แถว; buffer เต็ม (VOICE_LOG_BUFFER_MAX) = ผู้เรียกต้องรอ (backpressure)
+# VOICE_LOG_FLUSH_MS=0 = ไม่พัก: เขียนทันทีทีละ event (ยังเป็น round-trip เดียวต่อ event)
+VOICE_LOG_FLUSH_MS = int(os.getenv("VOICE_LOG_FLUSH_MS", "200"))
+VOICE_LOG_BATCH_ROWS = int(os.getenv("VOICE_LOG_BATCH_ROWS", "500"))
+VOICE_LOG_BUFFER_MAX = int(os.getenv("VOICE_LOG_BUFFER_MAX", "10000"))
+# แถวที่ค้างใน buffer ได้ต่อ guild: guild ที่คนเข้าออกถี่รอ flush ของตัวเอง ไม่กิน buffer จนทุก guild ต้องรอ (0 = ไม่จำกัดต่อ guild)
+VOICE_LOG_GUILD_BUFFER_MAX = int(os.getenv("VOICE_LOG_GUILD_BUFFER_MAX", "2500"))
+FLUSH_ATTEMPTS = 3 # เขียนชุดเดิมซ้ำได้กี่ครั้งก่อนทิ้ง (DB ล่ม/failover)
+# โปรไฟล์ล่าสุดที่เขียนลง discord_users แล้ว (LRU ต่อ user): ชื่อ/avatar ไม่เปลี่ยน = ไม่ต้อง upsert ซ้ำ
+# ยกเว้น last_seen_at ที่เขียนไปนานเกิน PROFILE_LAST_SEEN_REFRESH วินาที (last_seen_at จึงคลาดได้ไม่เกินค่านี้)
+PROFILE_CACHE_SIZE = int(os.getenv("PROFILE_CACHE_SIZE", "50000"))
+PROFILE_LAST_SEEN_REFRESH = float(os.getenv("PROFILE_LAST_SEEN_REFRESH", "900"))
+
+# --- Partition รายเดือนของ voice_channel_logs (ดู migration v2) ---
+VOICE_LOG_PARTITIONS_AHEAD = int(os.getenv("VOICE_LOG_PARTITIONS_AHEAD", "3")) # สร้าง partition ของเดือนถัดไปไว้ล่วงหน้ากี่เดือน
+VOICE_LOG_RETENTION_MONTHS = int(os.getenv("VOICE_LOG_RETENTION_MONTHS", "0")) # เก็บย้อนหลังกี่เดือนนอกจากเดือนปัจจุบัน (0 = ตลอด)
+VOICE_LOG_RETENTION_ACTION = os.getenv("VOICE_LOG_RETENTION_ACTION", "detach").lower() # detach (เก็บเป็นตารางแยก) | drop
+VOICE_LOG_QUERY_MONTHS = int(os.getenv("VOICE_LOG_QUERY_MONTHS", "3")) # get_user_voice_logs ค้นย้อนหลังกี่เดือน (0 = ทั้งหมด)
+PARTITION_MAINTENANCE_INTERVAL = 6 * 3600
+PARTITION_LOCK_KEY = 727_115_002 # advisory lock: หลาย process ไม่สร้าง/ตัด partition ชนกัน
+PARTITION_PREFIX = "voice_channel_logs_p"
+DEFAULT_PARTITION = "voice_channel_logs_default"
+
+# --- Metrics ---
+POOL_ACQUIRE_METRIC = "db_pool_acquire_seconds"
+FLUSH_SECONDS_METRIC = "voice_log_flush_seconds"
+FLUSH_ROWS_METRIC = "voice_log_flush_rows"
+FLUSH_FAILURES_METRIC = "voice_log_flush_failures_total"
+DROPPED_METRIC = "voice_log_dropped_total"
+BUFFER_WAIT_METRIC = "voice_log_buffer_wait_seconds"
+PROFILE_CACHE_METRIC = "discord_user_cache_total"
+metrics.describe(POOL_ACQUIRE_METRIC, "histogram", "Time spent waiting for a PostgreSQL connection from the pool.")
+metrics.describe("db_pool_connections", "gauge", "PostgreSQL pool connections by state.")
+metrics.describe(FLUSH_SECONDS_METRIC, "histogram", "Time to write one batch of buffered voice events to PostgreSQL.")
+metrics.describe(FLUSH_ROWS_METRIC, "histogram", "Voice events per write-behind batch.")
+metrics.describe(FLUSH_FAILURES_METRIC, "counter", "Write-behind batch attempts that raised.")
+metrics.describe(DROPPED_METRIC, "counter", "Buffered voice events dropped after all flush attempts failed.")
+metrics.describe("voice_log_buffer", "gauge", "Voice events waiting in the write-behind buffer.")
+metrics.describe(BUFFER_WAIT_METRIC, "histogram", "Time enqueue waited for buffer space, by reason (full or guild_quota).")
+metrics.describe(PROFILE_CACHE_METRIC, "counter", "discord_users upserts skipped (hit) or needed (miss) by the profile cache.")
+metrics.describe("discord_user_cache_size", "gauge", "Users in the profile cache.")
+
 # --- Global Connection Pool ---
 # การสร้าง pool ครั้งเดียวแล้วใช้ซ้ำจะดีกว่าการสร้าง connection ทุกครั้ง
 # แต่จะสร้างใน Cog หรือ function หลักของ bot แล้วส่งต่อมาให้ db_manager ก็ได้
@@ -27,12 +78,27 @@ async def get_pool():
         try:
             log.info("กำลังสร้าง PostgreSQL connection pool...")
             _pool = await asyncpg.create_pool(DATABASE_URL, min_size=1, max_size=10)
+            metrics.register_gauge_callback("db_pool_connections", _pool_gauges)
             log.info("PostgreSQL connection pool สร้างสำเร็จแล้ว")
         except Exception as e:
             log.exception("เกิดข้อผิดพลาดในการสร้าง PostgreSQL connection pool")
             raise # ส่งต่อ exception
     return _pool
 
+def _pool_gauges():
+    if _pool is None:
+        return []
+    return [({"state": "open"}, _pool.get_size()), ({"state": "idle"}, _pool.get_idle_size())]
+
+@asynccontextmanager
+async def _acquire():
+    """ยืม connection จาก pool พร้อมจับเวลารอ (db_pool_acquire_seconds)"""
+    pool = await get_pool()
+    started = time.perf_counter()
+    async with pool.acquire() as conn:
+        metrics.observe(POOL_ACQUIRE_METRIC, time.perf_counter() - started)
+        yield conn
+
 async def close_pool():
     """ปิด connection pool (ควรเรียกตอนบอทปิดตัว)"""
     global _pool
@@ -44,54 +110,147 @@ async def close_pool():
 
 
 async def initialize_database():
-    """สร้างตารางที่จำเป็นถ้ายังไม่มี"""
-    pool = await get_pool()
-    async with pool.acquire() as conn:
+    """apply schema migration ที่ยังค้างอยู่ (ดู db_migrations.py) เรียกครั้งเดียวจาก setup_hook ของบอท"""
+    async with _acquire() as conn:
+        applied = await db_migrations.migrate(conn)
+    if applied:
+        log.info(f"apply schema migration {applied} รายการ (ตอนนี้ v{db_migrations.LATEST_VERSION})")
+    await maintain_voice_log_partitions() # partition ของเดือนนี้ต้องมีก่อน voice event แรก
+
+# --- Partition ของ voice_channel_logs ---
+def _add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+def _partition_name(month: date) -> str:
+    return f"{PARTITION_PREFIX}{month:%Y_%m}"
+
+def _partition_month(name: str) -> Optional[date]:
+    """voice_channel_logs_pYYYY_MM -> วันแรกของเดือน (None = ไม่ใช่ partition รายเดือน เช่น _default)"""
+    try:
+        return datetime.strptime(name[len(PARTITION_PREFIX):], "%Y_%m").date() if name.startswith(PARTITION_PREFIX) else None
+    except ValueError:
+        return None
+
+async def _create_partition(conn, month: date, move_from_default: bool):
+    """
+    สร้าง partition ของเดือน month; ถ้ามีแถวของเดือนนั้นค้างใน partition DEFAULT ต้อง detach DEFAULT ก่อน
+    (Postgres ไม่ให้สร้าง partition ที่ทับกับแถวใน DEFAULT) แล้วย้ายแถวมาและ attach กลับใน transaction เดียวกัน
+    """
+    name = _partition_name(month)
+    lower, upper = f"{month} 00:00:00+00", f"{_add_months(month, 1)} 00:00:00+00"
+    if move_from_default:
+        await conn.execute(f"ALTER TABLE voice_channel_logs DETACH PARTITION {DEFAULT_PARTITION}")
+    await conn.execute(f"CREATE TABLE {name} PARTITION OF voice_channel_logs FOR VALUES FROM ('{lower}') TO ('{upper}')")
+    if move_from_default:
+        moved = await conn.execute(f"""
+            WITH moved AS (
+                DELETE FROM {DEFAULT_PARTITION} WHERE "timestamp" >= '{lower}' AND "timestamp" < '{upper}' RETURNING *
+            )
+            INSERT INTO {name} SELECT * FROM moved
+        """)
+        await conn.execute(f"ALTER TABLE voice_channel_logs ATTACH PARTITION {DEFAULT_PARTITION} DEFAULT")
+        log.warning(f"ย้าย voice log {moved.split()[-1]} แถวจาก {DEFAULT_PARTITION} ไป {name} (maintenance ตามไม่ทันหรือเวลาคลาดเคลื่อน)")
+
+async def maintain_voice_log_partitions(now: datetime = None) -> Tuple[int, int]:
+    """
+    สร้าง partition เดือนนี้ + VOICE_LOG_PARTITIONS_AHEAD เดือนถัดไปที่ยังไม่มี (รวมถึงเดือนที่มีแถวตกไปอยู่ใน DEFAULT)
+    และ detach/drop partition ที่เก่ากว่า VOICE_LOG_RETENTION_MONTHS คืน (จำนวนที่สร้าง, จำนวนที่ตัดออก)
+    """
+    now = now or datetime.now(timezone.utc).replace(tzinfo=None) # ขอบเขต partition เป็นเวลา UTC
+    current = date(now.year, now.month, 1)
+    created, removed = 0, 0
+    async with _acquire() as conn:
         async with conn.transaction():
-            # --- ตาราง discord_users ---
-            await conn.execute("""
-                CREATE TABLE IF NOT EXISTS discord_users (
-                    user_id BIGINT PRIMARY KEY,         -- <--- BIGINT
-                    username TEXT NOT NULL,
-                    display_name TEXT NOT NULL,
-                    avatar_url TEXT,
-                    first_seen_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
-                    last_seen_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
-                );
-            """)
-            log.info("ตรวจสอบ/สร้างตาราง 'discord_users' เรียบร้อยแล้ว")
-
-            # --- ตาราง voice_channel_logs ---
-            await conn.execute("""
-                CREATE TABLE IF NOT EXISTS voice_channel_logs (
-                    log_id SERIAL PRIMARY KEY,
-                    user_id BIGINT NOT NULL REFERENCES discord_users(user_id) ON DELETE CASCADE, -- <--- BIGINT
-                    action TEXT NOT NULL,
-                    channel_id BIGINT NOT NULL,        -- <--- BIGINT
-                    channel_name TEXT NOT NULL,
-                    from_channel_id BIGINT,            -- <--- BIGINT (NULLABLE)
-                    from_channel_name TEXT,
-                    "timestamp" TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
-                );
+            await conn.execute("SELECT pg_advisory_xact_lock($1)", PARTITION_LOCK_KEY)
+            rows = await conn.fetch("""
+                SELECT child.relname AS name
+                FROM pg_inherits
+                JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+                JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+                WHERE parent.relname = 'voice_channel_logs'
             """)
-            log.info("ตรวจสอบ/สร้างตาราง 'voice_channel_logs' เรียบร้อยแล้ว")
-            # สร้าง Index เพื่อเพิ่มความเร็วในการ query (Optional but recommended)
-            await conn.execute("""
-                CREATE INDEX IF NOT EXISTS idx_voice_logs_user_id ON voice_channel_logs(user_id);
-            """)
-            await conn.execute("""
-                CREATE INDEX IF NOT EXISTS idx_voice_logs_timestamp ON voice_channel_logs("timestamp");
-            """)
-            log.info("ตรวจสอบ/สร้าง Indexes สำหรับ 'voice_channel_logs' เรียบร้อยแล้ว")
+            existing = {row["name"] for row in rows}
+
+            # เดือนที่มีแถวอยู่ใน DEFAULT (ปกติว่าง) ต้องมี partition ของตัวเองด้วย ไม่งั้น retention ไม่ถึงแถวเหล่านั้น
+            stray_months = set()
+            if DEFAULT_PARTITION in existing:
+                stray = await conn.fetch(f"""
+                    SELECT DISTINCT date_trunc('month', "timestamp" AT TIME ZONE 'UTC')::date AS month FROM {DEFAULT_PARTITION}
+                """)
+                stray_months = {row["month"] for row in stray}
+
+            months = {_add_months(current, offset) for offset in range(VOICE_LOG_PARTITIONS_AHEAD + 1)} | stray_months
+            for month in sorted(months):
+                name = _partition_name(month)
+                if name in existing:
+                    continue # แถวใน DEFAULT ไม่มีทางอยู่ในช่วงของ partition ที่มีอยู่แล้ว
+                await _create_partition(conn, month, move_from_default=month in stray_months)
+                existing.add(name)
+                created += 1
+
+            if VOICE_LOG_RETENTION_MONTHS > 0:
+                cutoff = _add_months(current, -VOICE_LOG_RETENTION_MONTHS)
+                for name in sorted(existing):
+                    month = _partition_month(name)
+                    if month is None or month >= cutoff:
+                        continue
+                    await conn.execute(f"ALTER TABLE voice_channel_logs DETACH PARTITION {name}")
+                    if VOICE_LOG_RETENTION_ACTION == "drop":
+                        await conn.execute(f"DROP TABLE {name}")
+                    removed += 1
+    if created or removed:
+        action = "drop" if VOICE_LOG_RETENTION_ACTION == "drop" else "detach"
+        log.info(f"voice_channel_logs partitions: สร้างใหม่ {created}, {action} {removed} (เก็บ {VOICE_LOG_RETENTION_MONTHS or 'ทุก'} เดือน)")
+    return created, removed
+
+async def run_partition_maintenance():
+    """งานเบื้องหลัง (supervisor, restart='always'): ดูแล partition ทุก PARTITION_MAINTENANCE_INTERVAL"""
+    while True:
+        await asyncio.sleep(PARTITION_MAINTENANCE_INTERVAL)
+        await maintain_voice_log_partitions()
+
+class ProfileCache:
+    """LRU: user_id -> (hash ของ username/display_name/avatar_url, last_seen_at) ที่เขียนลง DB สำเร็จแล้ว"""
+    def __init__(self, max_size: int = PROFILE_CACHE_SIZE):
+        self.max_size = max_size
+        self.entries: "collections.OrderedDict[int, Tuple[int, datetime]]" = collections.OrderedDict()
+        metrics.register_gauge_callback("discord_user_cache_size", lambda: [({}, len(self.entries))])
+
+    @staticmethod
+    def profile_hash(username: str, display_name: str, avatar_url: Optional[str]) -> int:
+        return hash((username, display_name, avatar_url))
+
+    def is_fresh(self, user_id: int, profile_hash: int, at: datetime) -> bool:
+        """True = โปรไฟล์เดิมและ last_seen_at ยังไม่เก่าเกิน PROFILE_LAST_SEEN_REFRESH (ข้าม upsert ได้)"""
+        entry = self.entries.get(user_id)
+        if entry is None or entry[0] != profile_hash or (at - entry[1]).total_seconds() >= PROFILE_LAST_SEEN_REFRESH:
+            metrics.inc(PROFILE_CACHE_METRIC, result="miss")
+            return False
+        self.entries.move_to_end(user_id)
+        metrics.inc(PROFILE_CACHE_METRIC, result="hit")
+        return True
+
+    def remember(self, user_id: int, profile_hash: int, at: datetime):
+        self.entries[user_id] = (profile_hash, at)
+        self.entries.move_to_end(user_id)
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+
+_profiles = ProfileCache()
+
 
 async def upsert_discord_user(user_id: int, username: str, display_name: str, avatar_url: str = None):
     """
     เพิ่มผู้ใช้ใหม่หรืออัปเดตข้อมูลผู้ใช้ที่มีอยู่ (ชื่อ, avatar, last_seen_at).
-    first_seen_at จะถูกตั้งค่าเมื่อ insert เท่านั้น
+    first_seen_at จะถูกตั้งค่าเมื่อ insert เท่านั้น (ข้ามถ้าโปรไฟล์ไม่เปลี่ยนจากที่เขียนล่าสุด ดู ProfileCache)
     """
-    pool = await get_pool()
     current_time = datetime.utcnow() # ใช้ UTC สำหรับ timestamp ใน DB
-    async with pool.acquire() as conn:
+    profile_hash = _profiles.profile_hash(username, display_name, avatar_url)
+    if _profiles.is_fresh(user_id, profile_hash, current_time):
+        return
+    async with _acquire() as conn:
         # ลองดึง first_seen_at เดิม ถ้ามี
         # เราต้องการเก็บ first_seen_at เดิมไว้ ถ้าผู้ใช้มีอยู่แล้ว
         # และอัปเดตเฉพาะ username, display_name, avatar_url, last_seen_at
@@ -105,32 +264,281 @@ async def upsert_discord_user(user_id: int, username: str, display_name: str, av
                 last_seen_at = $5;
         """, user_id, username, display_name, avatar_url, current_time) # Cast user_id to str
         # log.debug(f"Upserted user: ID={user_id}, Name={display_name}") # อาจจะ log มากไป
+    _profiles.remember(user_id, profile_hash, current_time)
 
 async def add_voice_log(user_id: int, action: str, channel_id: int, channel_name: str,
                         from_channel_id: int = None, from_channel_name: str = None):
     """เพิ่ม Log การเข้า-ออกช่องเสียง"""
-    pool = await get_pool()
     current_time = datetime.utcnow() # ใช้ UTC
-    async with pool.acquire() as conn:
+    async with _acquire() as conn:
         await conn.execute("""
             INSERT INTO voice_channel_logs (user_id, action, channel_id, channel_name, from_channel_id, from_channel_name, "timestamp")
             VALUES ($1, $2, $3, $4, $5, $6, $7)
         """, user_id, action, channel_id, channel_name, from_channel_id, from_channel_name, current_time) # <--- แก้ไขตรงนี้
-        log.info(f"บันทึก Voice Log: User {user_id} action '{action}' on channel '{channel_name}' ({channel_id})")
-        
+        log.debug(f"บันทึก Voice Log: User {user_id} action '{action}' on channel '{channel_name}' ({channel_id})")
+
+
+# --- Write-behind buffer ---
+# upsert ผู้ใช้ + insert voice log + อัปเดต voice_sessions ทั้งชุดใน statement เดียว (1 round-trip, atomic โดยไม่ต้อง BEGIN/COMMIT)
+# แต่ละคอลัมน์ส่งเป็น array แล้ว unnest; foreign key ถูกตรวจตอนจบ statement จึงเห็นผู้ใช้ที่ CTE เพิ่ง insert
+# asyncpg prepare statement นี้ครั้งเดียวต่อ connection แล้วใช้ซ้ำ (statement cache)
+# ผู้ใช้ในชุดต้องไม่ซ้ำกัน (ON CONFLICT แก้แถวเดียวกันสองครั้งใน statement เดียวไม่ได้) และ closes ไม่ซ้ำ (user, channel)
+# closes แก้เฉพาะ session ที่เปิดค้างจากชุดก่อนๆ (CTE มองไม่เห็นแถวที่ statement เดียวกัน insert)
+INGEST_VOICE_BATCH_SQL = """
+    WITH upserted AS (
+        INSERT INTO discord_users (user_id, username, display_name, avatar_url, first_seen_at, last_seen_at)
+        SELECT * FROM unnest($1::bigint[], $2::text[], $3::text[], $4::text[], $5::timestamptz[], $6::timestamptz[])
+        ON CONFLICT (user_id) DO UPDATE SET
+            username = EXCLUDED.username,
+            display_name = EXCLUDED.display_name,
+            avatar_url = EXCLUDED.avatar_url,
+            last_seen_at = EXCLUDED.last_seen_at
+    ), closed AS (
+        UPDATE voice_sessions AS s SET
+            left_at = CASE WHEN c.end_action = 'UNKNOWN' THEN NULL ELSE c.left_at END,
+            end_action = c.end_action
+        FROM unnest($14::bigint[], $15::bigint[], $16::timestamptz[], $17::text[]) AS c(user_id, channel_id, left_at, end_action)
+        WHERE s.user_id = c.user_id AND s.channel_id = c.channel_id AND s.end_action IS NULL AND s.joined_at <= c.left_at
+    ), opened AS (
+        INSERT INTO voice_sessions (user_id, channel_id, channel_name, joined_at, left_at, end_action)
+        SELECT * FROM unnest($18::bigint[], $19::bigint[], $20::text[], $21::timestamptz[], $22::timestamptz[], $23::text[])
+    )
+    INSERT INTO voice_channel_logs (user_id, action, channel_id, channel_name, from_channel_id, from_channel_name, "timestamp")
+    SELECT * FROM unnest($7::bigint[], $8::text[], $9::bigint[], $10::text[], $11::bigint[], $12::text[], $13::timestamptz[])
+"""
+USER_COLUMNS = 6
+LOG_COLUMNS = 7
+CLOSE_COLUMNS = 4
+SESSION_COLUMNS = len(voice_sessions.SESSION_FIELDS)
+
+# แถวใน buffer: (user_id, username, display_name, avatar_url, at, log, write_user, guild_id)
+# log = (user_id, action, channel_id, channel_name, from_channel_id, from_channel_name, timestamp) หรือ None
+# write_user = False เมื่อ ProfileCache บอกว่าไม่ต้อง upsert ผู้ใช้
+# guild_id ใช้นับโควตาต่อ guild เท่านั้น (None = ไม่นับ)
+BufferedEvent = Tuple[int, str, str, Optional[str], datetime, Optional[tuple], bool, Optional[int]]
+
+
+def columns(rows: List[tuple], width: int) -> List[list]:
+    """แถว -> array ต่อคอลัมน์ สำหรับ unnest()"""
+    return [list(column) for column in zip(*rows)] if rows else [[] for _ in range(width)]
+
+
+async def _write_voice_batch(users: List[tuple], logs: List[tuple]):
+    """เขียนหนึ่งชุด (ผู้ใช้ไม่ซ้ำ + voice log เรียงตามเวลา + session ที่เปิด/ปิด) ด้วย INGEST_VOICE_BATCH_SQL ใน round-trip เดียว"""
+    sessions = voice_sessions.SessionTracker()
+    for user_id, action, channel_id, channel_name, from_channel_id, _, at in logs:
+        sessions.apply(user_id, action, channel_id, channel_name, from_channel_id, at)
+    async with _acquire() as conn:
+        await conn.execute(INGEST_VOICE_BATCH_SQL, *columns(users, USER_COLUMNS), *columns(logs, LOG_COLUMNS),
+                           *columns(list(sessions.closes.values()), CLOSE_COLUMNS),
+                           *columns(sessions.finish(), SESSION_COLUMNS))
+
+
+class VoiceLogBuffer:
+    """
+    buffer ของ voice event + task flush ที่รันเฉพาะตอนมีแถวค้าง
+    ลำดับใน voice_channel_logs ตรงกับลำดับที่ enqueue (timestamp คือเวลาที่เกิด event ไม่ใช่เวลาที่ flush)
+    """
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop # Event/task ผูกกับ loop ที่สร้าง buffer
+        self.rows: List[BufferedEvent] = []
+        self.guild_rows: Dict[int, int] = {} # guild_id -> แถวที่ค้างใน rows
+        self.closed = False
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+        self._space = asyncio.Event()
+        self._space.set()
+        metrics.register_gauge_callback("voice_log_buffer", lambda: [({}, len(self.rows))])
+
+    async def put(self, row: BufferedEvent):
+        if VOICE_LOG_FLUSH_MS <= 0:
+            await self._flush([row])
+            return
+        guild_id = row[7]
+        wait_started = None
+        while not self.closed:
+            if len(self.rows) >= VOICE_LOG_BUFFER_MAX:
+                reason = "full"
+                log.warning(f"voice log buffer เต็ม ({len(self.rows)} แถว) รอ flush ก่อนรับ event ใหม่")
+            elif 0 < VOICE_LOG_GUILD_BUFFER_MAX <= self.guild_rows.get(guild_id, 0):
+                # เฉพาะ guild นี้รอ guild อื่นยังใส่ buffer ได้ตามปกติ (log ระดับ debug: เกิดทุก event ระหว่างถูกถล่ม)
+                reason = "guild_quota"
+                log.debug(f"guild {guild_id} มี voice event ค้างใน buffer ครบโควตา {VOICE_LOG_GUILD_BUFFER_MAX} แถว รอ flush")
+            else:
+                break
+            wait_started = wait_started or time.perf_counter()
+            self._wakeup.set() # flush ทันทีไม่ต้องรอ interval
+            self._space.clear()
+            await self._space.wait()
+        if wait_started is not None:
+            metrics.observe(BUFFER_WAIT_METRIC, time.perf_counter() - wait_started, reason=reason)
+        self.rows.append(row)
+        if guild_id is not None:
+            self.guild_rows[guild_id] = self.guild_rows.get(guild_id, 0) + 1
+        if len(self.rows) >= VOICE_LOG_BATCH_ROWS:
+            self._wakeup.set()
+        self._start()
+
+    def _start(self):
+        if self.rows and (self._task is None or self._task.done()):
+            self._task = self.loop.create_task(self._run(), name="db: voice_log_flush")
+
+    async def _run(self):
+        while self.rows:
+            if len(self.rows) < VOICE_LOG_BATCH_ROWS and not self.closed:
+                # รอให้ event ในช่วงเดียวกันสะสมเป็นชุด (หรือจนครบ batch / ถูกสั่ง flush)
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), VOICE_LOG_FLUSH_MS / 1000)
+                except asyncio.TimeoutError:
+                    pass
+            batch, self.rows = self.rows[:VOICE_LOG_BATCH_ROWS], self.rows[VOICE_LOG_BATCH_ROWS:]
+            self._release(batch)
+            self._space.set()
+            await self._flush(batch)
+
+    def _release(self, batch: List[BufferedEvent]):
+        for row in batch:
+            guild_id = row[7]
+            if guild_id is None:
+                continue
+            remaining = self.guild_rows[guild_id] - 1
+            if remaining:
+                self.guild_rows[guild_id] = remaining
+            else:
+                del self.guild_rows[guild_id]
+
+    async def _flush(self, batch: List[BufferedEvent]):
+        # ผู้ใช้ซ้ำในชุดเดียวกันเหลือแถวเดียว: first_seen = event แรก, ชื่อ/avatar/last_seen = event ล่าสุด
+        users: Dict[int, tuple] = {}
+        logs = []
+        for user_id, username, display_name, avatar_url, at, log_row, write_user, _ in batch:
+            if write_user:
+                first_seen = users[user_id][4] if user_id in users else at
+                users[user_id] = (user_id, username, display_name, avatar_url, first_seen, at)
+            if log_row is not None:
+                logs.append(log_row)
+
+        for attempt in range(1, FLUSH_ATTEMPTS + 1):
+            started = time.perf_counter()
+            try:
+                await _write_voice_batch(list(users.values()), logs)
+            except Exception:
+                metrics.inc(FLUSH_FAILURES_METRIC)
+                log.exception(f"เขียน voice log ชุด {len(batch)} แถวไม่สำเร็จ (ครั้งที่ {attempt}/{FLUSH_ATTEMPTS})")
+                if attempt < FLUSH_ATTEMPTS:
+                    await asyncio.sleep(0.5 * 2 ** (attempt - 1))
+                continue
+            metrics.observe(FLUSH_SECONDS_METRIC, time.perf_counter() - started)
+            metrics.observe(FLUSH_ROWS_METRIC, len(batch))
+            for user_id, username, display_name, avatar_url, _, last_seen in users.values():
+                _profiles.remember(user_id, _profiles.profile_hash(username, display_name, avatar_url), last_seen)
+            log.debug(f"flush voice log {len(logs)} แถว, ผู้ใช้ {len(users)} คน")
+            return
+        metrics.inc(DROPPED_METRIC, len(batch))
+        log.error(f"ทิ้ง voice event {len(batch)} รายการหลังเขียนไม่สำเร็จ {FLUSH_ATTEMPTS} ครั้ง")
+
+    async def flush(self):
+        """เขียนทุกแถวที่ค้างอยู่ทันทีแล้วรอจนเสร็จ"""
+        self._wakeup.set()
+        self._start() # แถวที่ย้ายมาจาก loop เดิมยังไม่มี task
+        while self._task is not None and not self._task.done():
+            await asyncio.shield(self._task)
+
+    async def close(self):
+        """ตอนปิด process: ไม่รอ interval และปล่อยผู้ที่รอ buffer ว่าง แล้ว flush ทุกแถวก่อนปิด pool"""
+        self.closed = True
+        self._space.set()
+        if self.rows:
+            log.info(f"กำลัง flush voice log ที่ค้างใน buffer {len(self.rows)} แถว")
+        await self.flush()
+
+
+_voice_buffer: Optional[VoiceLogBuffer] = None
+
+
+def _get_voice_buffer() -> VoiceLogBuffer:
+    global _voice_buffer
+    loop = asyncio.get_running_loop()
+    if _voice_buffer is None or _voice_buffer.loop is not loop:
+        # loop ใหม่ใน process เดิม (เช่น benchmark ที่รันหลาย loop ต่อกัน): Event/task ของ loop เดิมใช้ต่อไม่ได้
+        previous, _voice_buffer = _voice_buffer, VoiceLogBuffer(loop)
+        if previous is not None and previous.rows:
+            log.warning(f"ย้าย voice event {len(previous.rows)} รายการที่ค้างจาก event loop เดิมเข้า buffer ใหม่")
+            _voice_buffer.rows, _voice_buffer.guild_rows = previous.rows, previous.guild_rows
+    return _voice_buffer
+
+
+async def enqueue_voice_event(user_id: int, username: str, display_name: str, avatar_url: str = None, action: str = None,
+                              channel_id: int = None, channel_name: str = None, from_channel_id: int = None,
+                              from_channel_name: str = None, at: datetime = None, guild_id: int = None):
+    """
+    พัก upsert ผู้ใช้ + voice log (ถ้ามี action) ไว้เขียนเป็นชุด แทนการเรียก upsert_discord_user/add_voice_log ทีละ event
+    คืนทันทีเมื่อเข้า buffer (ยังไม่ได้เขียน DB); รอเฉพาะตอน buffer เต็ม หรือ guild_id มีแถวค้างครบ VOICE_LOG_GUILD_BUFFER_MAX
+    """
+    at = at or datetime.now(timezone.utc).replace(tzinfo=None) # ใช้ UTC
+    log_row = (user_id, action, channel_id, channel_name, from_channel_id, from_channel_name, at) if action else None
+    write_user = not _profiles.is_fresh(user_id, _profiles.profile_hash(username, display_name, avatar_url), at)
+    if not write_user and log_row is None:
+        return # ไม่มีอะไรต้องเขียน
+    await _get_voice_buffer().put((user_id, username, display_name, avatar_url, at, log_row, write_user, guild_id))
+
+
+async def flush_voice_events():
+    """เขียน voice event ที่ค้างใน buffer ทันที (เช่นก่อนอ่าน log ล่าสุด)"""
+    if _voice_buffer is not None:
+        await _get_voice_buffer().flush()
+
+
+async def _close_voice_buffer():
+    if _voice_buffer is not None:
+        await _get_voice_buffer().close()
+
+
+# PHASE_FLUSH: รันหลัง voice log ที่ Cog/worker กำลังประมวลผลเข้า buffer หมดแล้ว (PHASE_DRAIN) และก่อน close_pool()
+shutdown.register("voice_log_buffer", _close_voice_buffer, deadline=5.0, phase=shutdown.PHASE_FLUSH)
+
 # ตัวอย่างฟังก์ชันสำหรับดึงข้อมูล (ถ้าต้องการ)
-async def get_user_voice_logs(user_id: int, limit: int = 10):
-    pool = await get_pool()
-    async with pool.acquire() as conn:
+async def get_user_voice_logs(user_id: int, limit: int = 10, months: int = VOICE_LOG_QUERY_MONTHS):
+    """log ล่าสุดของ user ย้อนหลัง months เดือนนอกจากเดือนนี้ (0 = ทุก partition) ขอบล่างทำให้ planner ข้าม partition เก่า"""
+    await flush_voice_events() # ให้เห็น event ที่ยังค้างใน buffer ด้วย
+    if months <= 0:
+        async with _acquire() as conn:
+            return await conn.fetch("""
+                SELECT log_id, action, channel_name, "timestamp"
+                FROM voice_channel_logs
+                WHERE user_id = $1
+                ORDER BY "timestamp" DESC
+                LIMIT $2
+            """, user_id, limit)
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    since = datetime.combine(_add_months(date(now.year, now.month, 1), -months), datetime.min.time())
+    async with _acquire() as conn:
         rows = await conn.fetch("""
             SELECT log_id, action, channel_name, "timestamp"
             FROM voice_channel_logs
-            WHERE user_id = $1
+            WHERE user_id = $1 AND "timestamp" >= $3
             ORDER BY "timestamp" DESC
             LIMIT $2
-        """, user_id, limit) # Cast user_id to str
+        """, user_id, limit, since) # Cast user_id to str
         return rows
 
+async def get_user_voice_time(user_id: int, channel_id: int = None, since: datetime = None) -> float:
+    """
+    เวลารวม (วินาที) ที่ user อยู่ในช่องเสียง (ช่องเดียวถ้าระบุ channel_id) จาก voice_sessions
+    session ที่ยังเปิดอยู่นับถึงตอนนี้, session ที่ไม่รู้เวลาออก (UNKNOWN) ไม่ถูกนับ
+    """
+    await flush_voice_events()
+    async with _acquire() as conn:
+        return await conn.fetchval("""
+            SELECT COALESCE(SUM(COALESCE(duration_seconds, EXTRACT(EPOCH FROM (now() - joined_at)))), 0)::float8
+            FROM voice_sessions
+            WHERE user_id = $1
+              AND ($2::bigint IS NULL OR channel_id = $2)
+              AND ($3::timestamptz IS NULL OR joined_at >= $3)
+              AND (end_action IS NULL OR end_action <> 'UNKNOWN')
+        """, user_id, channel_id, since)
+
 # --- ฟังก์ชันสำหรับ setup และ teardown pool ใน bot หลัก ---
 # async def setup_db_pool():
 #     await get_pool() # เรียกเพื่อให้ pool ถูกสร้าง
@@ -0,0 +1,184 @@
+# db_migrations.py
+import logging
+import time
+from dataclasses import dataclass
+from typing import Tuple
+
+import asyncpg
+
+log = logging.getLogger(__name__)
+
+# --- ค่าคงที่ ---
+SCHEMA_TABLE = "schema_migrations"
+# key ของ advisory lock: หลาย process (เช่นแยก SHARD_IDS) เริ่มพร้อมกันได้ แต่มีตัวเดียวที่ apply migration
+MIGRATION_LOCK_KEY = 727_115_001
+
+
+@dataclass(frozen=True)
+class Migration:
+    """
+    การเปลี่ยน schema หนึ่งเวอร์ชัน: statements รันตามลำดับ แล้วบันทึก version ลง schema_migrations
+    transactional=False สำหรับคำสั่งที่รันใน transaction ไม่ได้ เช่น CREATE INDEX CONCURRENTLY
+    (ควรเขียนให้รันซ้ำได้ด้วย IF NOT EXISTS เผื่อ process ตายก่อนบันทึก version)
+    """
+    version: int
+    name: str
+    statements: Tuple[str, ...]
+    transactional: bool = True
+
+
+# --- รายการ migration (เพิ่มต่อท้ายเท่านั้น ห้ามแก้/ลบเวอร์ชันที่ deploy ไปแล้ว) ---
+MIGRATIONS: Tuple[Migration, ...] = (
+    # schema เดิมจาก initialize_database (IF NOT EXISTS: DB ที่สร้างไว้ก่อนมีระบบ migration ก็ apply ได้ไม่ error)
+    Migration(1, "create discord_users and voice_channel_logs", (
+        """
+        CREATE TABLE IF NOT EXISTS discord_users (
+            user_id BIGINT PRIMARY KEY,
+            username TEXT NOT NULL,
+            display_name TEXT NOT NULL,
+            avatar_url TEXT,
+            first_seen_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+            last_seen_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
+        );
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS voice_channel_logs (
+            log_id SERIAL PRIMARY KEY,
+            user_id BIGINT NOT NULL REFERENCES discord_users(user_id) ON DELETE CASCADE,
+            action TEXT NOT NULL,
+            channel_id BIGINT NOT NULL,
+            channel_name TEXT NOT NULL,
+            from_channel_id BIGINT,
+            from_channel_name TEXT,
+            "timestamp" TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
+        );
+        """,
+        'CREATE INDEX IF NOT EXISTS idx_voice_logs_user_id ON voice_channel_logs(user_id);',
+        'CREATE INDEX IF NOT EXISTS idx_voice_logs_timestamp ON voice_channel_logs("timestamp");',
+    )),
+    # voice_channel_logs -> partition รายเดือนตาม "timestamp" (ชื่อ voice_channel_logs_pYYYY_MM, ขอบเขตเป็นเวลา UTC)
+    # ย้ายแถวเดิมทั้งหมดใน transaction เดียว (ตารางถูก lock ระหว่าง copy) partition เดือนถัดๆ ไปและ retention
+    # จัดการโดย db_manager.maintain_voice_log_partitions()
+    Migration(2, "partition voice_channel_logs by month", (
+        'ALTER TABLE voice_channel_logs RENAME TO voice_channel_logs_heap;',
+        'ALTER INDEX IF EXISTS idx_voice_logs_user_id RENAME TO idx_voice_logs_heap_user_id;',
+        'ALTER INDEX IF EXISTS idx_voice_logs_timestamp RENAME TO idx_voice_logs_heap_timestamp;',
+        """
+        CREATE TABLE voice_channel_logs (
+            log_id BIGINT NOT NULL DEFAULT nextval('voice_channel_logs_log_id_seq'),
+            user_id BIGINT NOT NULL REFERENCES discord_users(user_id) ON DELETE CASCADE,
+            action TEXT NOT NULL,
+            channel_id BIGINT NOT NULL,
+            channel_name TEXT NOT NULL,
+            from_channel_id BIGINT,
+            from_channel_name TEXT,
+            "timestamp" TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (log_id, "timestamp")
+        ) PARTITION BY RANGE ("timestamp");
+        """,
+        'ALTER SEQUENCE voice_channel_logs_log_id_seq AS BIGINT OWNED BY voice_channel_logs.log_id;',
+        # index ถูกสร้างแยกในแต่ละ partition: ขนาด index ที่ต้องดูแลตอน insert ไม่โตตามประวัติทั้งหมด
+        'CREATE INDEX idx_voice_logs_user_time ON voice_channel_logs (user_id, "timestamp" DESC);',
+        # แถวที่ไม่มี partition รองรับ (เช่น maintenance ไม่ได้รันนานเกิน) ไม่ทำให้ insert ล้มเหลว
+        'CREATE TABLE voice_channel_logs_default PARTITION OF voice_channel_logs DEFAULT;',
+        """
+        DO $$
+        DECLARE
+            month_start TIMESTAMP;
+            last_month TIMESTAMP := date_trunc('month', now() AT TIME ZONE 'UTC');
+        BEGIN
+            SELECT date_trunc('month', MIN("timestamp") AT TIME ZONE 'UTC') INTO month_start FROM voice_channel_logs_heap;
+            month_start := LEAST(COALESCE(month_start, last_month), last_month);
+            WHILE month_start <= last_month LOOP
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF voice_channel_logs FOR VALUES FROM (%L) TO (%L)',
+                    'voice_channel_logs_p' || to_char(month_start, 'YYYY_MM'),
+                    to_char(month_start, 'YYYY-MM-DD') || ' 00:00:00+00',
+                    to_char(month_start + interval '1 month', 'YYYY-MM-DD') || ' 00:00:00+00'
+                );
+                month_start := month_start + interval '1 month';
+            END LOOP;
+        END $$;
+        """,
+        """
+        INSERT INTO voice_channel_logs (log_id, user_id, action, channel_id, channel_name, from_channel_id, from_channel_name, "timestamp")
+        SELECT log_id, user_id, action, channel_id, channel_name, from_channel_id, from_channel_name, COALESCE("timestamp", CURRENT_TIMESTAMP)
+        FROM voice_channel_logs_heap;
+        """,
+        'DROP TABLE voice_channel_logs_heap;',
+    )),
+    # ช่วงเวลาที่อยู่ในช่องเสียง (ดู voice_sessions.py) อัปเดตใน statement เดียวกับ voice log
+    # สร้างจากประวัติเดิมด้วย python voice_sessions.py
+    Migration(3, "create voice_sessions", (
+        """
+        CREATE TABLE IF NOT EXISTS voice_sessions (
+            session_id BIGSERIAL PRIMARY KEY,
+            user_id BIGINT NOT NULL REFERENCES discord_users(user_id) ON DELETE CASCADE,
+            channel_id BIGINT NOT NULL,
+            channel_name TEXT NOT NULL,
+            joined_at TIMESTAMPTZ NOT NULL,
+            left_at TIMESTAMPTZ,
+            end_action TEXT, -- NULL = ยังอยู่ในช่อง, LEAVE/MOVE_OUT/MOVE_INTERNAL, UNKNOWN = ไม่เห็นตอนออก
+            duration_seconds INTEGER GENERATED ALWAYS AS (EXTRACT(EPOCH FROM (left_at - joined_at))::integer) STORED
+        );
+        """,
+        'CREATE INDEX IF NOT EXISTS idx_voice_sessions_open ON voice_sessions (user_id, channel_id) WHERE end_action IS NULL;',
+        'CREATE INDEX IF NOT EXISTS idx_voice_sessions_user_channel ON voice_sessions (user_id, channel_id, joined_at DESC);',
+    )),
+)
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+async def current_version(conn) -> int:
+    """เวอร์ชัน schema ล่าสุดที่ apply แล้ว (0 = ยังไม่มีตาราง schema_migrations)"""
+    try:
+        return await conn.fetchval(f"SELECT COALESCE(MAX(version), 0) FROM {SCHEMA_TABLE}")
+    except asyncpg.UndefinedTableError:
+        return 0
+
+
+async def migrate(conn) -> int:
+    """
+    apply migration ที่ยังไม่ได้รันตามลำดับ คืนจำนวน migration ที่ apply
+    กรณีปกติ (schema ล่าสุดแล้ว) ใช้ query เดียว ไม่มี DDL
+    """
+    version = await current_version(conn)
+    if version >= LATEST_VERSION:
+        if version > LATEST_VERSION:
+            log.warning(f"Schema ใน DB (v{version}) ใหม่กว่าโค้ดนี้ (v{LATEST_VERSION}) อาจเป็นการ rollback deploy")
+        log.info(f"Schema เป็นเวอร์ชันล่าสุดแล้ว (v{version})")
+        return 0
+
+    await conn.execute("SELECT pg_advisory_lock($1)", MIGRATION_LOCK_KEY)
+    try:
+        await conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {SCHEMA_TABLE} (
+                version INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                applied_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP
+            );
+        """)
+        version = await current_version(conn) # process อื่นอาจ apply ไปแล้วระหว่างรอ lock
+        pending = [migration for migration in MIGRATIONS if migration.version > version]
+        for migration in pending:
+            await _apply(conn, migration)
+        return len(pending)
+    finally:
+        await conn.execute("SELECT pg_advisory_unlock($1)", MIGRATION_LOCK_KEY)
+
+
+async def _apply(conn, migration: Migration):
+    log.info(f"กำลัง apply migration v{migration.version}: {migration.name}")
+    started = time.perf_counter()
+    record = f"INSERT INTO {SCHEMA_TABLE} (version, name) VALUES ($1, $2)"
+    if migration.transactional:
+        async with conn.transaction():
+            for statement in migration.statements:
+                await conn.execute(statement)
+            await conn.execute(record, migration.version, migration.name)
+    else:
+        for statement in migration.statements:
+            await conn.execute(statement)
+        await conn.execute(record, migration.version, migration.name)
+    log.info(f"apply migration v{migration.version} สำเร็จ ({(time.perf_counter() - started) * 1000:.1f} ms)")
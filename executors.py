@@ -0,0 +1,114 @@
+# executors.py
+import asyncio
+import functools
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+import metrics
+
+log = logging.getLogger(__name__)
+
+# --- ค่าคงที่ ---
+# แยก thread pool ตามชนิดงาน แทน default executor ตัวเดียวของ loop
+# (รูปใน DM จำนวนมากจะไม่ทำให้การบันทึก bidding_state.json หรือ TTS ตามเวลาต้องรอคิว)
+#   tts   - gTTS.save (รอ network ไป Google เป็นหลัก)
+#   image - Pillow decode/crop/encode (ใช้ CPU, Pillow ปล่อย GIL ระหว่าง decode/encode)
+#   disk  - เขียนไฟล์ state/report เล็กๆ
+#   diagnostics - สร้างรายงาน !profile / snapshot ของ !memory (ไม่ให้แย่ง worker กับงานของผู้ใช้)
+POOL_SIZES = {
+    "tts": int(os.getenv("EXECUTOR_TTS_WORKERS", "4")),
+    "image": int(os.getenv("EXECUTOR_IMAGE_WORKERS", str(min(2, os.cpu_count() or 1)))),
+    "disk": int(os.getenv("EXECUTOR_DISK_WORKERS", "2")),
+    "diagnostics": 1,
+}
+
+WAIT_METRIC = "executor_queue_wait_seconds"
+RUN_METRIC = "executor_run_seconds"
+metrics.describe(WAIT_METRIC, "histogram", "Time a job waited in its executor queue before a worker picked it up, by pool.")
+metrics.describe(RUN_METRIC, "histogram", "Time a job ran on an executor worker, by pool and outcome.")
+metrics.describe("executor_jobs", "gauge", "Executor jobs by pool and state (queued = waiting for a worker).")
+
+# --- สถานะระดับ process ---
+_executors: Dict[str, ThreadPoolExecutor] = {}
+_queued: Dict[str, int] = {name: 0 for name in POOL_SIZES}
+_running: Dict[str, int] = {name: 0 for name in POOL_SIZES}
+_lock = threading.Lock() # ตัวนับถูกแก้ทั้งจาก event loop และ worker thread
+
+
+def get(pool: str) -> ThreadPoolExecutor:
+    """executor ของ pool (สร้างครั้งแรกที่ใช้)"""
+    executor = _executors.get(pool)
+    if executor is None:
+        if pool not in POOL_SIZES:
+            raise KeyError(f"ไม่มี executor pool '{pool}' (มี: {', '.join(POOL_SIZES)})")
+        executor = ThreadPoolExecutor(max_workers=max(1, POOL_SIZES[pool]), thread_name_prefix=f"{pool}-worker")
+        _executors[pool] = executor
+        metrics.register_gauge_callback("executor_jobs", _job_gauges)
+    return executor
+
+
+def _adjust(pool: str, queued: int = 0, running: int = 0):
+    with _lock:
+        _queued[pool] += queued
+        _running[pool] += running
+
+
+def _dequeue(pool: str, ticket: Dict[str, bool]) -> bool:
+    """ลด queued ของงานนี้ครั้งเดียว (ทั้งตอน worker รับงาน หรือตอนงานถูกยกเลิกก่อนได้รัน)"""
+    with _lock:
+        if ticket["dequeued"]:
+            return False
+        ticket["dequeued"] = True
+        _queued[pool] -= 1
+        return True
+
+
+def _job_gauges():
+    with _lock:
+        return [({"pool": pool, "state": "queued"}, _queued[pool]) for pool in POOL_SIZES] + \
+               [({"pool": pool, "state": "running"}, _running[pool]) for pool in POOL_SIZES]
+
+
+def queue_depth(pool: str) -> int:
+    """จำนวนงานที่รอ worker ของ pool อยู่"""
+    return _queued[pool]
+
+
+def _instrumented(pool: str, call: Callable, submitted: float, ticket: Dict[str, bool]) -> Any:
+    started = time.perf_counter()
+    _dequeue(pool, ticket)
+    _adjust(pool, running=1)
+    metrics.observe(WAIT_METRIC, started - submitted, pool=pool)
+    outcome = "ok"
+    try:
+        return call()
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        _adjust(pool, running=-1)
+        metrics.observe(RUN_METRIC, time.perf_counter() - started, pool=pool, outcome=outcome)
+
+
+async def run(pool: str, func: Callable, *args, **kwargs) -> Any:
+    """รัน func(*args, **kwargs) ใน thread pool ของงานชนิด pool แล้วรอผล (แทน loop.run_in_executor(None, ...))"""
+    executor = get(pool)
+    ticket = {"dequeued": False}
+    _adjust(pool, queued=1)
+    call = functools.partial(func, *args, **kwargs)
+    try:
+        return await asyncio.get_running_loop().run_in_executor(executor, _instrumented, pool, call, time.perf_counter(), ticket)
+    finally:
+        _dequeue(pool, ticket) # งานถูกยกเลิก/ถูกปฏิเสธ (executor ปิดแล้ว) ก่อนถึง worker
+
+
+def shutdown(wait: bool = True):
+    """ปิดทุก pool (เรียกจาก bot.main ตอนปิดบอท): wait=True รองานที่เริ่มแล้วให้เสร็จ เช่นการบันทึก state"""
+    for name, executor in list(_executors.items()):
+        executor.shutdown(wait=wait, cancel_futures=True)
+        log.info(f"Executor '{name}' ปิดแล้ว")
+    _executors.clear()
@@ -0,0 +1,143 @@
+# gateway_recorder.py
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import metrics
+
+log = logging.getLogger(__name__)
+
+# --- ค่าคงที่ ---
+# GATEWAY_RECORD_FILE=path: บันทึก event ที่บอทได้รับจาก gateway ต่อท้ายไฟล์นี้ (ว่าง = ปิด)
+# ใช้กับ benchmarks/replay_gateway.py เพื่อเล่นช่วงที่มีคนใช้เยอะ (เช่น Guild League) ซ้ำแบบ offline
+GATEWAY_RECORD_FILE = os.getenv("GATEWAY_RECORD_FILE", "")
+# GUILD_CREATE เก็บไว้เป็น snapshot ของช่อง/role เพื่อให้ replay สร้าง guild เดิมได้
+RECORDED_EVENTS = ("GUILD_CREATE", "VOICE_STATE_UPDATE", "INTERACTION_CREATE", "MESSAGE_CREATE")
+FORMAT_VERSION = 1
+FLUSH_INTERVAL = 1.0 # วินาที (event ที่ยังไม่ flush จะหายถ้า process ตายกะทันหัน)
+WRITE_BUFFER_SIZE = 64 * 1024
+
+RECORDED_METRIC = "gateway_events_recorded_total"
+metrics.describe(RECORDED_METRIC, "counter", "Gateway events appended to GATEWAY_RECORD_FILE, by event type.")
+
+# --- สถานะระดับ process ---
+_file = None
+_flush_task: Optional[asyncio.Task] = None
+_started_at = 0.0
+
+
+# --- ตัดส่วนที่ replay ไม่ใช้ออก ให้ไฟล์เล็ก ---
+def _compact_guild(data: Dict[str, Any]) -> Dict[str, Any]:
+    """GUILD_CREATE เหลือแค่ช่อง/role/voice state (สมาชิกมากับ event แต่ละตัวอยู่แล้ว)"""
+    compact = {key: value for key, value in data.items() if key not in ("members", "presences", "emojis", "stickers", "threads", "stage_instances", "guild_scheduled_events", "soundboard_sounds")}
+    compact.update(members=[], presences=[], emojis=[], stickers=[], threads=[])
+    return compact
+
+
+def _compact_message(data: Dict[str, Any]) -> Dict[str, Any]:
+    """ข้อความที่แนบมากับ interaction: เก็บแค่ id/ช่อง/ผู้ส่ง (เนื้อหาข้อความประมูลยาวได้ถึง 4000 ตัวอักษร)"""
+    return {
+        "id": data["id"], "channel_id": data["channel_id"], "author": data.get("author"), "content": "",
+        "timestamp": data.get("timestamp"), "edited_timestamp": None, "tts": False, "mention_everyone": False,
+        "mentions": [], "mention_roles": [], "attachments": [], "embeds": [], "components": [], "pinned": False,
+        "type": data.get("type", 0), "flags": data.get("flags", 0),
+    }
+
+
+def _prepare(event: str, data: Dict[str, Any], self_id: Optional[int], command_prefix: str) -> Optional[Dict[str, Any]]:
+    """คืน payload ที่จะบันทึก หรือ None ถ้าไม่ต้องบันทึก event นี้"""
+    if event == "GUILD_CREATE":
+        return None if data.get("unavailable") else _compact_guild(data)
+    if event == "VOICE_STATE_UPDATE":
+        return None if self_id is not None and int(data["user_id"]) == self_id else data # ไม่เก็บ voice state ของบอทเอง (TTS)
+    if event == "INTERACTION_CREATE":
+        if "message" not in data:
+            return data
+        return dict(data, message=_compact_message(data["message"]))
+    if event == "MESSAGE_CREATE":
+        if self_id is not None and int(data["author"]["id"]) == self_id:
+            return None
+        if "guild_id" not in data or data.get("content", "").startswith(command_prefix): # DM หรือคำสั่ง
+            return data
+    return None
+
+
+def _write(record: List[Any]):
+    _file.write(json.dumps(record, separators=(",", ":"), ensure_ascii=False) + "\n")
+
+
+def _recording_parser(event: str, parser: Callable, bot) -> Callable:
+    command_prefix = bot.command_prefix if isinstance(bot.command_prefix, str) else "!"
+
+    def record_then_parse(data):
+        try:
+            payload = _prepare(event, data, bot._connection.self_id, command_prefix)
+            if payload is not None:
+                _write([round((time.monotonic() - _started_at) * 1000, 1), event, payload])
+                metrics.inc(RECORDED_METRIC, event=event)
+        except Exception:
+            log.exception(f"บันทึก {event} ลง {GATEWAY_RECORD_FILE} ไม่สำเร็จ")
+        parser(data)
+
+    return record_then_parse
+
+
+async def _flush_periodically():
+    while True:
+        await asyncio.sleep(FLUSH_INTERVAL)
+        _file.flush()
+
+
+def start(bot, path: Optional[str] = None) -> bool:
+    """เริ่มบันทึก (เรียกจาก bot.main ก่อน bot.start): ห่อ parser ของ RECORDED_EVENTS และเปิด session ใหม่ในไฟล์"""
+    global _file, _flush_task, _started_at
+    path = path or GATEWAY_RECORD_FILE
+    if not path or _file is not None:
+        return False
+    _file = open(path, "a", encoding="utf-8", buffering=WRITE_BUFFER_SIZE)
+    _started_at = time.monotonic()
+    # บรรทัด header (object) เริ่ม session ใหม่ บรรทัดถัดไปเป็น [ms นับจาก header, event, payload]
+    _file.write(json.dumps({"version": FORMAT_VERSION, "started_at": time.time(), "events": RECORDED_EVENTS}) + "\n")
+    parsers = bot._connection.parsers # dict เดียวกับที่ DiscordWebSocket ใช้ dispatch
+    for event in RECORDED_EVENTS:
+        parsers[event] = _recording_parser(event, parsers[event], bot)
+    _flush_task = asyncio.get_running_loop().create_task(_flush_periodically(), name="gateway-recorder-flush")
+    log.info(f"Gateway recorder: บันทึก {', '.join(RECORDED_EVENTS)} ลง {path}")
+    return True
+
+
+def stop():
+    global _file, _flush_task
+    if _flush_task is not None:
+        _flush_task.cancel()
+        _flush_task = None
+    if _file is not None:
+        _file.close()
+        _file = None
+
+
+# --- อ่านไฟล์ (ใช้โดย benchmarks/replay_gateway.py) ---
+def read_sessions(path: str) -> List[Dict[str, Any]]:
+    """[{'header': {...}, 'events': [(ms, event, payload), ...]}, ...] ตามลำดับใน path"""
+    sessions: List[Dict[str, Any]] = []
+    for record in _read_lines(path):
+        if isinstance(record, dict):
+            sessions.append({"header": record, "events": []})
+        elif sessions:
+            sessions[-1]["events"].append(tuple(record))
+    return sessions
+
+
+def _read_lines(path: str) -> Iterator[Any]:
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                # บรรทัดสุดท้ายอาจขาดถ้า process ถูก kill ระหว่างเขียน
+                log.warning(f"{path}:{line_number}: ข้ามบรรทัดที่อ่านไม่ได้")
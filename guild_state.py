@@ -0,0 +1,79 @@
+# guild_state.py
+import logging
+from contextvars import ContextVar
+from typing import Callable, Dict, Generic, Iterator, Optional, Tuple, TypeVar
+
+log = logging.getLogger(__name__)
+
+# guild ของ interaction/คำสั่งที่ task ปัจจุบันกำลังทำงานให้ (Cog ที่มี state ต่อ guild ตั้งค่านี้ก่อนเรียก callback)
+current_guild_id: ContextVar[Optional[int]] = ContextVar("current_guild_id", default=None)
+
+GuildKey = Tuple[int, int] # (shard_id, guild_id)
+T = TypeVar("T")
+
+
+# --- shard ---
+def shard_count(bot) -> int:
+    """จำนวน shard ทั้งหมดของบอท (commands.Bot ธรรมดา = 1)"""
+    return getattr(bot, "shard_count", None) or 1
+
+
+def shard_id_for(bot, guild_id: int) -> int:
+    """shard ที่ Discord ส่ง event ของ guild นี้มา (สูตรเดียวกับ Discord)"""
+    return (guild_id >> 22) % shard_count(bot)
+
+
+def owns(bot, guild_id: int) -> bool:
+    """guild นี้อยู่ใน shard ของ process นี้หรือไม่ (SHARD_IDS แบ่ง shard ให้หลาย process)"""
+    shard_ids = getattr(bot, "shard_ids", None)
+    return shard_ids is None or shard_id_for(bot, guild_id) in shard_ids
+
+
+# --- state ต่อ (shard, guild) ---
+class GuildStateMap(Generic[T]):
+    """
+    state ของ Cog แยกตาม (shard, guild): สร้างด้วย factory(guild_id) ครั้งแรกที่ guild นั้นถูกใช้
+    จำนวน shard ของ AutoShardedBot รู้ตอน connect จึงจัดกลุ่มใหม่เมื่อ shard_count เปลี่ยน
+    """
+    def __init__(self, bot, factory: Callable[[int], T]):
+        self.bot = bot
+        self.factory = factory
+        self._shard_count = shard_count(bot)
+        self._shards: Dict[int, Dict[int, T]] = {}
+
+    def _by_shard(self) -> Dict[int, Dict[int, T]]:
+        count = shard_count(self.bot)
+        if count != self._shard_count:
+            states = [(guild_id, state) for shard in self._shards.values() for guild_id, state in shard.items()]
+            self._shards = {}
+            self._shard_count = count
+            for guild_id, state in states:
+                self._shards.setdefault(shard_id_for(self.bot, guild_id), {})[guild_id] = state
+        return self._shards
+
+    def key(self, guild_id: int) -> GuildKey:
+        return shard_id_for(self.bot, guild_id), guild_id
+
+    def get(self, guild_id: int) -> T:
+        shard = self._by_shard().setdefault(shard_id_for(self.bot, guild_id), {})
+        state = shard.get(guild_id)
+        if state is None:
+            state = shard[guild_id] = self.factory(guild_id)
+        return state
+
+    def peek(self, guild_id: int) -> Optional[T]:
+        return self._by_shard().get(shard_id_for(self.bot, guild_id), {}).get(guild_id)
+
+    def put(self, guild_id: int, state: T):
+        self._by_shard().setdefault(shard_id_for(self.bot, guild_id), {})[guild_id] = state
+
+    def items(self, shard_id: Optional[int] = None) -> Iterator[Tuple[int, T]]:
+        """(guild_id, state) ทุก guild หรือเฉพาะ guild ใน shard_id"""
+        shards = self._by_shard()
+        selected = shards.values() if shard_id is None else [shards.get(shard_id, {})]
+        for shard in list(selected):
+            yield from list(shard.items())
+
+    def __len__(self) -> int:
+        return sum(len(shard) for shard in self._by_shard().values())
+
@@ -1,51 +1,115 @@
 # image_analyzer_cog.py
 import discord
 from discord.ext import commands
-import google.generativeai as genai
 import os
 import io         # <<< เพิ่ม import io
 import json
-from dotenv import load_dotenv
 import logging
 import re
-from PIL import Image # <<< เพิ่ม import Image จาก Pillow
+import time
+import lazy_imports # google.generativeai และ Pillow จะถูก import ตอนใช้งานครั้งแรก
+import metrics
+import executors
+import shutdown
 
 # ตั้งค่า logging (เหมือนเดิม)
 log = logging.getLogger(__name__)
 
 # --- โหลด Environment Variables ---
-# (เหมือนเดิม)
-load_dotenv()
+# (bot.py โหลด .env แล้วก่อนโหลด cog)
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if not GEMINI_API_KEY:
-    # ... (error handling เหมือนเดิม)
-    log.error("ไม่พบ GEMINI_API_KEY ใน .env ไฟล์")
-    raise ValueError("ไม่พบ GEMINI_API_KEY ใน .env ไฟล์ สำหรับ Image Analyzer Cog")
+
+# --- Metrics ---
+GEMINI_LATENCY_METRIC = "gemini_request_seconds"
+metrics.describe(GEMINI_LATENCY_METRIC, "histogram", "Latency of Gemini generate_content calls, by outcome.")
+
+# --- Gateway intents ที่ Cog นี้ต้องใช้ (bot.py รวมจากทุก extension) ---
+# ทำงานเฉพาะข้อความใน DM จึงไม่ต้องรับ event ข้อความจาก guild
+REQUIRED_INTENTS = ('dm_messages', 'message_content')
 
 # --- ตั้งค่า Gemini ---
-# (เหมือนเดิม)
-try:
-    genai.configure(api_key=GEMINI_API_KEY)
-    gemini_model_name = 'gemini-2.0-flash' # หรือ 'gemini-2.0-flash'
-    log.info(f"กำลังพยายามสร้างโมเดล Gemini: {gemini_model_name}")
-    gemini_model = genai.GenerativeModel(gemini_model_name)
-    log.info(f"Image Analyzer Cog: เชื่อมต่อและสร้างโมเดล Gemini สำเร็จ (ใช้โมเดล: {gemini_model_name})")
-    GEMINI_PROMPT = "ขอรายละเอียดค่า stat ตัวละครจากในรูป ที่ไม่ใช่ค่า status เช่น STR AGI VIT INT DEX LUK แล้วแปลงให้เป็น JSON"
-except Exception as e:
-    # ... (error handling เหมือนเดิม)
-    log.exception(f"!!! ข้อผิดพลาดในการตั้งค่า Gemini (Image Analyzer Cog) ด้วยโมเดล {gemini_model_name}: {e}")
-    raise ConnectionError(f"ตั้งค่า Gemini ล้มเหลว ({gemini_model_name}): {e}")
+gemini_model_name = 'gemini-2.0-flash' # หรือ 'gemini-2.0-flash'
+GEMINI_PROMPT = "ขอรายละเอียดค่า stat ตัวละครจากในรูป ที่ไม่ใช่ค่า status เช่น STR AGI VIT INT DEX LUK แล้วแปลงให้เป็น JSON"
+
+# สร้างโมเดลเมื่อมีการเรียกใช้ครั้งแรก (เหมือน db_manager.get_pool) แทนการสร้างตอน import
+_gemini_model = None
+
+async def get_gemini_model():
+    """สร้างหรือคืนค่า Gemini model ที่มีอยู่"""
+    global _gemini_model
+    if _gemini_model is None:
+        if not GEMINI_API_KEY:
+            log.error("ไม่พบ GEMINI_API_KEY ใน .env ไฟล์")
+            raise ValueError("ไม่พบ GEMINI_API_KEY ใน .env ไฟล์ สำหรับ Image Analyzer Cog")
+        try:
+            genai = await lazy_imports.load_async('google.generativeai')
+            genai.configure(api_key=GEMINI_API_KEY)
+            log.info(f"กำลังพยายามสร้างโมเดล Gemini: {gemini_model_name}")
+            _gemini_model = genai.GenerativeModel(gemini_model_name)
+            log.info(f"Image Analyzer Cog: เชื่อมต่อและสร้างโมเดล Gemini สำเร็จ (ใช้โมเดล: {gemini_model_name})")
+        except Exception as e:
+            log.exception(f"!!! ข้อผิดพลาดในการตั้งค่า Gemini (Image Analyzer Cog) ด้วยโมเดล {gemini_model_name}: {e}")
+            raise ConnectionError(f"ตั้งค่า Gemini ล้มเหลว ({gemini_model_name}): {e}")
+    return _gemini_model
+
+def crop_left_half(Image, original_image_bytes: bytes, content_type: str):
+    """แบ่งครึ่งรูปแล้วคืน (bytes ของครึ่งซ้าย, format) - งาน CPU ล้วน รันใน executor 'image'"""
+    # 1. โหลด image bytes เข้า Pillow
+    img = Image.open(io.BytesIO(original_image_bytes))
+
+    # 2. หาขนาด
+    width, height = img.size
+    log.info(f"ขนาดรูปภาพต้นฉบับ: {width}x{height}")
+
+    # 3. กำหนดพิกัดครึ่งซ้าย (left, upper, right, lower)
+    # ใช้ integer division // เพื่อให้ได้ค่าจำนวนเต็ม
+    left_half_coords = (0, 0, width // 2, height)
+    log.info(f"พิกัดครึ่งซ้ายที่คำนวณได้: {left_half_coords}")
+
+    # 4. ตัดรูปภาพ
+    left_half_img = img.crop(left_half_coords)
+    log.info(f"ตัดรูปภาพครึ่งซ้ายสำเร็จ ขนาดใหม่: {left_half_img.width}x{left_half_img.height}")
+
+    # 5. บันทึกรูปภาพที่ตัดแล้วลงใน BytesIO buffer
+    output_buffer = io.BytesIO()
+    # พยายามบันทึกด้วย format เดิมของรูปภาพ
+    img_format = img.format if img.format else content_type.split('/')[-1].upper()
+    # จัดการกรณี format ไม่ได้มาตรฐาน (เช่น webp อาจต้องติดตั้ง plugin เพิ่ม)
+    if img_format == 'WEBP' and not Image.registered_extensions().get('.webp'):
+         log.warning("Format WEBP อาจไม่รองรับการบันทึกโดยตรง จะลองบันทึกเป็น PNG แทน")
+         img_format = 'PNG'
+    elif not img_format or img_format.upper() not in ['JPEG', 'PNG', 'GIF', 'BMP', 'TIFF']:
+         log.warning(f"ไม่รู้จัก format '{img_format}', จะลองบันทึกเป็น PNG แทน")
+         img_format = 'PNG' # ใช้ PNG เป็น default ที่ปลอดภัย
+
+    left_half_img.save(output_buffer, format=img_format)
+    processed_image_bytes = output_buffer.getvalue()
+    log.info(f"บันทึกรูปภาพครึ่งซ้ายเป็น bytes สำเร็จ ({len(processed_image_bytes)} bytes, format: {img_format})")
+    return processed_image_bytes, img_format
 
 class ImageAnalyzerCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.in_flight = shutdown.InFlight() # รูปใน DM ที่ยังวิเคราะห์/ตอบกลับไม่เสร็จ
         log.info("Image Analyzer Cog: โหลดสำเร็จ")
 
+    async def cog_load(self):
+        # ตอนปิดบอท รอคำตอบจาก Gemini ที่ผู้ใช้รออยู่ (ไม่งั้นผู้ใช้ได้แค่ข้อความ "กำลังส่งข้อมูล..." ค้างไว้)
+        shutdown.register("image_analyzer", self.in_flight.wait_idle, deadline=8.0)
+
+    async def cog_unload(self):
+        shutdown.unregister("image_analyzer", self.in_flight.wait_idle)
+
     @commands.Cog.listener()
     async def on_message(self, message: discord.Message):
-        if message.author == self.bot.user: return
-        if not isinstance(message.channel, discord.DMChannel): return
-
+        if message.author == self.bot.user or not isinstance(message.channel, discord.DMChannel):
+            metrics.record_event(f"{__name__}.on_message", handled=False)
+            return
+        metrics.record_event(f"{__name__}.on_message", handled=True)
+        with self.in_flight:
+            await self._handle_dm(message)
+
+    async def _handle_dm(self, message: discord.Message):
         log.info(f"ได้รับข้อความ DM จาก: {message.author} (ID: {message.author.id})")
 
         if message.attachments:
@@ -53,6 +117,14 @@ class ImageAnalyzerCog(commands.Cog):
             log.info(f"-> มีไฟล์แนบ: {attachment.filename} ({attachment.content_type})")
 
             if attachment.content_type and attachment.content_type.startswith('image/'):
+                # สร้าง/ดึงโมเดล Gemini ก่อน (ครั้งแรกจะ import google.generativeai ใน thread แยก)
+                try:
+                    gemini_model = await get_gemini_model()
+                except (ValueError, ConnectionError) as e:
+                    await message.channel.send(f"❌ ขออภัย ระบบวิเคราะห์รูปภาพยังไม่พร้อมใช้งาน: {e}")
+                    return
+                genai = lazy_imports.load('google.generativeai')
+
                 processing_msg = None
                 original_image_bytes = None # เก็บ bytes ดั้งเดิมไว้เผื่อกรณี error
                 try:
@@ -64,37 +136,10 @@ class ImageAnalyzerCog(commands.Cog):
                     processed_image_bytes = None
                     try:
                         log.info("กำลังประมวลผลรูปภาพ (แบ่งครึ่งซ้าย)...")
-                        # 1. โหลด image bytes เข้า Pillow
-                        img = Image.open(io.BytesIO(original_image_bytes))
-
-                        # 2. หาขนาด
-                        width, height = img.size
-                        log.info(f"ขนาดรูปภาพต้นฉบับ: {width}x{height}")
-
-                        # 3. กำหนดพิกัดครึ่งซ้าย (left, upper, right, lower)
-                        # ใช้ integer division // เพื่อให้ได้ค่าจำนวนเต็ม
-                        left_half_coords = (0, 0, width // 2, height)
-                        log.info(f"พิกัดครึ่งซ้ายที่คำนวณได้: {left_half_coords}")
-
-                        # 4. ตัดรูปภาพ
-                        left_half_img = img.crop(left_half_coords)
-                        log.info(f"ตัดรูปภาพครึ่งซ้ายสำเร็จ ขนาดใหม่: {left_half_img.width}x{left_half_img.height}")
-
-                        # 5. บันทึกรูปภาพที่ตัดแล้วลงใน BytesIO buffer
-                        output_buffer = io.BytesIO()
-                        # พยายามบันทึกด้วย format เดิมของรูปภาพ
-                        img_format = img.format if img.format else attachment.content_type.split('/')[-1].upper()
-                        # จัดการกรณี format ไม่ได้มาตรฐาน (เช่น webp อาจต้องติดตั้ง plugin เพิ่ม)
-                        if img_format == 'WEBP' and not Image.registered_extensions().get('.webp'):
-                             log.warning("Format WEBP อาจไม่รองรับการบันทึกโดยตรง จะลองบันทึกเป็น PNG แทน")
-                             img_format = 'PNG'
-                        elif not img_format or img_format.upper() not in ['JPEG', 'PNG', 'GIF', 'BMP', 'TIFF']:
-                             log.warning(f"ไม่รู้จัก format '{img_format}', จะลองบันทึกเป็น PNG แทน")
-                             img_format = 'PNG' # ใช้ PNG เป็น default ที่ปลอดภัย
-
-                        left_half_img.save(output_buffer, format=img_format)
-                        processed_image_bytes = output_buffer.getvalue()
-                        log.info(f"บันทึกรูปภาพครึ่งซ้ายเป็น bytes สำเร็จ ({len(processed_image_bytes)} bytes, format: {img_format})")
+                        Image = await lazy_imports.load_async('PIL.Image')
+                        # decode/crop/encode ใช้ CPU: ทำใน executor 'image' แทนการ block event loop
+                        processed_image_bytes, img_format = await executors.run(
+                            'image', crop_left_half, Image, original_image_bytes, attachment.content_type)
 
                     except Exception as img_proc_err:
                         log.exception(f"!!! เกิดข้อผิดพลาดระหว่างการประมวลผลรูปภาพ: {img_proc_err}")
@@ -123,14 +168,21 @@ class ImageAnalyzerCog(commands.Cog):
 
                     log.info(f"-> กำลังส่งรูปภาพครึ่งซ้าย ({len(processed_image_bytes)} bytes) และ prompt ไปยัง Gemini ({gemini_model_name})...")
                     try:
-                        response = await gemini_model.generate_content_async([GEMINI_PROMPT, image_part])
+                        gemini_started = time.perf_counter()
+                        try:
+                            response = await gemini_model.generate_content_async([GEMINI_PROMPT, image_part])
+                        except Exception:
+                            metrics.observe(GEMINI_LATENCY_METRIC, time.perf_counter() - gemini_started, outcome="error")
+                            raise
+                        metrics.observe(GEMINI_LATENCY_METRIC, time.perf_counter() - gemini_started, outcome="ok")
 
                         if processing_msg:
                            await processing_msg.delete()
                            processing_msg = None
 
                         result_text = response.text
-                        log.info(f"<- ได้รับผลลัพธ์จาก Gemini ({gemini_model_name}) หลังส่งครึ่งซ้าย:\n{result_text}")
+                        log.info(f"<- ได้รับผลลัพธ์จาก Gemini ({gemini_model_name}) หลังส่งครึ่งซ้าย ({len(result_text)} ตัวอักษร)")
+                        log.debug(f"Gemini raw response:\n{result_text}") # ข้อความเต็มเฉพาะ DEBUG
 
                         # --- ประมวลผล JSON และเลือก 4 รายการสุดท้าย (เหมือนเดิม) ---
                         processed_output = None
@@ -236,10 +288,10 @@ async def setup(bot: commands.Bot):
     """Loads the ImageAnalyzerCog."""
     # (เหมือนเดิม)
     try:
+        if not GEMINI_API_KEY:
+            log.warning("!!! ไม่พบ GEMINI_API_KEY: Image Analyzer Cog จะตอบกลับข้อผิดพลาดเมื่อได้รับรูปภาพ")
         await bot.add_cog(ImageAnalyzerCog(bot))
         log.info("ฟังก์ชัน setup ของ Image Analyzer Cog ทำงาน: โหลด Cog เรียบร้อย")
-    except ConnectionError as e:
-         log.error(f"!!! ไม่สามารถโหลด Image Analyzer Cog ได้เนื่องจากปัญหาการเชื่อมต่อ/ตั้งค่า Gemini: {e}")
     except Exception as e:
         log.exception(f"!!! ฟังก์ชัน setup ของ Image Analyzer Cog ล้มเหลวด้วยเหตุผลอื่น: {e}")
         raise e
\ No newline at end of file
@@ -0,0 +1,49 @@
+# lazy_imports.py
+import asyncio
+import importlib
+import logging
+import sys
+import time
+from types import ModuleType
+from typing import Iterable
+
+log = logging.getLogger(__name__)
+
+
+def _is_loaded(module_name: str) -> bool:
+    """True ถ้า module ถูก import เสร็จสมบูรณ์แล้ว (ไม่ใช่กำลัง import อยู่ใน thread อื่น)"""
+    module = sys.modules.get(module_name)
+    if module is None:
+        return False
+    spec = getattr(module, '__spec__', None)
+    return not getattr(spec, '_initializing', False)
+
+
+def load(module_name: str) -> ModuleType:
+    """import module ตอนใช้งานจริงครั้งแรก และ log เวลาที่ใช้ import"""
+    if _is_loaded(module_name):
+        return sys.modules[module_name]
+    start = time.perf_counter()
+    module = importlib.import_module(module_name)
+    log.info(f"Lazy import '{module_name}' ใช้เวลา {(time.perf_counter() - start) * 1000:.1f} ms")
+    return module
+
+
+async def load_async(module_name: str) -> ModuleType:
+    """เหมือน load() แต่ import ครั้งแรกใน thread แยก เพื่อไม่ให้ block event loop"""
+    if _is_loaded(module_name):
+        return sys.modules[module_name]
+    return await asyncio.to_thread(load, module_name)
+
+
+async def prewarm(module_names: Iterable[str]):
+    """import หลาย module พร้อมกันใน background (ข้อผิดพลาดจะถูก log ไว้ ไม่ถูกโยนต่อ)"""
+    module_names = list(module_names)
+    if not module_names:
+        return
+    start = time.perf_counter()
+    results = await asyncio.gather(*(load_async(name) for name in module_names), return_exceptions=True)
+    for module_name, result in zip(module_names, results):
+        if isinstance(result, Exception):
+            log.warning(f"Pre-warm import '{module_name}' ล้มเหลว: {result}")
+    log.info(f"Pre-warm {len(module_names)} modules เสร็จใน {(time.perf_counter() - start) * 1000:.1f} ms")
@@ -0,0 +1,147 @@
+# log_setup.py
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+
+import metrics
+
+# --- ค่าคงที่ ---
+# LOG_MODE=text (ค่าเริ่มต้น, เหมือน basicConfig เดิม) | json (handler ทำงานใน thread แยกหลังคิว + output เป็น JSON ทีละบรรทัด)
+LOG_MODE = os.getenv("LOG_MODE", "text").lower()
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FILE = os.getenv("LOG_FILE") # ถ้าตั้งค่า จะเขียนลงไฟล์นี้แทน stderr
+TEXT_FORMAT = '%(asctime)s:%(levelname)s:%(name)s: %(message)s'
+# จำนวน record สูงสุดต่อจุดที่เรียก log (ไฟล์+บรรทัด) ต่อ LOG_RATE_WINDOW วินาที สำหรับ DEBUG/INFO (0 = ไม่จำกัด)
+# WARNING ขึ้นไปผ่านเสมอ ใช้เฉพาะโหมด json (จำนวนที่ถูกตัดอยู่ใน field `suppressed`) โหมด text ไม่ตัด log
+LOG_RATE_LIMIT = int(os.getenv("LOG_RATE_LIMIT", "20"))
+LOG_RATE_WINDOW = float(os.getenv("LOG_RATE_WINDOW", "10"))
+# ขนาดคิวของโหมด json: ถ้าเต็ม (disk/stdout ช้า) record ใหม่จะถูกทิ้งแทนการบล็อก event loop
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+DROPPED_METRIC = "log_records_dropped_total"
+metrics.describe(DROPPED_METRIC, "counter", "Log records not written, by reason (rate_limited or queue_full).")
+metrics.describe("log_queue_depth", "gauge", "Log records waiting for the background writer thread (LOG_MODE=json).")
+
+# attribute มาตรฐานของ LogRecord ที่ไม่ต้องใส่ซ้ำใน JSON
+_RESERVED_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class CallSiteRateLimitFilter(logging.Filter):
+    """
+    จำกัดจำนวน DEBUG/INFO ต่อจุดที่เรียก log (pathname + lineno) ในแต่ละช่วงเวลา
+    record ถัดไปที่ผ่านได้จะมี attribute `suppressed` บอกจำนวนที่ถูกตัดทิ้งไป
+    """
+    def __init__(self, limit: int = LOG_RATE_LIMIT, window: float = LOG_RATE_WINDOW):
+        super().__init__()
+        self.limit = limit
+        self.window = window
+        # (pathname, lineno) -> [เริ่มช่วงเวลา, จำนวนที่ผ่าน, จำนวนที่ถูกตัด]
+        self._sites: Dict[Tuple[str, int], list] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.limit <= 0 or record.levelno >= logging.WARNING:
+            return True
+        key = (record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            site = self._sites.get(key)
+            if site is None or now - site[0] >= self.window:
+                suppressed = site[2] if site else 0
+                self._sites[key] = [now, 1, 0]
+                if suppressed:
+                    record.suppressed = suppressed
+                return True
+            if site[1] < self.limit:
+                site[1] += 1
+                return True
+            site[2] += 1
+        metrics.inc(DROPPED_METRIC, reason="rate_limited")
+        return False
+
+
+class JsonFormatter(logging.Formatter):
+    """หนึ่ง record = หนึ่งบรรทัด JSON (ts, level, logger, msg, ที่มา + extra fields)"""
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "func": record.funcName,
+            "line": record.lineno,
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED_ATTRS and not key.startswith("_"):
+                entry[key] = value if isinstance(value, (str, int, float, bool, type(None))) else repr(value)
+        if record.exc_text or record.exc_info:
+            entry["exc"] = record.exc_text or self.formatException(record.exc_info)
+        if record.stack_info:
+            entry["stack"] = self.formatStack(record.stack_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler ที่ไม่บล็อก: ถ้าคิวเต็มจะนับและทิ้ง record แทน"""
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            metrics.inc(DROPPED_METRIC, reason="queue_full")
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # จัดรูปข้อความ/traceback ตั้งแต่ตอนนี้ เพราะ args อาจเปลี่ยนก่อน thread เขียนจะถึงคิว
+        record.message = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg = record.message
+        record.args = None
+        return record
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def _output_handler() -> logging.Handler:
+    if LOG_FILE:
+        return logging.FileHandler(LOG_FILE, encoding="utf-8")
+    return logging.StreamHandler()
+
+
+def configure(mode: str = LOG_MODE):
+    """ตั้งค่า root logger ตาม LOG_MODE (เรียกครั้งเดียวตอนเริ่ม bot.py)"""
+    global _listener
+    root = logging.getLogger()
+    root.setLevel(LOG_LEVEL)
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+
+    output = _output_handler()
+    if mode == "json":
+        output.setFormatter(JsonFormatter())
+        log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+        queue_handler = DroppingQueueHandler(log_queue)
+        queue_handler.addFilter(CallSiteRateLimitFilter())
+        root.addHandler(queue_handler)
+        _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+        _listener.start()
+        metrics.register_gauge_callback("log_queue_depth", lambda: [({}, log_queue.qsize())])
+    else:
+        output.setFormatter(logging.Formatter(TEXT_FORMAT))
+        root.addHandler(output)
+    rate_limit = f"{LOG_RATE_LIMIT}/{LOG_RATE_WINDOW:g}s per call site" if mode == "json" and LOG_RATE_LIMIT > 0 else "off"
+    logging.getLogger(__name__).info(f"Logging mode: {mode} (level {LOG_LEVEL}, rate limit {rate_limit})")
+
+
+def shutdown():
+    """เขียน record ที่ค้างในคิวให้หมดแล้วหยุด thread (เรียกตอนบอทปิด)"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,49 @@
+# loop_runtime.py
+import asyncio
+import logging
+import os
+from typing import Awaitable, Optional, Tuple
+
+log = logging.getLogger(__name__)
+
+# --- ค่าคงที่ ---
+# EVENT_LOOP=asyncio (ค่าเริ่มต้น) | uvloop (ใช้ uvloop ถ้าติดตั้งไว้ ไม่งั้นกลับไปใช้ asyncio)
+EVENT_LOOP = os.getenv("EVENT_LOOP", "asyncio").lower()
+SUPPORTED_LOOPS = ("asyncio", "uvloop")
+
+
+def resolve(name: Optional[str] = None) -> Tuple[str, Optional[object]]:
+    """คืน (ชื่อ loop ที่จะใช้จริง, loop_factory) ตามที่ขอ; ถ้า uvloop ไม่พร้อมใช้จะ fallback เป็น asyncio"""
+    name = (name or EVENT_LOOP).lower()
+    if name not in SUPPORTED_LOOPS:
+        log.warning(f"EVENT_LOOP='{name}' ไม่รองรับ (เลือกได้: {', '.join(SUPPORTED_LOOPS)}) ใช้ asyncio แทน")
+        return "asyncio", None
+    if name == "uvloop":
+        try:
+            import uvloop
+        except ImportError:
+            log.warning("EVENT_LOOP=uvloop แต่ไม่ได้ติดตั้ง uvloop (pip install uvloop) ใช้ asyncio แทน")
+            return "asyncio", None
+        return "uvloop", uvloop.new_event_loop
+    return "asyncio", None
+
+
+def run(main: Awaitable, name: Optional[str] = None):
+    """asyncio.run() ที่เลือก event loop ได้ (uvloop ไม่มีบน Windows จึงต้อง fallback ได้เสมอ)"""
+    loop_name, loop_factory = resolve(name)
+    log.info(f"Event loop: {loop_name}")
+    if loop_factory is None:
+        return asyncio.run(main)
+    if hasattr(asyncio, "Runner"): # Python 3.11+
+        with asyncio.Runner(loop_factory=loop_factory) as runner:
+            return runner.run(main)
+    loop = loop_factory()
+    try:
+        asyncio.set_event_loop(loop)
+        return loop.run_until_complete(main)
+    finally:
+        try:
+            loop.run_until_complete(loop.shutdown_asyncgens())
+        finally:
+            asyncio.set_event_loop(None)
+            loop.close()
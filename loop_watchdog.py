@@ -0,0 +1,162 @@
+# loop_watchdog.py
+import asyncio
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+import metrics
+
+log = logging.getLogger(__name__)
+
+# --- ค่าคงที่ ---
+LOOP_WATCHDOG = os.getenv("LOOP_WATCHDOG", "on").lower() != "off"
+# ถ้า event loop ไม่ได้กลับมารัน heartbeat นานเกินนี้ จะถือว่ามี callback บล็อก loop และเก็บ stack ไว้
+LOOP_LAG_THRESHOLD_MS = float(os.getenv("LOOP_LAG_THRESHOLD_MS", "100"))
+HEARTBEAT_INTERVAL = 0.05 # วินาที (ระยะเวลาบล็อกที่วัดได้คลาดเคลื่อนไม่เกินค่านี้)
+MAX_INCIDENTS = 50
+STACK_DEPTH = 12
+
+# ไฟล์ในโฟลเดอร์โปรเจกต์ (bot.py, cogs, db_manager ...) ใช้ระบุเจ้าของ callback
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+# ยกเว้นไลบรารีที่อยู่ใต้โฟลเดอร์โปรเจกต์ (.venv/, venv/ หรือ site-packages/dist-packages ใดๆ) ไม่งั้น discord.py จะถูกนับเป็นโค้ดเรา
+_VENV_DIRS = sorted({os.path.relpath(os.path.abspath(prefix), PROJECT_DIR) + os.sep for prefix in (sys.prefix, sys.exec_prefix, sys.base_prefix)
+                     if os.path.abspath(prefix).startswith(PROJECT_DIR + os.sep)})
+_PROJECT_FILE = re.compile(re.escape(PROJECT_DIR + os.sep)
+                           + "(?!" + "".join(re.escape(d) + "|" for d in _VENV_DIRS) + r".*[\\/](?:site|dist)-packages[\\/])")
+_ASYNCIO_EVENTS_FILE = os.path.join("asyncio", "events.py")
+
+LAG_METRIC = "event_loop_lag_seconds"
+BLOCK_METRIC = "event_loop_block_seconds"
+SLOW_CALLBACKS_METRIC = "event_loop_slow_callbacks_total"
+metrics.describe(LAG_METRIC, "histogram", "Delay of the watchdog heartbeat beyond its scheduled wake-up time.")
+metrics.describe(BLOCK_METRIC, "histogram", "Duration of event-loop stalls longer than LOOP_LAG_THRESHOLD_MS, by owning module/function.")
+metrics.describe(SLOW_CALLBACKS_METRIC, "counter", "Event-loop stalls longer than LOOP_LAG_THRESHOLD_MS, by owning module/function.")
+
+# --- สถานะระดับ process ---
+_last_beat = time.monotonic()
+_loop_thread_id: Optional[int] = None
+_heartbeat_task: Optional[asyncio.Task] = None
+_sampler_thread: Optional[threading.Thread] = None
+_stop_event = threading.Event()
+# stall ที่กำลังเกิดขึ้น (เก็บโดย thread sampler, ปิดโดย heartbeat ตอน loop กลับมา)
+_current_stall: Optional[Dict] = None
+_incidents: Deque[Dict] = deque(maxlen=MAX_INCIDENTS)
+_recent_lag: Deque[float] = deque(maxlen=1200) # ~1 นาทีของ heartbeat
+
+
+def _owner_of(frames: List[traceback.FrameSummary], modules: List[str]) -> str:
+    """หา frame ในโปรเจกต์ที่อยู่ลึกที่สุด (ใกล้โค้ดที่บล็อกที่สุด) แล้วคืน 'module.function'"""
+    for frame_summary, module_name in zip(reversed(frames), reversed(modules)):
+        if frame_summary.name == "_run" and frame_summary.filename.endswith(_ASYNCIO_EVENTS_FILE):
+            break # ต่ำกว่านี้คือ event loop เอง (asyncio.run ใน bot.py) ไม่ใช่เจ้าของ callback
+        if _PROJECT_FILE.match(frame_summary.filename) and module_name != __name__:
+            return f"{module_name}.{frame_summary.name}"
+    return "external"
+
+
+def _capture_loop_stack() -> Optional[Dict]:
+    frame = sys._current_frames().get(_loop_thread_id)
+    if frame is None:
+        return None
+    frames: List[traceback.FrameSummary] = []
+    modules: List[str] = []
+    for frame_obj, lineno in traceback.walk_stack(frame):
+        frames.append(traceback.FrameSummary(frame_obj.f_code.co_filename, lineno, frame_obj.f_code.co_name))
+        modules.append(frame_obj.f_globals.get("__name__", "?"))
+    frames.reverse()
+    modules.reverse()
+    stack = traceback.StackSummary.from_list(frames[-STACK_DEPTH:])
+    return {"owner": _owner_of(frames, modules), "stack": "".join(stack.format())}
+
+
+def _sampler():
+    """thread แยก: ถ้า heartbeat ค้างเกิน threshold ให้ดู stack ของ thread ที่รัน event loop"""
+    global _current_stall
+    threshold = LOOP_LAG_THRESHOLD_MS / 1000
+    while not _stop_event.wait(threshold / 2):
+        stalled_for = time.monotonic() - _last_beat - HEARTBEAT_INTERVAL
+        if stalled_for > threshold and _current_stall is None:
+            captured = _capture_loop_stack()
+            if captured:
+                captured["started_at"] = _last_beat + HEARTBEAT_INTERVAL
+                captured["wall_time"] = time.time()
+                _current_stall = captured
+
+
+def _finish_stall(resumed_at: float):
+    global _current_stall
+    stall, _current_stall = _current_stall, None
+    if stall is None:
+        return
+    stall["duration"] = resumed_at - stall["started_at"]
+    _incidents.append(stall)
+    metrics.inc(SLOW_CALLBACKS_METRIC, owner=stall["owner"])
+    metrics.observe(BLOCK_METRIC, stall["duration"], owner=stall["owner"])
+    log.warning(f"Event loop ถูกบล็อก {stall['duration'] * 1000:.0f} ms โดย {stall['owner']}")
+
+
+async def _heartbeat():
+    global _last_beat
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + HEARTBEAT_INTERVAL
+        _last_beat = time.monotonic()
+        await asyncio.sleep(HEARTBEAT_INTERVAL)
+        lag = max(0.0, loop.time() - expected)
+        _recent_lag.append(lag)
+        metrics.observe(LAG_METRIC, lag)
+        if _current_stall is not None:
+            _finish_stall(time.monotonic())
+
+
+def start():
+    """เริ่ม heartbeat บน loop ปัจจุบัน และ thread sampler (เรียกจาก bot.main)"""
+    global _loop_thread_id, _heartbeat_task, _sampler_thread
+    if not LOOP_WATCHDOG or _heartbeat_task is not None:
+        return
+    _loop_thread_id = threading.get_ident()
+    _stop_event.clear()
+    _heartbeat_task = asyncio.get_running_loop().create_task(_heartbeat(), name="loop-watchdog-heartbeat")
+    _sampler_thread = threading.Thread(target=_sampler, name="loop-watchdog-sampler", daemon=True)
+    _sampler_thread.start()
+    log.info(f"Loop watchdog started (threshold {LOOP_LAG_THRESHOLD_MS:.0f} ms)")
+
+
+def stop():
+    global _heartbeat_task, _sampler_thread
+    _stop_event.set()
+    if _heartbeat_task is not None:
+        _heartbeat_task.cancel()
+        _heartbeat_task = None
+    _sampler_thread = None
+
+
+def lag_summary() -> Dict[str, float]:
+    """สรุป lag ของ heartbeat ช่วงหลังสุด (ms)"""
+    if not _recent_lag:
+        return {"samples": 0, "p50_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0}
+    ordered = sorted(_recent_lag)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+    return {"samples": len(ordered), "p50_ms": pick(0.5), "p99_ms": pick(0.99), "max_ms": ordered[-1] * 1000}
+
+
+def slow_callbacks_by_owner() -> Dict[str, Dict[str, float]]:
+    """{owner: {'count': n, 'total_ms': ..., 'max_ms': ...}} จาก stall ที่เก็บไว้ล่าสุด"""
+    summary: Dict[str, Dict[str, float]] = {}
+    for incident in _incidents:
+        entry = summary.setdefault(incident["owner"], {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+        duration_ms = incident["duration"] * 1000
+        entry["count"] += 1
+        entry["total_ms"] += duration_ms
+        entry["max_ms"] = max(entry["max_ms"], duration_ms)
+    return summary
+
+
+def recent_incidents(limit: int = 5) -> List[Dict]:
+    return list(_incidents)[-limit:]
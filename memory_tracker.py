@@ -0,0 +1,195 @@
+# memory_tracker.py
+import asyncio
+import collections
+import logging
+import os
+import time
+import tracemalloc
+from typing import Deque, Dict, List, Optional, Tuple
+
+import executors
+import metrics
+
+log = logging.getLogger(__name__)
+
+# --- ค่าคงที่ ---
+# MEMORY_TRACKING=on: เปิด tracemalloc ตั้งแต่ก่อนโหลด Cog เพื่อแยกหน่วยความจำที่ค้างอยู่ตามโมดูลที่สร้างมัน
+# (ใช้ RAM เพิ่มประมาณ 20-30% และทำให้การจองหน่วยความจำช้าลง จึงปิดไว้เป็นค่าเริ่มต้น)
+MEMORY_TRACKING = os.getenv("MEMORY_TRACKING", "off").lower() == "on"
+TRACEMALLOC_FRAMES = int(os.getenv("TRACEMALLOC_FRAMES", "16")) # ต้องลึกพอจะเห็น frame ของ Cog ใต้ discord.py
+MEMORY_SNAPSHOT_INTERVAL = float(os.getenv("MEMORY_SNAPSHOT_INTERVAL", "300")) # วินาที
+# เตือนเมื่อโมดูลใดโตขึ้นทุกครั้งติดกัน LEAK_WINDOW snapshot และรวมแล้วเกิน MEMORY_GROWTH_WARN_MB
+MEMORY_GROWTH_WARN_MB = float(os.getenv("MEMORY_GROWTH_WARN_MB", "20"))
+LEAK_WINDOW = 6
+TOP_SITES = 15
+# ไฟล์ในโฟลเดอร์โปรเจกต์ (bot.py, cogs, db_manager ...) ใช้ระบุเจ้าของหน่วยความจำ (เหมือน profiler/loop_watchdog)
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+LIBRARY_OWNER = "(library)" # จองโดยไลบรารีโดยไม่มีโค้ดในโปรเจกต์อยู่ใน traceback เช่น cache ของ discord.py
+
+TRACED_METRIC = "memory_traced_bytes"
+metrics.describe(TRACED_METRIC, "gauge", "Memory still allocated, by the project module that allocated it (MEMORY_TRACKING=on, last snapshot).")
+metrics.describe("process_resident_memory_bytes", "gauge", "Resident set size of the bot process.")
+
+Site = Tuple[str, str, int] # (module, filename, lineno) ของ frame ในโปรเจกต์ที่ใกล้การจองที่สุด
+SiteTotals = Dict[Site, Tuple[int, int]] # site -> (bytes, blocks)
+
+# --- สถานะระดับ process ---
+# เก็บเฉพาะยอดรวมต่อ site (ไม่เก็บ Snapshot ทั้งก้อนที่ใหญ่หลาย MB)
+_baseline: Optional[SiteTotals] = None
+_latest: Optional[SiteTotals] = None
+_history: Deque[Tuple[float, Dict[str, int]]] = collections.deque(maxlen=LEAK_WINDOW + 1)
+_warned: Dict[str, float] = {}
+_snapshot_task: Optional[asyncio.Task] = None
+
+
+def _module_for(filename: str) -> Optional[str]:
+    if not filename.startswith(PROJECT_DIR):
+        return None
+    return os.path.splitext(os.path.relpath(filename, PROJECT_DIR))[0].replace(os.sep, ".")
+
+
+def resident_bytes() -> Optional[int]:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None # ไม่ใช่ Linux
+
+
+def _rss_gauge():
+    rss = resident_bytes()
+    return [] if rss is None else [({}, rss)]
+
+
+def _module_gauges():
+    return [({"module": module}, size) for module, size in by_module(_latest or {}).items()]
+
+
+# --- snapshot ---
+def _collect_sites() -> SiteTotals:
+    """ถ่าย snapshot แล้วรวมขนาดตาม site (ใช้ CPU ตามจำนวน allocation จึงรันใน executor)"""
+    snapshot = tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+    sites: SiteTotals = {}
+    for stat in snapshot.statistics("traceback"):
+        site: Site = (LIBRARY_OWNER, "", 0)
+        for frame in reversed(stat.traceback): # frame ล่าสุดอยู่ท้าย
+            module = _module_for(frame.filename)
+            if module is not None:
+                site = (module, os.path.relpath(frame.filename, PROJECT_DIR), frame.lineno)
+                break
+        size, count = sites.get(site, (0, 0))
+        sites[site] = (size + stat.size, count + stat.count)
+    return sites
+
+
+def by_module(sites: SiteTotals) -> Dict[str, int]:
+    totals: Dict[str, int] = {}
+    for (module, _, _), (size, _) in sites.items():
+        totals[module] = totals.get(module, 0) + size
+    return totals
+
+
+def _check_growth(now: float, totals: Dict[str, int]):
+    """log เตือนถ้าโมดูลโตขึ้นทุก snapshot ในช่วง LEAK_WINDOW (เตือนซ้ำได้ทุกชั่วโมง)"""
+    _history.append((now, totals))
+    if len(_history) <= LEAK_WINDOW:
+        return
+    series = [sample for _, sample in _history]
+    for module in totals:
+        values = [sample.get(module, 0) for sample in series]
+        growth = values[-1] - values[0]
+        if growth < MEMORY_GROWTH_WARN_MB * 1024 * 1024 or any(b <= a for a, b in zip(values, values[1:])):
+            continue
+        if now - _warned.get(module, 0) >= 3600:
+            _warned[module] = now
+            minutes = (_history[-1][0] - _history[0][0]) / 60
+            log.warning(f"Memory: '{module}' โตขึ้นต่อเนื่อง {growth / 1048576:.1f} MB ใน {minutes:.0f} นาที (อาจมี leak, ดู !memory)")
+
+
+async def take_snapshot() -> Tuple[SiteTotals, Optional[SiteTotals]]:
+    """ถ่าย snapshot ใหม่ คืน (ยอดปัจจุบัน, ยอดของ snapshot ก่อนหน้า) และอัปเดต metrics"""
+    global _baseline, _latest
+    if not tracemalloc.is_tracing():
+        raise RuntimeError("tracemalloc ไม่ได้เปิดอยู่ (MEMORY_TRACKING=off)")
+    sites = await executors.run("diagnostics", _collect_sites)
+    previous, _latest = _latest, sites
+    if _baseline is None:
+        _baseline = sites
+    _check_growth(time.time(), by_module(sites))
+    return sites, previous
+
+
+async def _snapshot_periodically():
+    while True:
+        try:
+            await take_snapshot()
+        except Exception:
+            log.exception("Memory: ถ่าย snapshot ไม่สำเร็จ")
+        await asyncio.sleep(MEMORY_SNAPSHOT_INTERVAL)
+
+
+def start() -> bool:
+    """เปิด tracemalloc และ snapshot ตามรอบ (เรียกจาก bot.main ก่อนโหลด extensions)"""
+    global _snapshot_task
+    metrics.register_gauge_callback("process_resident_memory_bytes", _rss_gauge)
+    if not MEMORY_TRACKING or _snapshot_task is not None:
+        return False
+    tracemalloc.start(TRACEMALLOC_FRAMES)
+    metrics.register_gauge_callback(TRACED_METRIC, _module_gauges)
+    _snapshot_task = asyncio.get_running_loop().create_task(_snapshot_periodically(), name="memory-tracker-snapshot")
+    log.info(f"Memory tracking เปิดอยู่ (tracemalloc {TRACEMALLOC_FRAMES} frames, snapshot ทุก {MEMORY_SNAPSHOT_INTERVAL:.0f}s)")
+    return True
+
+
+def stop():
+    global _snapshot_task
+    if _snapshot_task is not None:
+        _snapshot_task.cancel()
+        _snapshot_task = None
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+# --- รายงาน (ใช้โดย !memory) ---
+def _mb(size: int) -> str:
+    return f"{size / 1048576:+.2f}" if size else "0.00"
+
+
+def format_modules(current: SiteTotals, previous: Optional[SiteTotals], limit: Optional[int] = None) -> str:
+    """ตารางหน่วยความจำต่อโมดูล: ปัจจุบัน, เปลี่ยนไปจาก snapshot แรก และจาก snapshot ก่อนหน้า (MB)"""
+    now, first, before = by_module(current), by_module(_baseline or current), by_module(previous or current)
+    rows = sorted(now.items(), key=lambda item: -item[1])[:limit]
+    lines = [f"{'module':<24} {'MB':>9} {'Δ start':>9} {'Δ last':>9}"]
+    for module, size in rows:
+        lines.append(f"{module:<24} {size / 1048576:>9.2f} {_mb(size - first.get(module, 0)):>9} {_mb(size - before.get(module, 0)):>9}")
+    return "\n".join(lines)
+
+
+def format_growth(current: SiteTotals, previous: Optional[SiteTotals], limit: int = TOP_SITES) -> str:
+    """บรรทัดในโปรเจกต์ที่หน่วยความจำค้างเพิ่มขึ้นมากที่สุดจาก snapshot ก่อนหน้า"""
+    previous = previous or {}
+    diffs: List[Tuple[int, int, Site]] = []
+    for site in set(current) | set(previous):
+        size, count = current.get(site, (0, 0))
+        old_size, old_count = previous.get(site, (0, 0))
+        if size != old_size:
+            diffs.append((size - old_size, count - old_count, site))
+    diffs.sort(key=lambda item: -item[0])
+    lines = [f"{'Δ KB':>10} {'Δ blocks':>9}  site"]
+    for size_diff, count_diff, (module, filename, lineno) in diffs[:limit]:
+        where = f"{filename}:{lineno}" if filename else module
+        lines.append(f"{size_diff / 1024:>+10.1f} {count_diff:>+9}  {where}")
+    return "\n".join(lines)
+
+
+def build_report(current: SiteTotals, previous: Optional[SiteTotals]) -> str:
+    traced, peak = tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else (0, 0)
+    rss = resident_bytes()
+    header = f"traced {traced / 1048576:.1f} MB (peak {peak / 1048576:.1f} MB)"
+    if rss is not None:
+        header += f", RSS {rss / 1048576:.1f} MB"
+    return "\n\n".join([
+        header,
+        "--- Retained memory by module ---\n" + format_modules(current, previous),
+        "--- Allocation sites, growth since previous snapshot ---\n" + format_growth(current, previous, limit=100),
+    ]) + "\n"
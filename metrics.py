@@ -0,0 +1,214 @@
+# metrics.py
+import logging
+import math
+import os
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+log = logging.getLogger(__name__)
+
+# --- ค่าคงที่ ---
+# Endpoint สำหรับ Prometheus (เปิดเฉพาะเครื่องตัวเองโดยค่าเริ่มต้น, METRICS_PORT=0 เพื่อปิด)
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))
+# ขอบ bucket ของ histogram (วินาที) ครอบคลุมตั้งแต่ dict lookup จนถึง Gemini/HTTP ที่ช้า
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# --- Counter / Histogram / Gauge ระดับ process ---
+# key: (ชื่อ metric, labels ที่เรียงแล้ว) -> ค่า
+LabelsType = Tuple[Tuple[str, str], ...]
+_counters: Dict[Tuple[str, LabelsType], float] = {}
+# key เดียวกัน -> [count ต่อ bucket..., +Inf count, sum]
+_histograms: Dict[Tuple[str, LabelsType], List[float]] = {}
+_gauges: Dict[Tuple[str, LabelsType], float] = {}
+# ชื่อ gauge -> ฟังก์ชันที่คืน [(labels, ค่า), ...] ตอน render (เช่น ขนาด pool, ความยาวคิว)
+_gauge_callbacks: Dict[str, Callable[[], Iterable[Tuple[Dict[str, object], float]]]] = {}
+# ชื่อ metric -> (type, help)
+_descriptions: Dict[str, Tuple[str, str]] = {}
+
+# ชื่อ metric สำหรับนับ event ที่ listener ได้รับ
+EVENTS_METRIC = "discord_listener_events_total"
+
+
+def _labels_key(labels: Dict[str, object]) -> LabelsType:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def describe(name: str, metric_type: str, help_text: str):
+    """ใส่ HELP/TYPE ให้ metric (ไม่บังคับ แต่ทำให้อ่านใน Prometheus ง่ายขึ้น)"""
+    _descriptions[name] = (metric_type, help_text)
+
+
+def inc(name: str, amount: float = 1, **labels):
+    """เพิ่มค่า counter (สร้างใหม่อัตโนมัติถ้ายังไม่มี)"""
+    key = (name, _labels_key(labels))
+    _counters[key] = _counters.get(key, 0) + amount
+
+
+def observe(name: str, value: float, **labels):
+    """บันทึกค่าลง histogram (หน่วยวินาทีสำหรับ latency)"""
+    key = (name, _labels_key(labels))
+    buckets = _histograms.get(key)
+    if buckets is None:
+        buckets = _histograms[key] = [0] * (len(DEFAULT_BUCKETS) + 2)
+    for index, bound in enumerate(DEFAULT_BUCKETS):
+        if value <= bound:
+            buckets[index] += 1
+            break
+    else:
+        buckets[len(DEFAULT_BUCKETS)] += 1
+    buckets[-1] += value
+
+
+@contextmanager
+def timer(name: str, **labels):
+    """จับเวลา block แล้ว observe ลง histogram (ใช้ครอบ await ได้)"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - started, **labels)
+
+
+def set_gauge(name: str, value: float, **labels):
+    _gauges[(name, _labels_key(labels))] = value
+
+
+def register_gauge_callback(name: str, callback: Callable[[], Iterable[Tuple[Dict[str, object], float]]]):
+    """ค่า gauge ที่คำนวณตอนถูกอ่าน (แทนที่ callback เดิมที่ใช้ชื่อเดียวกัน เช่นหลัง !reload)"""
+    _gauge_callbacks[name] = callback
+
+
+def counter_values(name: str) -> Dict[LabelsType, float]:
+    """คืนค่าทุกชุด label ของ counter ที่ระบุ"""
+    return {labels: value for (metric, labels), value in _counters.items() if metric == name}
+
+
+def histogram_summary(name: str) -> Dict[LabelsType, Tuple[int, float]]:
+    """คืน (จำนวนครั้ง, ผลรวม) ของ histogram ต่อชุด label"""
+    return {
+        labels: (int(sum(buckets[:-1])), buckets[-1])
+        for (metric, labels), buckets in _histograms.items() if metric == name
+    }
+
+
+def record_event(listener: str, handled: bool):
+    """นับ event ที่ listener ได้รับ: handled = ทำงานจริง, ไม่งั้นถือว่าถูกทิ้งตั้งแต่ต้น (dropped)"""
+    inc(EVENTS_METRIC, listener=listener, outcome="handled" if handled else "dropped")
+
+
+def event_counts() -> Dict[str, Dict[str, float]]:
+    """สรุปจำนวน event ต่อ listener: {listener: {'handled': n, 'dropped': m}}"""
+    summary: Dict[str, Dict[str, float]] = {}
+    for labels, value in counter_values(EVENTS_METRIC).items():
+        label_dict = dict(labels)
+        summary.setdefault(label_dict["listener"], {"handled": 0, "dropped": 0})[label_dict["outcome"]] += value
+    return summary
+
+
+describe(EVENTS_METRIC, "counter", "Events received by cog listeners, split into handled and dropped early.")
+
+
+# --- Prometheus text format ---
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: LabelsType, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def _header(lines: List[str], name: str, default_type: str):
+    metric_type, help_text = _descriptions.get(name, (default_type, ""))
+    if help_text:
+        lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} {metric_type}")
+
+
+def render() -> str:
+    """สร้างข้อความ metrics ทั้งหมดในรูปแบบ Prometheus text exposition (version 0.0.4)"""
+    lines: List[str] = []
+
+    by_name: Dict[str, List[Tuple[LabelsType, float]]] = {}
+    for (name, labels), value in _counters.items():
+        by_name.setdefault(name, []).append((labels, value))
+    for name in sorted(by_name):
+        _header(lines, name, "counter")
+        for labels, value in sorted(by_name[name]):
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+    histograms: Dict[str, List[Tuple[LabelsType, List[float]]]] = {}
+    for (name, labels), buckets in _histograms.items():
+        histograms.setdefault(name, []).append((labels, buckets))
+    for name in sorted(histograms):
+        _header(lines, name, "histogram")
+        for labels, buckets in sorted(histograms[name]):
+            cumulative = 0
+            for bound, count in zip(DEFAULT_BUCKETS + (math.inf,), buckets[:-1]):
+                cumulative += count
+                le = "+Inf" if math.isinf(bound) else repr(bound)
+                lines.append(f"{name}_bucket{_format_labels(labels, ('le', le))} {int(cumulative)}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(buckets[-1])}")
+            lines.append(f"{name}_count{_format_labels(labels)} {int(cumulative)}")
+
+    gauges: Dict[str, List[Tuple[LabelsType, float]]] = {}
+    for (name, labels), value in _gauges.items():
+        gauges.setdefault(name, []).append((labels, value))
+    for name, callback in list(_gauge_callbacks.items()):
+        try:
+            gauges[name] = [(_labels_key(labels), value) for labels, value in callback()]
+        except Exception:
+            log.exception(f"Metrics: gauge callback '{name}' ล้มเหลว")
+    for name in sorted(gauges):
+        _header(lines, name, "gauge")
+        for labels, value in sorted(gauges[name]):
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+    return "\n".join(lines) + "\n"
+
+
+# --- HTTP endpoint ---
+_runner = None
+
+
+async def start_server(host: str = METRICS_HOST, port: int = METRICS_PORT):
+    """เปิด endpoint /metrics บน event loop เดียวกับบอท (aiohttp มากับ discord.py อยู่แล้ว)"""
+    global _runner
+    if _runner is not None or not port:
+        return
+    from aiohttp import web
+
+    async def handle_metrics(request):
+        return web.Response(text=render(), content_type="text/plain", charset="utf-8",
+                            headers={"X-Content-Type-Options": "nosniff"})
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle_metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, host, port).start()
+    except OSError as e:
+        log.error(f"ไม่สามารถเปิด metrics endpoint ที่ {host}:{port}: {e}")
+        await runner.cleanup()
+        return
+    _runner = runner
+    log.info(f"Metrics endpoint: http://{host}:{port}/metrics")
+
+
+async def stop_server():
+    global _runner
+    if _runner is not None:
+        await _runner.cleanup()
+        _runner = None
+        log.info("Metrics endpoint ปิดแล้ว")
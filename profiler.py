@@ -0,0 +1,147 @@
+# profiler.py
+import asyncio
+import cProfile
+import io
+import logging
+import marshal
+import os
+import pstats
+import re
+import sys
+import time
+from typing import Dict, Optional, Tuple
+
+import metrics
+
+log = logging.getLogger(__name__)
+
+# --- ค่าคงที่ ---
+PROFILE_MAX_SECONDS = 300
+TOP_FUNCTIONS = 40
+# ไฟล์ในโฟลเดอร์โปรเจกต์ (bot.py, cogs, db_manager ...) ใช้ระบุว่าเวลาเป็นของ cog ไหน (เหมือน loop_watchdog)
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+# ยกเว้นไลบรารีที่อยู่ใต้โฟลเดอร์โปรเจกต์ (.venv/, venv/ หรือ site-packages/dist-packages ใดๆ) ไม่งั้นเวลาของ discord.py จะกลายเป็นโมดูลในโปรเจกต์
+_VENV_DIRS = sorted({os.path.relpath(os.path.abspath(prefix), PROJECT_DIR) + os.sep for prefix in (sys.prefix, sys.exec_prefix, sys.base_prefix)
+                     if os.path.abspath(prefix).startswith(PROJECT_DIR + os.sep)})
+_PROJECT_FILE = re.compile(re.escape(PROJECT_DIR + os.sep)
+                           + "(?!" + "".join(re.escape(d) + "|" for d in _VENV_DIRS) + r".*[\\/](?:site|dist)-packages[\\/])")
+LIBRARY_OWNER = "(library/event loop)" # เวลาที่ไม่มีโค้ดในโปรเจกต์เป็นผู้เรียก เช่น gateway parsing ของ discord.py
+MAX_ATTRIBUTION_DEPTH = 60
+# เวลาที่ loop รอ I/O อยู่เฉยๆ (selector ของ asyncio) ไม่นับเป็นเวลาของใคร
+IDLE_FUNCTION_PATTERN = re.compile(r"of 'select\.(epoll|poll|kqueue|devpoll)' objects|built-in method select\.select|GetQueuedCompletionStatus")
+
+PROFILE_METRIC = "profile_sessions_total"
+metrics.describe(PROFILE_METRIC, "counter", "On-demand cProfile sessions run with !profile.")
+
+# --- สถานะระดับ process ---
+_active = False # cProfile ทำงานได้ทีละตัวต่อ thread
+
+
+def is_active() -> bool:
+    return _active
+
+
+async def profile(seconds: float) -> Tuple[cProfile.Profile, float]:
+    """
+    เปิด cProfile บน thread ของ event loop เป็นเวลา seconds วินาที แล้วคืน (profiler, เวลาจริง)
+    ทุก coroutine/callback ที่รันบน loop ระหว่างนั้นถูกนับ (งานใน executor thread ไม่ถูกนับ)
+    cProfile ทำให้โค้ด Python ช้าลงระหว่างวัด จึงควรดูสัดส่วนมากกว่าเวลาสัมบูรณ์
+    """
+    global _active
+    if _active:
+        raise RuntimeError("มี profile session ทำงานอยู่แล้ว")
+    _active = True
+    profiler = cProfile.Profile()
+    started = time.perf_counter()
+    try:
+        profiler.enable()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            profiler.disable()
+    finally:
+        _active = False
+    metrics.inc(PROFILE_METRIC)
+    elapsed = time.perf_counter() - started
+    log.info(f"Profile session เสร็จ ({elapsed:.1f}s)")
+    return profiler, elapsed
+
+
+# --- แยกเวลาตาม cog ---
+def _module_for(filename: str) -> Optional[str]:
+    if not _PROJECT_FILE.match(filename):
+        return None
+    return os.path.splitext(os.path.relpath(filename, PROJECT_DIR))[0].replace(os.sep, ".")
+
+
+def attribute_by_module(stats: pstats.Stats) -> Dict[str, Dict[str, float]]:
+    """
+    เวลาต่อโมดูลในโปรเจกต์ (ไม่รวมเวลาที่ loop รอ I/O): self_s = เวลาในฟังก์ชันของโมดูลเอง, library_s = เวลาในไลบรารี (discord.py, asyncpg ...)
+    ที่โมดูลนั้นเรียก แบ่งตามสัดส่วน cumtime ของผู้เรียกแต่ละราย
+    """
+    raw = stats.stats # func -> (cc, nc, tt, ct, callers)
+    shares_cache: Dict[tuple, Dict[str, float]] = {}
+
+    def shares(func: tuple, visiting: frozenset) -> Dict[str, float]:
+        module = _module_for(func[0])
+        if module is not None:
+            return {module: 1.0}
+        if func in shares_cache:
+            return shares_cache[func]
+        callers = raw.get(func, (0, 0, 0, 0, {}))[4]
+        weights = {caller: info[3] or info[1] for caller, info in callers.items() if caller not in visiting}
+        total = sum(weights.values())
+        if not total or len(visiting) >= MAX_ATTRIBUTION_DEPTH:
+            return {LIBRARY_OWNER: 1.0}
+        result: Dict[str, float] = {}
+        for caller, weight in weights.items():
+            for owner, share in shares(caller, visiting | {func}).items():
+                result[owner] = result.get(owner, 0.0) + share * weight / total
+        shares_cache[func] = result # ถ้ามี cycle ค่านี้ประมาณจากเส้นทางแรกที่เจอ (พอสำหรับดูสัดส่วน)
+        return result
+
+    owners: Dict[str, Dict[str, float]] = {}
+    for func, (cc, nc, tt, ct, callers) in raw.items():
+        if IDLE_FUNCTION_PATTERN.search(func[2]):
+            continue
+        module = _module_for(func[0])
+        if module is not None:
+            row = owners.setdefault(module, {"self_s": 0.0, "library_s": 0.0, "calls": 0})
+            row["self_s"] += tt
+            row["calls"] += nc
+            continue
+        for owner, share in shares(func, frozenset()).items():
+            row = owners.setdefault(owner, {"self_s": 0.0, "library_s": 0.0, "calls": 0})
+            row["library_s"] += tt * share
+    return owners
+
+
+def format_owners(owners: Dict[str, Dict[str, float]], limit: Optional[int] = None) -> str:
+    """ตารางเวลาแยกตามโมดูล เรียงจากมากไปน้อย"""
+    profiled_total = sum(row["self_s"] + row["library_s"] for row in owners.values()) or 1.0
+    ordered = sorted(owners.items(), key=lambda item: -(item[1]["self_s"] + item[1]["library_s"]))[:limit]
+    lines = [f"{'module':<28} {'total s':>9} {'self s':>9} {'library s':>10} {'share':>7} {'calls':>10}"]
+    for owner, row in ordered:
+        total = row["self_s"] + row["library_s"]
+        lines.append(f"{owner:<28} {total:>9.3f} {row['self_s']:>9.3f} {row['library_s']:>10.3f} "
+                     f"{100 * total / profiled_total:>6.1f}% {int(row['calls']):>10}")
+    return "\n".join(lines)
+
+
+def build_report(profiler: cProfile.Profile, elapsed: float) -> Tuple[str, bytes, Dict[str, Dict[str, float]]]:
+    """คืน (รายงานข้อความ, ไฟล์ .prof สำหรับ pstats/snakeviz, เวลาแยกตามโมดูล) - ใช้ CPU จึงเรียกผ่าน executor"""
+    buffer = io.StringIO()
+    stats = pstats.Stats(profiler, stream=buffer)
+    owners = attribute_by_module(stats)
+
+    idle = sum(tt for func, (cc, nc, tt, ct, callers) in stats.stats.items() if IDLE_FUNCTION_PATTERN.search(func[2]))
+    buffer.write(f"Profile: {elapsed:.1f}s wall, {stats.total_calls} calls, "
+                 f"{stats.total_tt - idle:.3f}s busy / {idle:.3f}s idle (waiting for I/O) on the event loop thread\n\n")
+    buffer.write(format_owners(owners) + "\n")
+    buffer.write(f"\n--- Top {TOP_FUNCTIONS} by cumulative time ---\n")
+    stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(TOP_FUNCTIONS)
+    buffer.write(f"\n--- Top {TOP_FUNCTIONS} by own time ---\n")
+    stats.sort_stats(pstats.SortKey.TIME).print_stats(TOP_FUNCTIONS)
+    buffer.write("\n--- Project functions by cumulative time ---\n")
+    stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats("^" + _PROJECT_FILE.pattern, TOP_FUNCTIONS)
+    return buffer.getvalue(), marshal.dumps(stats.stats), owners
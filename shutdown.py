@@ -0,0 +1,141 @@
+# shutdown.py
+import asyncio
+import logging
+import os
+import signal
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, Optional
+
+log = logging.getLogger(__name__)
+
+# --- ค่าคงที่ ---
+# เวลารวมสูงสุด (วินาที) ที่รองานค้างก่อนปิดบอท ควรน้อยกว่าเวลาที่ process manager รอหลังส่ง SIGTERM
+# (docker stop = 10s ถ้าไม่ได้ตั้ง --time, systemd = 90s) ไม่งั้นจะโดน SIGKILL กลางคัน
+SHUTDOWN_TIMEOUT = float(os.getenv("SHUTDOWN_TIMEOUT", "8"))
+
+# ลำดับของ drain hook: hook ใน phase เดียวกันรันพร้อมกัน, phase ถัดไปเริ่มเมื่อ phase ก่อนหน้าเสร็จ/หมดเวลา
+PHASE_STOP = 0  # หยุดรับงานใหม่ (เช่น pause scheduler)
+PHASE_DRAIN = 1 # รองานที่กำลังทำอยู่ (DB write, interaction, เสียงที่กำลังเล่น, Gemini)
+PHASE_FLUSH = 2 # เขียนสิ่งที่ยังค้างใน buffer/หน่วยความจำลงที่เก็บถาวร
+
+
+@dataclass(frozen=True)
+class DrainHook:
+    name: str
+    callback: Callable[[], Awaitable[None]]
+    deadline: float
+    phase: int
+
+
+# --- สถานะระดับ process ---
+_hooks: Dict[str, DrainHook] = {}
+_bot = None
+_drain_task: Optional[asyncio.Task] = None
+_shutdown_task: Optional[asyncio.Task] = None
+
+
+class InFlight:
+    """นับงานที่กำลังทำอยู่ (with in_flight: ...) ให้ drain hook รอจนงานเหลือ 0"""
+    def __init__(self):
+        self.count = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    def __enter__(self):
+        self.count += 1
+        self._idle.clear()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.count -= 1
+        if self.count == 0:
+            self._idle.set()
+
+    async def wait_idle(self):
+        await self._idle.wait()
+
+
+def register(name: str, callback: Callable[[], Awaitable[None]], deadline: float = 5.0, phase: int = PHASE_DRAIN):
+    """
+    ลงทะเบียน drain hook (ชื่อซ้ำ = แทนที่ตัวเดิม เช่น Cog ที่ถูก !reload)
+    callback ถูกยกเลิกเมื่อเกิน deadline หรือเวลารวม SHUTDOWN_TIMEOUT ที่เหลือ
+    """
+    _hooks[name] = DrainHook(name, callback, deadline, phase)
+
+
+def unregister(name: str, callback: Optional[Callable[[], Awaitable[None]]] = None):
+    """ลบ hook (ถ้าระบุ callback จะลบเฉพาะเมื่อยังเป็นตัวเดียวกัน)"""
+    hook = _hooks.get(name)
+    if hook is not None and (callback is None or hook.callback == callback):
+        del _hooks[name]
+
+
+def is_draining() -> bool:
+    return _drain_task is not None
+
+
+async def _run_hook(hook: DrainHook, budget_end: float):
+    timeout = max(0.0, min(hook.deadline, budget_end - time.monotonic()))
+    started = time.perf_counter()
+    try:
+        await asyncio.wait_for(hook.callback(), timeout)
+        log.info(f"Drain '{hook.name}' เสร็จใน {(time.perf_counter() - started) * 1000:.0f} ms")
+    except asyncio.TimeoutError:
+        log.warning(f"Drain '{hook.name}' ไม่เสร็จภายใน {timeout:.1f}s ข้ามไปปิดบอทต่อ (งานที่ค้างอาจหาย)")
+    except Exception:
+        log.exception(f"Drain '{hook.name}' เกิดข้อผิดพลาด")
+
+
+async def _drain():
+    budget_end = time.monotonic() + SHUTDOWN_TIMEOUT
+    started = time.perf_counter()
+    for phase in sorted({hook.phase for hook in _hooks.values()}):
+        hooks = [hook for hook in _hooks.values() if hook.phase == phase]
+        await asyncio.gather(*(_run_hook(hook, budget_end) for hook in hooks))
+    log.info(f"Drain งานค้างทั้งหมดเสร็จใน {(time.perf_counter() - started) * 1000:.0f} ms")
+
+
+async def drain():
+    """รัน drain hook ทุกตัวตาม phase (ครั้งเดียวต่อ process; เรียกซ้ำจะรอรอบเดิมให้จบ)"""
+    global _drain_task
+    if _drain_task is None:
+        log.info(f"--- กำลังรองานค้างก่อนปิดบอท ({len(_hooks)} hooks, สูงสุด {SHUTDOWN_TIMEOUT}s) ---")
+        _drain_task = asyncio.create_task(_drain(), name="shutdown: drain")
+    try:
+        await asyncio.shield(_drain_task)
+    except asyncio.CancelledError:
+        if not _drain_task.cancelled():
+            raise
+
+
+async def _shutdown(reason: str):
+    log.info(f"--- ได้รับคำสั่งปิดบอท ({reason}) ---")
+    await drain()
+    if _bot is not None:
+        await _bot.close() # ปิด gateway/HTTP และ unload Cog; bot.start() ใน main() จะ return
+
+
+def request(reason: str = "request"):
+    """
+    เริ่มปิดบอทแบบ graceful: drain แล้วค่อย bot.close()
+    เรียกซ้ำระหว่าง drain (เช่นกด Ctrl+C สองครั้ง) = ไม่รองานค้างแล้ว ปิดทันที
+    """
+    global _shutdown_task
+    if _shutdown_task is None:
+        _shutdown_task = asyncio.get_running_loop().create_task(_shutdown(reason), name="shutdown")
+    elif _drain_task is not None and not _drain_task.done():
+        log.warning(f"ได้รับคำสั่งปิดซ้ำ ({reason}) ยกเลิกการรองานค้างและปิดทันที")
+        _drain_task.cancel()
+
+
+def install(bot):
+    """ผูก SIGTERM/SIGINT กับ request() (Windows ไม่รองรับ add_signal_handler: Ctrl+C จะปิดทันทีแบบเดิม)"""
+    global _bot
+    _bot = bot
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(sig, request, sig.name)
+        except (NotImplementedError, RuntimeError):
+            log.debug(f"ไม่สามารถผูก {sig.name} กับ graceful shutdown บนแพลตฟอร์มนี้")
@@ -0,0 +1,134 @@
+# startup_timing.py
+import asyncio
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+import executors
+
+log = logging.getLogger(__name__)
+
+# --- ค่าคงที่ ---
+# ไฟล์เก็บประวัติเวลา startup (JSON บรรทัดละครั้ง) เอาไว้เทียบหลัง deploy แต่ละรอบ
+STARTUP_REPORT_FILE = os.getenv("STARTUP_REPORT_FILE", "startup_timings.jsonl")
+PHASES = ("import", "setup", "on_ready")
+REPORT_WAIT_TIMEOUT = 30.0 # รอ on_ready ของ Cog ที่ยังทำงานอยู่ได้นานสุดกี่วินาทีก่อนออกรายงาน
+
+# --- สถานะระดับ process ---
+_process_start = time.perf_counter()
+_timings: Dict[str, Dict[str, float]] = {}
+_in_flight = 0
+_reported = False
+_report_task: Optional[asyncio.Task] = None
+
+
+def elapsed() -> float:
+    """เวลาที่ผ่านไป (วินาที) นับจากตอน process เริ่ม import โมดูลนี้"""
+    return time.perf_counter() - _process_start
+
+
+def record(name: str, phase: str, seconds: float):
+    """บันทึกเวลาของ phase หนึ่งๆ ของ extension (ถ้าเรียกซ้ำจะบวกเพิ่ม)"""
+    phases = _timings.setdefault(name, {})
+    phases[phase] = phases.get(phase, 0.0) + seconds
+
+
+@contextmanager
+def timed(name: str, phase: str):
+    """จับเวลา block ของโค้ด (ใช้ได้ทั้งโค้ดปกติและโค้ดที่มี await ข้างใน)"""
+    global _in_flight
+    _in_flight += 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, phase, time.perf_counter() - start)
+        _in_flight -= 1
+
+
+def time_on_ready_listeners(bot, extension: str):
+    """
+    จับเวลา on_ready listener ของ Cog ใน extension (phase on_ready) จนกว่าจะออกรายงาน
+    ห่อ listener แล้วแทนที่ทั้งใน bot และบน instance ของ Cog เพื่อให้ตอน unload/reload ลบตัวที่ห่อแล้วออกได้ตามปกติ
+    """
+    for cog in list(bot.cogs.values()):
+        if type(cog).__module__ != extension:
+            continue
+        for event_name, listener in cog.get_listeners():
+            if event_name != 'on_ready':
+                continue
+
+            async def timed_listener(*args, _listener=listener, **kwargs):
+                if _reported:
+                    return await _listener(*args, **kwargs)
+                with timed(extension, 'on_ready'):
+                    return await _listener(*args, **kwargs)
+
+            bot.remove_listener(listener, event_name)
+            setattr(cog, listener.__name__, timed_listener)
+            bot.add_listener(timed_listener, event_name)
+
+
+def is_reported() -> bool:
+    return _reported
+
+
+def format_table() -> str:
+    """จัดรูปแบบตารางเวลา startup ต่อ extension (หน่วย ms)"""
+    name_width = max([len("extension")] + [len(name) for name in _timings])
+    header = f"{'extension':<{name_width}} " + " ".join(f"{phase + ' (ms)':>14}" for phase in PHASES) + f" {'total (ms)':>14}"
+    lines = [header, "-" * len(header)]
+    for name, phases in _timings.items():
+        cells = " ".join(
+            f"{phases[phase] * 1000:>14.1f}" if phase in phases else f"{'-':>14}"
+            for phase in PHASES
+        )
+        total = sum(phases.values()) * 1000
+        lines.append(f"{name:<{name_width}} {cells} {total:>14.1f}")
+    return "\n".join(lines)
+
+
+def _append_report_file(entry: dict):
+    try:
+        with open(STARTUP_REPORT_FILE, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    except OSError as e:
+        log.error(f"ไม่สามารถบันทึกรายงาน startup ลง '{STARTUP_REPORT_FILE}': {e}")
+
+
+async def emit_report(**extra):
+    """รอให้งาน on_ready ที่จับเวลาอยู่เสร็จ (หรือหมดเวลา) แล้ว log ตาราง + บันทึกลงไฟล์"""
+    global _reported
+    if _reported:
+        return
+    _reported = True
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + REPORT_WAIT_TIMEOUT
+    while _in_flight and loop.time() < deadline:
+        await asyncio.sleep(0.05)
+    if _in_flight:
+        log.warning(f"รายงาน startup: ยังมีงาน on_ready ค้างอยู่ {_in_flight} งานหลังรอ {REPORT_WAIT_TIMEOUT}s")
+
+    log.info("--- Startup timing report ---\n" + format_table())
+    entry = {
+        "recorded_at": datetime.now(timezone.utc).isoformat(),
+        "timings_ms": {
+            name: {phase: round(seconds * 1000, 1) for phase, seconds in phases.items()}
+            for name, phases in _timings.items()
+        },
+    }
+    entry.update(extra)
+    await executors.run('disk', _append_report_file, entry)
+
+
+def schedule_report(**extra):
+    """สร้าง task สำหรับ emit_report (เรียกจาก on_ready ครั้งแรกเท่านั้น)"""
+    global _report_task
+    if _reported or _report_task is not None:
+        return
+    _report_task = asyncio.get_running_loop().create_task(emit_report(**extra))
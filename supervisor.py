@@ -0,0 +1,177 @@
+# supervisor.py
+import asyncio
+import collections
+import logging
+import os
+import time
+from typing import Awaitable, Callable, Deque, Dict, Optional, Set
+
+import metrics
+import shutdown
+
+log = logging.getLogger(__name__)
+
+# --- ค่าคงที่ ---
+# งานเบื้องหลังของ Cog แยกกลุ่มตามชนิด: แต่ละกลุ่มรันพร้อมกันได้ไม่เกิน limit ที่เหลือรอคิว
+# ถ้าคิวเต็ม (max_pending) งานใหม่จะถูกปฏิเสธ แทนที่ task จะสะสมไม่จำกัดระหว่าง voice event ถล่ม
+#   notify  - ส่ง Embed แจ้งเตือน voice log (รอ rate limit ของ Discord ได้นาน)
+#   voice   - งานของ voice client (รอเสียงเล่นจบ, disconnect)
+#   default - อื่นๆ (เช่น prewarm imports)
+GROUP_LIMITS = {
+    "notify": int(os.getenv("BACKGROUND_NOTIFY_CONCURRENCY", "8")),
+    "voice": 4,
+    "default": 16,
+}
+GROUP_MAX_PENDING = {
+    "notify": int(os.getenv("BACKGROUND_NOTIFY_MAX_PENDING", "500")),
+    "voice": 50,
+    "default": 100,
+}
+RESTART_POLICIES = ("never", "on_failure", "always")
+MAX_RESTART_BACKOFF = 60.0
+RECENT_FAILURES = 20 # จำนวน error ล่าสุดที่เก็บไว้ให้ !tasks แสดง
+
+RUN_METRIC = "background_task_seconds"
+FAILURES_METRIC = "background_task_failures_total"
+RESTARTS_METRIC = "background_task_restarts_total"
+REJECTED_METRIC = "background_tasks_rejected_total"
+metrics.describe(RUN_METRIC, "histogram", "Background task run time per attempt, by group and outcome.")
+metrics.describe(FAILURES_METRIC, "counter", "Background task attempts that raised, by group and task.")
+metrics.describe(RESTARTS_METRIC, "counter", "Background task restarts by the supervisor, by group and task.")
+metrics.describe(REJECTED_METRIC, "counter", "Background tasks refused because their group's queue was full, by group.")
+metrics.describe("background_tasks", "gauge", "Background tasks by group and state (queued = waiting for a free slot).")
+
+
+class _Group:
+    def __init__(self, name: str, loop: asyncio.AbstractEventLoop):
+        self.name = name
+        self.loop = loop # Semaphore และ task ผูกกับ loop ที่สร้าง group
+        self.limit = max(1, GROUP_LIMITS.get(name, GROUP_LIMITS["default"]))
+        self.max_pending = GROUP_MAX_PENDING.get(name, GROUP_MAX_PENDING["default"])
+        self.semaphore = asyncio.Semaphore(self.limit)
+        self.tasks: Set[asyncio.Task] = set()
+        self.running = 0
+        self.rejected = 0
+
+    @property
+    def queued(self) -> int:
+        return len(self.tasks) - self.running
+
+
+# --- สถานะระดับ process ---
+_groups: Dict[str, _Group] = {}
+_forever: Set[asyncio.Task] = set() # restart="always": ถูกยกเลิกตอนปิดบอทแทนการรอให้จบ
+_recent_failures: Deque[Dict] = collections.deque(maxlen=RECENT_FAILURES)
+_stopping = False
+
+
+def _group(name: str) -> _Group:
+    loop = asyncio.get_running_loop()
+    group = _groups.get(name)
+    if group is None or group.loop is not loop:
+        # loop ใหม่ใน process เดิม (เช่น benchmark ที่รันหลาย loop ต่อกัน): Semaphore/task ของ loop เดิมใช้ต่อไม่ได้
+        if group is not None:
+            log.debug(f"Background group '{name}' ถูกสร้างใหม่สำหรับ event loop ใหม่")
+            _forever.difference_update([task for task in _forever if task.get_loop() is not loop])
+        group = _groups[name] = _Group(name, loop)
+        metrics.register_gauge_callback("background_tasks", _task_gauges)
+    return group
+
+
+def _task_gauges():
+    rows = []
+    for group in _groups.values():
+        rows.append(({"group": group.name, "state": "running"}, group.running))
+        rows.append(({"group": group.name, "state": "queued"}, group.queued))
+    return rows
+
+
+def spawn(name: str, factory: Callable[[], Awaitable], *, group: str = "default", restart: str = "never",
+          max_restarts: int = 5, backoff: float = 1.0) -> Optional[asyncio.Task]:
+    """
+    เริ่มงานเบื้องหลังชื่อ name (ใช้ชื่อคงที่ เช่น 'voice_log.notify' เพราะเป็น label ของ metrics)
+    factory ถูกเรียกทุกครั้งที่เริ่ม/restart งาน (เช่น lambda: self._send(embed))
+    restart: 'never' | 'on_failure' (restart เมื่อ error ไม่เกิน max_restarts ครั้ง) | 'always' (งานที่ต้องรันตลอด)
+    คืน None ถ้าคิวของ group เต็มหรือบอทกำลังปิด (งานถูกทิ้ง)
+    """
+    if restart not in RESTART_POLICIES:
+        raise ValueError(f"restart ต้องเป็นหนึ่งใน {RESTART_POLICIES} (ได้ '{restart}')")
+    target = _group(group)
+    if _stopping or len(target.tasks) >= target.limit + target.max_pending:
+        target.rejected += 1
+        metrics.inc(REJECTED_METRIC, group=group)
+        log.warning(f"Background task '{name}' ถูกปฏิเสธ: group '{group}' เต็ม ({target.running} running, {target.queued} queued)"
+                    if not _stopping else f"Background task '{name}' ถูกปฏิเสธ: บอทกำลังปิด")
+        return None
+    task = asyncio.get_running_loop().create_task(_supervise(name, factory, target, restart, max_restarts, backoff),
+                                                  name=f"supervisor: {name}")
+    target.tasks.add(task)
+    task.add_done_callback(target.tasks.discard)
+    if restart == "always":
+        _forever.add(task)
+        task.add_done_callback(_forever.discard)
+    return task
+
+
+async def _supervise(name: str, factory: Callable[[], Awaitable], group: _Group, restart: str, max_restarts: int, backoff: float):
+    restarts = 0
+    while True:
+        started = None # None = ยังไม่ได้ slot (error ตอนรอ semaphore ไม่นับเป็นเวลารัน)
+        try:
+            async with group.semaphore:
+                group.running += 1
+                started = time.perf_counter()
+                try:
+                    await factory()
+                finally:
+                    group.running -= 1
+            outcome = "ok"
+        except asyncio.CancelledError:
+            if started is not None:
+                metrics.observe(RUN_METRIC, time.perf_counter() - started, group=group.name, outcome="cancelled")
+            raise
+        except Exception as e:
+            outcome = "error"
+            metrics.inc(FAILURES_METRIC, group=group.name, task=name)
+            _recent_failures.append({"task": name, "group": group.name, "error": repr(e), "at": time.time()})
+            log.exception(f"Background task '{name}' (group '{group.name}') เกิดข้อผิดพลาด")
+        if started is not None:
+            metrics.observe(RUN_METRIC, time.perf_counter() - started, group=group.name, outcome=outcome)
+
+        should_restart = restart == "always" or (restart == "on_failure" and outcome == "error")
+        if not should_restart or _stopping:
+            return
+        if outcome == "error" and restart == "on_failure" and restarts >= max_restarts:
+            log.error(f"Background task '{name}' ล้มเหลวเกิน {max_restarts} ครั้ง หยุด restart")
+            return
+        restarts += 1
+        metrics.inc(RESTARTS_METRIC, group=group.name, task=name)
+        delay = min(MAX_RESTART_BACKOFF, backoff * 2 ** (restarts - 1)) if outcome == "error" else backoff
+        log.info(f"Background task '{name}' จะ restart ครั้งที่ {restarts} ใน {delay:.1f}s")
+        await asyncio.sleep(delay)
+
+
+def stats() -> Dict[str, Dict[str, int]]:
+    """group -> {'running', 'queued', 'rejected', 'limit'} สำหรับ !tasks"""
+    return {name: {"running": group.running, "queued": group.queued, "rejected": group.rejected, "limit": group.limit}
+            for name, group in _groups.items()}
+
+
+def recent_failures(limit: int = 5):
+    return list(_recent_failures)[-limit:]
+
+
+async def _drain():
+    """ตอนปิดบอท: ไม่รับงานใหม่, ยกเลิกงานแบบ 'always' แล้วรองานที่ค้างอยู่ (เช่นแจ้งเตือนที่ยังส่งไม่ออก)"""
+    global _stopping
+    _stopping = True
+    for task in list(_forever):
+        task.cancel()
+    pending = [task for group in _groups.values() for task in group.tasks]
+    if pending:
+        log.info(f"รอ background task ที่ค้างอยู่ {len(pending)} งาน")
+        await asyncio.gather(*pending, return_exceptions=True)
+
+
+# PHASE_FLUSH: งานที่ drain hook อื่นสร้างขึ้นระหว่าง PHASE_DRAIN (เช่นแจ้งเตือนของ voice log ที่เพิ่งเขียน DB) ถูกรอด้วย
+shutdown.register("background_tasks", _drain, deadline=5.0, phase=shutdown.PHASE_FLUSH)
@@ -3,13 +3,19 @@ import discord
 from discord.ext import commands
 import asyncio
 import datetime
-from gtts import gTTS
 import os
 import logging
 import json
+import time
 from typing import Optional, List, Dict, Any
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from apscheduler.triggers.cron import CronTrigger
+import lazy_imports # gTTS และ APScheduler จะถูก import ตอนใช้งานครั้งแรก
+import cog_handoff
+import bot_config
+import metrics
+import executors
+import guild_state
+import shutdown
+import supervisor
 
 log = logging.getLogger(__name__)
 
@@ -18,6 +24,16 @@ TEMP_TTS_DIR = "temp_tts" # โฟลเดอร์เก็บไฟล์ TTS
 SCHEDULE_FILENAME = "tts_schedule.json"
 DEFAULT_LANG = 'en'
 
+# --- Metrics ---
+TTS_TRIGGER_TO_PLAY_METRIC = "tts_trigger_to_play_seconds"
+TTS_SKIPPED_METRIC = "tts_jobs_skipped_total"
+metrics.describe(TTS_TRIGGER_TO_PLAY_METRIC, "histogram", "Time from a TTS job/command firing to playback starting (connect + gTTS + FFmpeg spawn).")
+metrics.describe(TTS_SKIPPED_METRIC, "counter", "Scheduled TTS jobs skipped because another playback was in progress.")
+
+# --- Gateway intents ที่ Cog นี้ต้องใช้ (bot.py รวมจากทุก extension) ---
+# voice_states สำหรับเชื่อมต่อช่องเสียง, guild_messages + message_content สำหรับคำสั่ง !testtts
+REQUIRED_INTENTS = ('guilds', 'voice_states', 'guild_messages', 'message_content')
+
 # สร้าง directory ถ้ายังไม่มี
 if not os.path.exists(TEMP_TTS_DIR):
     try:
@@ -27,6 +43,15 @@ if not os.path.exists(TEMP_TTS_DIR):
         log.error(f"ไม่สามารถสร้าง directory {TEMP_TTS_DIR}: {e}")
         TEMP_TTS_DIR = "." # Fallback
 
+class GuildVoice:
+    """สถานะเสียงของ guild หนึ่ง: แต่ละ guild เล่นเสียงของตัวเองได้พร้อมกัน ไม่ต้องรอ lock ของ guild อื่น"""
+    def __init__(self, guild_id: int):
+        self.guild_id = guild_id
+        self.is_playing = False
+        self.current_voice_client: Optional[discord.VoiceClient] = None
+        self.job_lock = asyncio.Lock()
+
+
 class TextToSpeechSchedulerCog(commands.Cog):
     """
     A Cog that schedules Text-to-Speech announcements in a specific voice channel
@@ -43,20 +68,49 @@ class TextToSpeechSchedulerCog(commands.Cog):
             log.exception("Failed to create timezone object. Using system default.")
             self.default_timezone = None
 
-        self.target_guild_id = 1097740536527470717
-        self.target_voice_channel_id = 1250561983305224222
         self.ffmpeg_path = os.getenv("FFMPEG_PATH")
 
-        self.is_playing = False
-        self.current_voice_client: Optional[discord.VoiceClient] = None
-        self.job_lock = asyncio.Lock()
+        # (shard, guild) -> GuildVoice
+        self.voice: guild_state.GuildStateMap[GuildVoice] = guild_state.GuildStateMap(bot, GuildVoice)
+        # ไฟล์เสียงของ job ใช้ร่วมกันทุก guild: lock ต่อไฟล์กันไม่ให้หลาย guild สร้างไฟล์เดียวกันพร้อมกัน
+        self._audio_locks: Dict[str, asyncio.Lock] = {}
 
-        self.jobs_schedule_data = self._load_schedule_from_file()
-        if not self.jobs_schedule_data:
-            log.warning("ไม่สามารถโหลดตารางเวลาจากไฟล์ หรือไฟล์ว่างเปล่า. จะไม่มีการตั้งเวลา TTS อัตโนมัติ.")
+        # APScheduler is built on the first on_ready (see _start_scheduler) so its import stays off the startup path.
+        self.scheduler = None
+        self._scheduler_started = False
+        self._handed_off = False # True เมื่อส่ง scheduler/voice client ให้ instance ใหม่แล้ว (!reload)
 
+        handoff_state = cog_handoff.take(__name__)
+        if handoff_state is not None:
+            self.import_state(handoff_state)
+        else:
+            self.jobs_schedule_data = self._load_schedule_from_file()
+            if not self.jobs_schedule_data:
+                log.warning("ไม่สามารถโหลดตารางเวลาจากไฟล์ หรือไฟล์ว่างเปล่า. จะไม่มีการตั้งเวลา TTS อัตโนมัติ.")
+
+    # --- เป้าหมายของ Scheduled TTS จาก bot_config.json (tts_voice_channel_id ของแต่ละ guild) ---
+    def target_channels(self) -> Dict[int, int]:
+        """guild id -> ช่องเสียง ของ guild ที่อยู่ใน shard ของ process นี้"""
+        return {guild_id: channel_id for guild_id, channel_id in bot_config.get().tts_targets().items() if guild_state.owns(self.bot, guild_id)}
+
+    @property
+    def is_playing(self) -> bool:
+        """มี guild ใดกำลังเล่นเสียงอยู่"""
+        return any(voice.is_playing for _, voice in self.voice.items())
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        """Starts APScheduler once the bot is connected (on_ready can fire again on reconnect)."""
+        if not self._scheduler_started:
+            self._scheduler_started = True
+            await self._start_scheduler()
+
+    async def _start_scheduler(self):
+        """Imports APScheduler lazily, then creates the scheduler and schedules the jobs from the file."""
         try:
-            self.scheduler = AsyncIOScheduler(timezone=self.default_timezone)
+            asyncio_schedulers = await lazy_imports.load_async('apscheduler.schedulers.asyncio')
+            await lazy_imports.load_async('apscheduler.triggers.cron')
+            self.scheduler = asyncio_schedulers.AsyncIOScheduler(timezone=self.default_timezone)
             self._schedule_initial_jobs(self.jobs_schedule_data or [])
             self.scheduler.start()
             log.info(f"APScheduler started with timezone: {self.scheduler.timezone}")
@@ -64,6 +118,57 @@ class TextToSpeechSchedulerCog(commands.Cog):
             log.exception("Failed to initialize or start APScheduler!")
             self.scheduler = None
 
+    # --- ส่งต่อ state ระหว่าง !reload (ดู cog_handoff.py) ---
+    async def export_state(self) -> Dict[str, Any]:
+        """Hands the running scheduler and voice connection to the reloaded instance instead of rebuilding them."""
+        voices = dict(self.voice.items())
+        for voice in voices.values():
+            async with voice.job_lock: # รอ job/test ที่กำลังเชื่อมต่อหรือสร้างไฟล์เสียงของแต่ละ guild ให้เสร็จก่อน
+                pass
+        self._handed_off = True
+        return {
+            'scheduler': self.scheduler,
+            'scheduler_started': self._scheduler_started,
+            'jobs_schedule_data': self.jobs_schedule_data,
+            'voices': voices,
+        }
+
+    def import_state(self, state: Dict[str, Any]):
+        self.scheduler = state['scheduler']
+        self._scheduler_started = state['scheduler_started']
+        self.jobs_schedule_data = state['jobs_schedule_data']
+        voices = state.get('voices')
+        if voices is None:
+            # state จากโค้ดรุ่นก่อนที่มี voice client ชุดเดียว: เป็นของ guild ที่ voice client ต่ออยู่
+            vc = state['current_voice_client']
+            guild_id = vc.guild.id if vc else next(iter(bot_config.get().tts_targets()), 0)
+            legacy = GuildVoice(guild_id)
+            legacy.current_voice_client = vc
+            legacy.is_playing = state['is_playing']
+            legacy.job_lock = state['job_lock']
+            voices = {guild_id: legacy}
+        for guild_id, voice in voices.items():
+            self.voice.put(guild_id, voice)
+
+        if self.scheduler:
+            # Job เดิมยังชี้ไปที่ method ของ instance เก่า ย้ายให้เรียกโค้ดใหม่แทน
+            for job in self.scheduler.get_jobs():
+                job.modify(func=self.run_tts_job)
+            log.info(f"รับ APScheduler ต่อจาก instance เดิม ({len(self.scheduler.get_jobs())} jobs)")
+
+        for _, voice in self.voice.items():
+            vc = voice.current_voice_client
+            if voice.is_playing and vc and vc.is_playing():
+                # after-callback ของเสียงที่กำลังเล่นเป็นโค้ดของ instance เก่า จึงต้องรอเสียงจบเอง
+                supervisor.spawn("tts.handoff_playback", lambda vc=vc, voice=voice: self._wait_for_handoff_playback(vc, voice), group="voice")
+            else:
+                voice.is_playing = False
+
+    async def _wait_for_handoff_playback(self, vc: discord.VoiceClient, voice: GuildVoice):
+        while vc.is_playing():
+            await asyncio.sleep(0.5)
+        self._reset_playing_flag("reload-handoff", voice)
+
     def _load_schedule_from_file(self) -> Optional[List[Dict[str, Any]]]:
         """โหลดตารางเวลา Job จากไฟล์ JSON"""
         script_dir = os.path.dirname(__file__)
@@ -123,6 +228,7 @@ class TextToSpeechSchedulerCog(commands.Cog):
             log.warning("No valid job data provided to schedule.")
             return
 
+        CronTrigger = lazy_imports.load('apscheduler.triggers.cron').CronTrigger
         scheduled_count = 0
         for job_info in jobs_data:
             job_id = str(job_info.get("id")) # Ensure ID is string
@@ -154,8 +260,30 @@ class TextToSpeechSchedulerCog(commands.Cog):
                 log.exception(f"Failed to schedule job '{job_id}': {e}")
         log.info(f"Scheduled a total of {scheduled_count} jobs.")
 
+    async def cog_load(self):
+        # ตอนปิดบอท: หยุดเริ่ม job ใหม่ก่อน แล้วรอเสียงที่กำลังเล่นให้จบ (ไม่ตัดประกาศกลางประโยค)
+        shutdown.register("tts_scheduler", self._drain_scheduler, deadline=1.0, phase=shutdown.PHASE_STOP)
+        shutdown.register("tts_playback", self._drain_playback, deadline=6.0)
+
+    async def _drain_scheduler(self):
+        if self.scheduler and self.scheduler.running:
+            self.scheduler.pause()
+            log.info("APScheduler paused for shutdown.")
+
+    async def _drain_playback(self):
+        for _, voice in self.voice.items():
+            async with voice.job_lock: # job ที่กำลังเชื่อมต่อหรือสร้างไฟล์เสียง
+                pass
+        while any(voice.current_voice_client and voice.current_voice_client.is_playing() for _, voice in self.voice.items()):
+            await asyncio.sleep(0.25)
+
     def cog_unload(self):
         """Called when the Cog is unloaded."""
+        shutdown.unregister("tts_scheduler", self._drain_scheduler)
+        shutdown.unregister("tts_playback", self._drain_playback)
+        if self._handed_off:
+            log.info("Cog unloading for reload: scheduler and voice client were handed to the new instance.")
+            return
         if self.scheduler and self.scheduler.running:
             log.info("Shutting down APScheduler...")
             try:
@@ -165,13 +293,16 @@ class TextToSpeechSchedulerCog(commands.Cog):
             except Exception as e:
                  log.exception("Error during APScheduler shutdown.")
 
-        if self.current_voice_client and self.current_voice_client.is_connected():
-            log.warning("Cog unloading: Attempting to disconnect lingering voice client.")
-            asyncio.ensure_future(self._force_disconnect(), loop=self.bot.loop)
+        if shutdown.is_draining():
+            return # bot.close() ตัดการเชื่อมต่อ voice client ทั้งหมดเองหลัง unload Cog
+        for _, voice in self.voice.items():
+            if voice.current_voice_client and voice.current_voice_client.is_connected():
+                log.warning(f"Cog unloading: Attempting to disconnect lingering voice client (guild {voice.guild_id}).")
+                supervisor.spawn("tts.force_disconnect", lambda voice=voice: self._force_disconnect(voice), group="voice")
 
-    async def _force_disconnect(self):
+    async def _force_disconnect(self, voice: GuildVoice):
          """Force disconnect, usually on unload."""
-         vc = self.current_voice_client
+         vc = voice.current_voice_client
          if vc and vc.is_connected():
             log.info("Forcing disconnect...")
             try:
@@ -180,34 +311,47 @@ class TextToSpeechSchedulerCog(commands.Cog):
             except Exception as e:
                 log.error(f"Error during force disconnect: {e}")
             finally:
-                 self.current_voice_client = None
+                 voice.current_voice_client = None
          else:
              log.debug("Force disconnect called but no active/connected client found.")
 
 
     async def run_tts_job(self, job_id: str, message_to_speak: str, lang: str):
-        """Function called by APScheduler to run a TTS job. Reuses existing audio files."""
-        log_prefix = f"Job '{job_id}' (Lang: {lang}): "
+        """Function called by APScheduler to run a TTS job in every target guild. Reuses existing audio files."""
+        triggered_at = time.perf_counter()
+        targets = self.target_channels()
+        if not targets:
+            log.warning(f"Job '{job_id}': ไม่มี guild ที่ตั้งค่า tts_voice_channel_id ไว้")
+            return
+        # แต่ละ guild มี lock/voice client ของตัวเอง: guild ที่ต่อช่องเสียงช้าไม่ทำให้ guild อื่นเล่นช้าตาม
+        await asyncio.gather(*(
+            self._run_tts_job_in_guild(self.voice.get(guild_id), channel_id, job_id, message_to_speak, lang, triggered_at)
+            for guild_id, channel_id in targets.items()
+        ))
+
+    async def _run_tts_job_in_guild(self, voice: GuildVoice, target_voice_channel_id: int, job_id: str, message_to_speak: str, lang: str, triggered_at: float):
+        log_prefix = f"Job '{job_id}' (Lang: {lang}, Guild: {voice.guild_id}): "
         log.info(f"{log_prefix}Triggered. Attempting to acquire lock...")
 
-        async with self.job_lock:
+        async with voice.job_lock:
             log.info(f"{log_prefix}Acquired lock.")
-            if self.is_playing:
+            if voice.is_playing:
                 log.warning(f"{log_prefix}Another TTS job/test started while waiting for lock. Skipping.")
+                metrics.inc(TTS_SKIPPED_METRIC)
                 return # Release lock implicitly
 
-            self.is_playing = True
+            voice.is_playing = True
             log.info(f"{log_prefix}Set is_playing=True.")
 
-            guild = self.bot.get_guild(self.target_guild_id)
+            guild = self.bot.get_guild(voice.guild_id)
             if not guild:
-                log.error(f"{log_prefix}Cannot find target guild {self.target_guild_id}.")
-                self.is_playing = False; return
+                log.error(f"{log_prefix}Cannot find target guild {voice.guild_id}.")
+                voice.is_playing = False; return
 
-            voice_channel = guild.get_channel(self.target_voice_channel_id)
+            voice_channel = guild.get_channel(target_voice_channel_id)
             if not voice_channel or not isinstance(voice_channel, discord.VoiceChannel):
-                 log.error(f"{log_prefix}Cannot find target voice channel {self.target_voice_channel_id}.")
-                 self.is_playing = False; return
+                 log.error(f"{log_prefix}Cannot find target voice channel {target_voice_channel_id}.")
+                 voice.is_playing = False; return
 
             vc = guild.voice_client
             # --- MODIFICATION: Consistent filename including language ---
@@ -221,10 +365,10 @@ class TextToSpeechSchedulerCog(commands.Cog):
             try:
                 # --- Connect / Move ---
                 if vc and vc.is_connected():
-                    if vc.channel.id != self.target_voice_channel_id:
+                    if vc.channel.id != target_voice_channel_id:
                         log.info(f"{log_prefix}Moving voice client from {vc.channel.name} to {voice_channel.name}")
                         await vc.move_to(voice_channel)
-                        self.current_voice_client = vc
+                        voice.current_voice_client = vc
                     else:
                          log.info(f"{log_prefix}Already connected to {voice_channel.name}")
                     connected_or_moved = True
@@ -233,32 +377,35 @@ class TextToSpeechSchedulerCog(commands.Cog):
                     vc = await voice_channel.connect(timeout=20.0, reconnect=True)
                     if vc:
                          connected_or_moved = True
-                         self.current_voice_client = vc
+                         voice.current_voice_client = vc
                     else:
                          log.error(f"{log_prefix}Connection attempt returned None.")
 
-                if not connected_or_moved or not self.current_voice_client:
+                if not connected_or_moved or not voice.current_voice_client:
                     log.error(f"{log_prefix}Failed to establish voice connection.")
-                    self.is_playing = False; return
+                    voice.is_playing = False; return
 
                 # --- Generate TTS File (Only if it doesn't exist) ---
                 # --- MODIFICATION: Check for existing file ---
-                if not os.path.exists(tts_filename):
-                    log.info(f"{log_prefix}Audio file not found. Generating audio: '{message_to_speak}'")
-                    try:
-                        tts = gTTS(text=message_to_speak, lang=lang, slow=False)
-                        # Ensure directory exists before saving
-                        os.makedirs(os.path.dirname(tts_filename), exist_ok=True)
-                        await self.bot.loop.run_in_executor(None, tts.save, tts_filename)
-                        log.info(f"{log_prefix}Saved new audio to: {tts_filename}")
-                    except ValueError as e_lang:
-                        log.warning(f"{log_prefix}Invalid language code '{lang}': {e_lang}")
-                        self.is_playing = False; return
-                    except Exception as e_gtts:
-                        log.exception(f"{log_prefix}Failed to generate audio.")
-                        self.is_playing = False; return
-                else:
-                    log.info(f"{log_prefix}Reusing existing audio file: {tts_filename}")
+                # guild อื่นที่รัน job เดียวกันพร้อมกันรอไฟล์จาก lock นี้ แล้วใช้ไฟล์ซ้ำ
+                async with self._audio_locks.setdefault(tts_filename, asyncio.Lock()):
+                    if not os.path.exists(tts_filename):
+                        log.info(f"{log_prefix}Audio file not found. Generating audio: '{message_to_speak}'")
+                        try:
+                            gTTS = (await lazy_imports.load_async('gtts')).gTTS
+                            tts = gTTS(text=message_to_speak, lang=lang, slow=False)
+                            # Ensure directory exists before saving
+                            os.makedirs(os.path.dirname(tts_filename), exist_ok=True)
+                            await executors.run('tts', tts.save, tts_filename)
+                            log.info(f"{log_prefix}Saved new audio to: {tts_filename}")
+                        except ValueError as e_lang:
+                            log.warning(f"{log_prefix}Invalid language code '{lang}': {e_lang}")
+                            voice.is_playing = False; return
+                        except Exception as e_gtts:
+                            log.exception(f"{log_prefix}Failed to generate audio.")
+                            voice.is_playing = False; return
+                    else:
+                        log.info(f"{log_prefix}Reusing existing audio file: {tts_filename}")
                 # --- END MODIFICATION ---
 
                 # --- Play Audio File ---
@@ -266,43 +413,44 @@ class TextToSpeechSchedulerCog(commands.Cog):
                     log.info(f"{log_prefix}Playing audio in {voice_channel.name}")
                     def after_play_callback(error: Optional[Exception]):
                         # Pass filename for logging, though we won't delete it
-                        self.after_play_cleanup_job(error, job_id, lang, tts_filename)
+                        self.after_play_cleanup_job(error, job_id, lang, tts_filename, voice)
 
-                    if not self.current_voice_client or not self.current_voice_client.is_connected():
+                    if not voice.current_voice_client or not voice.current_voice_client.is_connected():
                         log.error(f"{log_prefix}Voice client disconnected before playback could start.")
-                        self.is_playing = False; return
+                        voice.is_playing = False; return
 
                     try:
                         source = discord.FFmpegPCMAudio(tts_filename, executable=self.ffmpeg_path)
-                        self.current_voice_client.play(source, after=after_play_callback)
+                        voice.current_voice_client.play(source, after=after_play_callback)
                         play_initiated = True
+                        metrics.observe(TTS_TRIGGER_TO_PLAY_METRIC, time.perf_counter() - triggered_at, source="scheduled")
                         log.debug(f"{log_prefix}Playback initiated.")
                     except Exception as e_play:
                          log.exception(f"{log_prefix}Error initiating playback with FFmpegPCMAudio for {tts_filename}.")
-                         self.is_playing = False; return
+                         voice.is_playing = False; return
 
                 else:
                     # This should ideally not happen if generation succeeded or file existed
                     log.error(f"{log_prefix}Audio file unexpectedly not found before playback: {tts_filename}")
-                    self.is_playing = False; return
+                    voice.is_playing = False; return
 
             except discord.errors.ClientException as e_voice:
                  log.error(f"{log_prefix}Voice client error (e.g., already connected elsewhere?): {e_voice}")
-                 self.is_playing = False; # Reset flag
+                 voice.is_playing = False; # Reset flag
                  # Don't try to disconnect here, might cause issues
             except Exception as e:
                 log.exception(f"{log_prefix}An unexpected error occurred during connection or playback setup.")
-                self.is_playing = False # Ensure flag is reset on error
+                voice.is_playing = False # Ensure flag is reset on error
 
             finally:
                 if not play_initiated:
                     # If play never started, ensure flag is reset and lock is released
-                    self.is_playing = False
+                    voice.is_playing = False
                     log.debug(f"{log_prefix}Resetting is_playing flag in finally block (play not initiated).")
                 # Lock is released automatically by 'async with'
 
     # --- MODIFICATION: Changed signature slightly for logging ---
-    def after_play_cleanup_job(self, error: Optional[Exception], job_id: str, lang: str, audio_filename: str):
+    def after_play_cleanup_job(self, error: Optional[Exception], job_id: str, lang: str, audio_filename: str, voice: GuildVoice):
         """Callback function executed after scheduled TTS playback finishes or errors. Does NOT delete the audio file."""
         log_prefix = f"Job '{job_id}' (Lang: {lang}) Callback: "
         # --- END MODIFICATION ---
@@ -318,12 +466,12 @@ class TextToSpeechSchedulerCog(commands.Cog):
         # Reset playing flag (critical)
         # Needs job_id and lang for unique identifier in logging if needed
         reset_id = f"{job_id}-{lang}"
-        self.bot.loop.call_soon_threadsafe(self._reset_playing_flag, reset_id)
+        self.bot.loop.call_soon_threadsafe(self._reset_playing_flag, reset_id, voice)
 
-    def _reset_playing_flag(self, source_id: str):
-         """Resets the playing flag. Intended to be called from threadsafe context."""
-         log.info(f"Callback Helper for '{source_id}': Resetting is_playing flag.")
-         self.is_playing = False
+    def _reset_playing_flag(self, source_id: str, voice: GuildVoice):
+         """Resets the guild's playing flag. Intended to be called from threadsafe context."""
+         log.info(f"Callback Helper for '{source_id}' (guild {voice.guild_id}): Resetting is_playing flag.")
+         voice.is_playing = False
          log.info(f"Callback Helper for '{source_id}': Keeping voice client connected (if still connected).")
 
     # --- TEST COMMAND (Keeps its temporary file deletion logic) ---
@@ -338,6 +486,7 @@ class TextToSpeechSchedulerCog(commands.Cog):
         Example: !testtts th สวัสดี
         """
         log_prefix = "TestTTS: "
+        triggered_at = time.perf_counter()
         if ctx.author.voice is None or ctx.author.voice.channel is None:
             await ctx.send("You need to be in a voice channel.")
             return
@@ -356,13 +505,14 @@ class TextToSpeechSchedulerCog(commands.Cog):
 
         voice_channel = ctx.author.voice.channel
         guild = ctx.guild
+        voice = self.voice.get(guild.id)
         actual_lang = actual_lang.lower() # Ensure consistency
         log.info(f"{log_prefix}Invoked by {ctx.author} in {voice_channel.name}. Lang='{actual_lang}', Text='{actual_text}'")
 
         # --- Acquire Lock ---
         try:
             async with asyncio.timeout(5):
-                 await self.job_lock.acquire()
+                 await voice.job_lock.acquire()
         except asyncio.TimeoutError:
             log.warning(f"{log_prefix}Could not acquire lock (TTS busy).")
             await ctx.send("The TTS system is currently busy. Please try again shortly.")
@@ -375,12 +525,12 @@ class TextToSpeechSchedulerCog(commands.Cog):
         log.debug(f"{log_prefix}Temporary audio file: {temp_filename}")
         # ---------------------------------
         try:
-            if self.is_playing:
+            if voice.is_playing:
                 log.warning(f"{log_prefix}Another TTS job/test started while waiting. Aborting.")
                 await ctx.send("The TTS system became busy while waiting. Please try again.")
                 return
 
-            self.is_playing = True
+            voice.is_playing = True
             log.info(f"{log_prefix}Acquired lock and set is_playing=True.")
 
             vc = guild.voice_client
@@ -391,7 +541,7 @@ class TextToSpeechSchedulerCog(commands.Cog):
                 if vc.channel.id != voice_channel.id:
                     log.info(f"{log_prefix}Moving voice client to {voice_channel.name}")
                     await vc.move_to(voice_channel)
-                    self.current_voice_client = vc
+                    voice.current_voice_client = vc
                 else:
                      log.info(f"{log_prefix}Already connected to {voice_channel.name}")
                 connected_or_moved = True
@@ -400,11 +550,11 @@ class TextToSpeechSchedulerCog(commands.Cog):
                 vc = await voice_channel.connect(timeout=15.0)
                 if vc:
                      connected_or_moved = True
-                     self.current_voice_client = vc
+                     voice.current_voice_client = vc
                 else:
                      log.error(f"{log_prefix}Connection attempt returned None.")
 
-            if not connected_or_moved or not self.current_voice_client:
+            if not connected_or_moved or not voice.current_voice_client:
                 log.error(f"{log_prefix}Failed to establish voice connection.")
                 await ctx.send("Failed to connect to your voice channel.")
                 return
@@ -412,10 +562,11 @@ class TextToSpeechSchedulerCog(commands.Cog):
             # --- Generate gTTS ---
             log.info(f"{log_prefix}Generating audio (Lang: {actual_lang}) for: '{actual_text}'")
             try:
+                gTTS = (await lazy_imports.load_async('gtts')).gTTS
                 tts = gTTS(text=actual_text, lang=actual_lang, slow=False)
                 # Ensure directory exists
                 os.makedirs(os.path.dirname(temp_filename), exist_ok=True)
-                await self.bot.loop.run_in_executor(None, tts.save, temp_filename)
+                await executors.run('tts', tts.save, temp_filename)
                 log.info(f"{log_prefix}Saved temporary audio file: {temp_filename}")
             except ValueError as e_lang:
                  log.warning(f"{log_prefix}Invalid language code '{actual_lang}': {e_lang}")
@@ -438,11 +589,11 @@ class TextToSpeechSchedulerCog(commands.Cog):
                          log.info(f"{cb_log_prefix}Deleted test file: {temp_filename}")
                 except Exception as e_clean: log.error(f"{cb_log_prefix}Error deleting test file {temp_filename}: {e_clean}")
                 # Reset flag ONLY
-                self.bot.loop.call_soon_threadsafe(self._reset_playing_flag, f"test_{ctx.message.id}")
+                self.bot.loop.call_soon_threadsafe(self._reset_playing_flag, f"test_{ctx.message.id}", voice)
 
             # --- Play Audio ---
             if os.path.exists(temp_filename):
-                 if not self.current_voice_client or not self.current_voice_client.is_connected():
+                 if not voice.current_voice_client or not voice.current_voice_client.is_connected():
                       log.error(f"{log_prefix}Voice client disconnected before playback could start.")
                       await ctx.send("Voice connection lost before playback.")
                       return
@@ -450,8 +601,9 @@ class TextToSpeechSchedulerCog(commands.Cog):
                  log.info(f"{log_prefix}Playing in {voice_channel.name}")
                  try:
                      source = discord.FFmpegPCMAudio(temp_filename, executable=self.ffmpeg_path)
-                     self.current_voice_client.play(source, after=after_test_cb)
+                     voice.current_voice_client.play(source, after=after_test_cb)
                      play_initiated = True
+                     metrics.observe(TTS_TRIGGER_TO_PLAY_METRIC, time.perf_counter() - triggered_at, source="test")
                      await ctx.message.add_reaction("🔊")
                  except Exception as e_play:
                      log.exception(f"{log_prefix}Error initiating playback with FFmpegPCMAudio for test file {temp_filename}.")
@@ -478,15 +630,15 @@ class TextToSpeechSchedulerCog(commands.Cog):
         finally:
             # Release Lock and Reset Flag if play didn't start
             if not play_initiated:
-                self.is_playing = False
+                voice.is_playing = False
                 log.debug(f"{log_prefix}Resetting is_playing flag in finally (play not initiated).")
                 # Clean up test file if it exists and play never started
                 try:
                     if os.path.exists(temp_filename): os.remove(temp_filename); log.info(f"{log_prefix}Cleaned up test file {temp_filename} as play failed.")
                 except Exception as e_final_clean: log.error(f"{log_prefix}Error during final cleanup of {temp_filename}: {e_final_clean}")
 
-            if self.job_lock.locked():
-                self.job_lock.release()
+            if voice.job_lock.locked():
+                voice.job_lock.release()
                 log.debug(f"{log_prefix}Released lock in finally block.")
 
 
@@ -0,0 +1,136 @@
+# voice_events.py
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, FrozenSet, Optional
+
+import discord
+
+import db_manager
+
+log = logging.getLogger(__name__)
+
+# --- รูปแบบของ voice event ---
+# dict ของ JSON type ล้วน (ส่งข้าม process ไปยัง voice_worker.py ได้) สร้างจาก make_event():
+#   guild_id, user_id, username, display_name, avatar_url, default_avatar_url, mention,
+#   action (None = ไม่เกี่ยวกับช่องที่ตรวจจับ: upsert ผู้ใช้อย่างเดียว), channel_id/channel_name (ช่องที่เกี่ยวข้อง),
+#   from_channel_id/from_channel_name (บันทึกลง DB), before_channel_name, after_channel_name, at (unix time)
+
+# action -> (title, footer, สี) ของ Embed แจ้งเตือน
+EMBED_STYLES = {
+    "JOIN": ("Member Joined Voice Channel", "Joined", discord.Color.green),
+    "MOVE_IN": ("Member Entered Monitored Channel", "Entered", discord.Color.blue),
+    "MOVE_INTERNAL": ("Member Moved Between Monitored Channels", "Moved (Internal)", discord.Color.purple),
+    "LEAVE": ("Member Left Voice Channel", "Left", discord.Color.red),
+    "MOVE_OUT": ("Member Left Monitored Channel", "Exited", discord.Color.orange),
+}
+
+
+def make_event(member: discord.Member, before: discord.VoiceState, after: discord.VoiceState,
+               monitored_channels: FrozenSet[int]) -> Dict[str, Any]:
+    """แปลง voice state update เป็น event (ตัดสินชนิดการเปลี่ยนแปลงเทียบกับช่องที่ตรวจจับ)"""
+    event = {
+        "guild_id": member.guild.id,
+        "user_id": member.id,
+        "username": member.name,
+        "display_name": member.display_name,
+        "avatar_url": str(member.display_avatar.url) if member.display_avatar else None,
+        "default_avatar_url": str(member.default_avatar.url),
+        "mention": member.mention,
+        "action": None,
+        "channel_id": None,
+        "channel_name": None,
+        "from_channel_id": None,
+        "from_channel_name": None,
+        "before_channel_name": before.channel.name if before.channel else None,
+        "after_channel_name": after.channel.name if after.channel else None,
+        "at": time.time(),
+    }
+
+    # --- ตรวจสอบการเปลี่ยนแปลง ---
+    if after.channel is not None and after.channel.id in monitored_channels:
+        event["channel_id"] = after.channel.id
+        event["channel_name"] = after.channel.name
+        if before.channel is None:
+            event["action"] = "JOIN"
+        else:
+            event["action"] = "MOVE_IN" if before.channel.id not in monitored_channels else "MOVE_INTERNAL"
+            event["from_channel_id"] = before.channel.id
+            event["from_channel_name"] = before.channel.name
+
+    elif before.channel is not None and before.channel.id in monitored_channels:
+        event["channel_id"] = before.channel.id
+        event["channel_name"] = before.channel.name
+        if after.channel is None:
+            event["action"] = "LEAVE"
+        elif after.channel.id not in monitored_channels:
+            event["action"] = "MOVE_OUT"
+
+    return event
+
+
+def describe(event: Dict[str, Any]) -> str:
+    """ข้อความสั้นๆ สำหรับ log"""
+    text = f"{event['action']}: User {event['display_name']} ({event['user_id']}) in channel '{event['channel_name']}' ({event['channel_id']})"
+    if event["from_channel_name"]:
+        text += f" from '{event['from_channel_name']}' ({event['from_channel_id']})"
+    return text
+
+
+async def write(event: Dict[str, Any]):
+    """ส่ง upsert ผู้ใช้ + voice log (ถ้ามี action) เข้า write-behind buffer ของ db_manager; error ถูก log ไม่ส่งต่อ"""
+    try:
+        await db_manager.enqueue_voice_event(
+            user_id=event["user_id"],
+            username=event["username"],
+            display_name=event["display_name"],
+            avatar_url=event["avatar_url"],
+            action=event["action"],
+            channel_id=event["channel_id"],
+            channel_name=event["channel_name"],
+            from_channel_id=event["from_channel_id"],
+            from_channel_name=event["from_channel_name"],
+            at=datetime.fromtimestamp(event["at"], tz=timezone.utc).replace(tzinfo=None), # เวลาที่เกิด event (UTC แบบเดียวกับ db_manager) ไม่ใช่เวลาที่ flush
+            guild_id=event["guild_id"], # โควตาแถวที่ค้างใน buffer ต่อ guild
+        )
+    except Exception as e:
+        log.exception(f"เกิดข้อผิดพลาดขณะบันทึก voice event ของ user ID {event['user_id']} ({event['display_name']})")
+
+
+def build_embed(event: Dict[str, Any]) -> discord.Embed:
+    """สร้าง Embed แจ้งเตือนของ event ที่มี action"""
+    action = event["action"]
+    title, footer_text, color = EMBED_STYLES[action]
+    mention, before_name, after_name = event["mention"], event["before_channel_name"], event["after_channel_name"]
+    if action == "JOIN":
+        description = f"👋 {mention} joined **{after_name}**"
+    elif action == "MOVE_IN":
+        description = f"➡️ {mention} entered **{after_name}** (from *{before_name}*)"
+    elif action == "MOVE_INTERNAL":
+        description = f"✈️ {mention} moved from **{before_name}** to **{after_name}**"
+    elif action == "LEAVE":
+        description = f"🚪 {mention} left **{before_name}**"
+    else:
+        description = f"⬅️ {mention} left **{before_name}** (to *{after_name}*)"
+
+    embed = discord.Embed(
+        title=title,
+        description=description,
+        color=color(),
+        timestamp=datetime.fromtimestamp(int(event["at"]), tz=timezone.utc)
+    )
+    embed.set_author(name=event["display_name"], icon_url=event["avatar_url"] or event["default_avatar_url"])
+    embed.set_footer(text=f"{footer_text} • User ID: {event['user_id']}")
+    embed.add_field(name="Channel", value=f"{event['channel_name']} (`{event['channel_id']}`)", inline=False)
+    return embed
+
+
+async def send_embed(channel: Optional[discord.abc.Messageable], channel_id: int, embed: discord.Embed):
+    """ส่ง Embed ไปยังช่องแจ้งเตือนหนึ่งช่อง (Forbidden/HTTP error ถูก log ไม่ส่งต่อ)"""
+    name = getattr(channel, "name", None) or channel_id
+    try:
+        await channel.send(embed=embed)
+    except discord.Forbidden:
+        log.warning(f"ไม่มีสิทธิ์ส่งข้อความในช่องแจ้งเตือน: {name} ({channel_id})")
+    except discord.HTTPException as e:
+        log.error(f"เกิดข้อผิดพลาด HTTP ขณะส่งการแจ้งเตือนไปยัง {name} ({channel_id}): {e}")
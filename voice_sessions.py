@@ -0,0 +1,157 @@
+# voice_sessions.py
+"""
+ช่วงเวลาที่ผู้ใช้อยู่ในช่องเสียงที่ตรวจจับ (ตาราง voice_sessions) สร้างจาก voice log แบบจุดเวลา
+
+  JOIN / MOVE_IN      เปิด session ของ (user, channel)
+  LEAVE / MOVE_OUT    ปิด session ที่เปิดอยู่ของ (user, channel) พร้อม duration
+  MOVE_INTERNAL       ปิด session ของช่องเดิม แล้วเปิดของช่องใหม่
+
+db_manager ใช้ SessionTracker กับ voice log ทุกชุดที่ flush (อัปเดตตารางใน statement เดียวกับ log)
+ส่วน backfill() สร้างตารางใหม่ทั้งหมดจาก voice_channel_logs ที่มีอยู่ในการอ่านรอบเดียวแบบ streaming
+
+รัน backfill:  python voice_sessions.py
+"""
+import logging
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+log = logging.getLogger(__name__)
+
+# --- ค่าคงที่ ---
+OPEN_ACTIONS = ("JOIN", "MOVE_IN")
+CLOSE_ACTIONS = ("LEAVE", "MOVE_OUT")
+# end_action ของ session ที่ไม่เห็นตอนออก (เช่นบอทออฟไลน์อยู่) แล้วผู้ใช้เข้าช่องเดิมอีกครั้ง: left_at/duration เป็น NULL
+UNKNOWN_END = "UNKNOWN"
+BACKFILL_FETCH_ROWS = 5000 # แถวที่ดึงจาก cursor ต่อรอบ
+BACKFILL_WRITE_ROWS = 5000 # session ที่เขียนต่อ statement
+
+# session ที่ได้: (user_id, channel_id, channel_name, joined_at, left_at, end_action) โดย end_action None = ยังอยู่ในช่อง
+Session = Tuple[int, int, str, datetime, Optional[datetime], Optional[str]]
+SESSION_FIELDS = ("user_id", "channel_id", "channel_name", "joined_at", "left_at", "end_action") # ลำดับเดียวกับ Session
+# การปิด session ที่เปิดไว้ก่อนชุดนี้ (อยู่ใน DB แล้ว): (user_id, channel_id, left_at, end_action)
+Close = Tuple[int, int, datetime, str]
+
+
+class SessionTracker:
+    """
+    จับคู่ voice log ตามลำดับเวลาเป็น session
+    event แรกของแต่ละ (user, channel) ที่ไม่มีคู่ในชุดนี้จะกลายเป็น closes (ปิด session ที่เปิดค้างใน DB)
+    """
+    def __init__(self):
+        self.sessions: List[Session] = []
+        self.closes: Dict[Tuple[int, int], Close] = {}
+        self._open: Dict[Tuple[int, int], Tuple[str, datetime]] = {}
+        self._touched = set()
+
+    def apply(self, user_id: int, action: str, channel_id: int, channel_name: str, from_channel_id: Optional[int], at: datetime):
+        if action in OPEN_ACTIONS:
+            self._start(user_id, channel_id, channel_name, at)
+        elif action in CLOSE_ACTIONS:
+            self._end(user_id, channel_id, at, action)
+        elif action == "MOVE_INTERNAL":
+            if from_channel_id is not None:
+                self._end(user_id, from_channel_id, at, action)
+            self._start(user_id, channel_id, channel_name, at)
+
+    def _start(self, user_id: int, channel_id: int, channel_name: str, at: datetime):
+        key = (user_id, channel_id)
+        if key in self._open:
+            # เปิดซ้ำโดยไม่เห็นตอนออก: ปิด session เดิมแบบไม่รู้เวลาออก
+            name, joined_at = self._open.pop(key)
+            self.sessions.append((user_id, channel_id, name, joined_at, None, UNKNOWN_END))
+        elif key not in self._touched:
+            self.closes[key] = (user_id, channel_id, at, UNKNOWN_END)
+        self._touched.add(key)
+        self._open[key] = (channel_name, at)
+
+    def _end(self, user_id: int, channel_id: int, at: datetime, action: str):
+        key = (user_id, channel_id)
+        if key in self._open:
+            name, joined_at = self._open.pop(key)
+            self.sessions.append((user_id, channel_id, name, joined_at, at, action))
+        elif key not in self._touched:
+            self.closes[key] = (user_id, channel_id, at, action)
+        # ออกโดยไม่มี session เปิดในชุดนี้และไม่ใช่ event แรกของ (user, channel): ข้าม
+        self._touched.add(key)
+
+    def take_sessions(self) -> List[Session]:
+        """session ที่ปิดแล้วตั้งแต่ครั้งก่อน (ล้างออกจาก tracker)"""
+        sessions, self.sessions = self.sessions, []
+        return sessions
+
+    def finish(self) -> List[Session]:
+        """session ที่ปิดแล้ว + session ที่ยังเปิดอยู่ (left_at/end_action เป็น None)"""
+        sessions = self.take_sessions()
+        sessions.extend((user_id, channel_id, name, joined_at, None, None)
+                        for (user_id, channel_id), (name, joined_at) in self._open.items())
+        self._open.clear()
+        return sessions
+
+
+INSERT_SESSIONS_SQL = f"""
+    INSERT INTO voice_sessions ({", ".join(SESSION_FIELDS)})
+    SELECT * FROM unnest($1::bigint[], $2::bigint[], $3::text[], $4::timestamptz[], $5::timestamptz[], $6::text[])
+"""
+
+
+async def backfill() -> int:
+    """
+    สร้าง voice_sessions ใหม่จาก voice_channel_logs ทั้งหมด: อ่านผ่าน server-side cursor เรียงตาม user แล้วเวลา
+    หน่วยความจำใช้เท่า session ที่เปิดค้างของ user ปัจจุบัน + หนึ่งชุดที่รอเขียน
+    ทั้งหมดอยู่ใน transaction เดียว (TRUNCATE lock voice_sessions ไว้) การเขียน voice log ของบอทจะรอจน backfill เสร็จ
+    คืนจำนวน session ที่สร้าง
+    """
+    import db_manager
+    await db_manager.flush_voice_events()
+    started = time.perf_counter()
+    written, rows_read = 0, 0
+    async with db_manager._acquire() as conn:
+        async with conn.transaction():
+            await conn.execute("TRUNCATE voice_sessions")
+            tracker, current_user = SessionTracker(), None
+            pending: List[Session] = []
+            cursor = conn.cursor("""
+                SELECT user_id, action, channel_id, channel_name, from_channel_id, "timestamp"
+                FROM voice_channel_logs
+                ORDER BY user_id, "timestamp", log_id
+            """, prefetch=BACKFILL_FETCH_ROWS)
+            async for record in cursor:
+                rows_read += 1
+                if record["user_id"] != current_user:
+                    # ขึ้น user ใหม่: session ของ user ก่อนหน้าครบแล้ว (ที่ยังเปิดอยู่ = ยังอยู่ในช่องตาม log ล่าสุด)
+                    pending.extend(tracker.finish())
+                    tracker, current_user = SessionTracker(), record["user_id"]
+                tracker.apply(record["user_id"], record["action"], record["channel_id"], record["channel_name"],
+                              record["from_channel_id"], record["timestamp"])
+                pending.extend(tracker.take_sessions())
+                if len(pending) >= BACKFILL_WRITE_ROWS:
+                    await conn.execute(INSERT_SESSIONS_SQL, *db_manager.columns(pending, len(SESSION_FIELDS)))
+                    written += len(pending)
+                    pending = []
+            pending.extend(tracker.finish())
+            if pending:
+                await conn.execute(INSERT_SESSIONS_SQL, *db_manager.columns(pending, len(SESSION_FIELDS)))
+                written += len(pending)
+    log.info(f"Backfill voice_sessions: อ่าน log {rows_read} แถว สร้าง {written} session "
+             f"ใน {time.perf_counter() - started:.1f}s")
+    return written
+
+
+async def _main():
+    import db_manager
+    import log_setup
+    log_setup.configure()
+    try:
+        await db_manager.initialize_database()
+        await backfill()
+    finally:
+        await db_manager.close_pool()
+        log_setup.shutdown()
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    load_dotenv()
+    import loop_runtime
+    loop_runtime.run(_main())
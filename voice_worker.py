@@ -0,0 +1,322 @@
+# voice_worker.py
+"""
+Process แยกสำหรับบันทึก voice log (ใช้คู่กับ VOICE_LOG_MODE=worker ของบอท)
+
+บอทส่ง voice event (dict จาก voice_events.make_event) เป็น JSON บรรทัดละ event ผ่าน local socket (VOICE_WORKER_ADDRESS)
+worker ถือ PostgreSQL pool เอง และส่ง Embed แจ้งเตือนผ่าน Discord REST API (login ด้วย token เดียวกัน แต่ไม่ต่อ gateway)
+งาน DB/จัดรูปแบบแจ้งเตือนจึงไม่แย่ง CPU กับ gateway, รูปภาพ และ gTTS ของบอท
+
+รัน:  python voice_worker.py
+เริ่มก่อนหรือหลังบอทก็ได้: ระหว่างที่ต่อ worker ไม่ได้หรือคิวเต็ม บอทจะบันทึกเองแบบ inline และต่อใหม่อัตโนมัติ
+
+ทุก event มี seq และ worker ตอบ {"ack": seq} กลับทาง socket เดิมเมื่อ event เข้า write-behind buffer ของ worker แล้ว
+event ที่ยังไม่ได้ ack ตอนการเชื่อมต่อหลุด (ค้างใน socket หรือ worker ยังประมวลผลไม่เสร็จ) บอทจะบันทึกเองแทน
+ข้อจำกัด:
+  - event ที่ ack แล้วแต่ยังค้างใน buffer ของ worker (ไม่เกิน VOICE_LOG_FLUSH_MS) หายถ้า worker ถูก kill แบบไม่ทัน drain
+  - ถ้าการเชื่อมต่อหลุดหลัง worker รับ event ไปแล้วแต่ ack ยังมาไม่ถึง event นั้นอาจถูกบันทึกซ้ำ (at-least-once)
+"""
+import asyncio
+import itertools
+import json
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, Tuple
+from dotenv import load_dotenv
+
+load_dotenv() # ต้องโหลดก่อน import โมดูลภายใน (อ่าน env ตอน import)
+
+import discord
+
+import bot_config
+import db_manager
+import metrics
+import shutdown
+import supervisor
+import voice_events
+
+log = logging.getLogger(__name__)
+
+# --- ค่าคงที่ ---
+# unix:<path> (Linux/macOS) หรือ tcp:<host>:<port> (Windows ไม่มี unix socket) ควรเป็นที่อยู่ภายในเครื่องเท่านั้น
+VOICE_WORKER_ADDRESS = os.getenv("VOICE_WORKER_ADDRESS", "tcp:127.0.0.1:9110" if os.name == "nt" else "unix:voice_worker.sock")
+# ฝั่งบอท: event ที่รอส่งให้ worker ได้สูงสุด (worker ช้าจน socket เต็ม -> คิวเต็ม -> บอทบันทึกเอง)
+VOICE_WORKER_QUEUE = int(os.getenv("VOICE_WORKER_QUEUE", "2000"))
+# ฝั่ง worker: event ที่ประมวลผลพร้อมกันได้ (เกินนี้หยุดอ่าน socket ให้บอทเห็น backpressure)
+VOICE_WORKER_CONCURRENCY = int(os.getenv("VOICE_WORKER_CONCURRENCY", "32"))
+VOICE_WORKER_METRICS_PORT = int(os.getenv("VOICE_WORKER_METRICS_PORT", "9111"))
+RECONNECT_MAX_DELAY = 30.0
+
+PUBLISH_METRIC = "voice_worker_publish_total"
+WORKER_HANDLE_METRIC = "voice_worker_handle_seconds"
+metrics.describe(PUBLISH_METRIC, "counter", "Voice events offered to the worker process by the bot, by outcome (sent, fallback).")
+metrics.describe("voice_worker_queue", "gauge", "Voice events queued in the bot for the worker socket.")
+metrics.describe("voice_worker_unacked", "gauge", "Voice events sent to the worker that it has not acknowledged yet.")
+metrics.describe(WORKER_HANDLE_METRIC, "histogram", "Worker time from receiving a voice event until the event is queued in its voice log write-behind buffer and the notification is sent, by action (the DB flush is measured by voice_log_flush_seconds).")
+
+
+# --- local socket ---
+def _parse_address(address: str) -> Tuple[str, Any]:
+    kind, _, rest = address.partition(":")
+    if kind == "unix" and rest:
+        return kind, rest
+    if kind == "tcp":
+        host, _, port = rest.rpartition(":")
+        return kind, (host or "127.0.0.1", int(port))
+    raise ValueError(f"VOICE_WORKER_ADDRESS ต้องเป็น unix:<path> หรือ tcp:<host>:<port> (ได้ '{address}')")
+
+
+async def _open_connection(address: str):
+    kind, target = _parse_address(address)
+    if kind == "unix":
+        return await asyncio.open_unix_connection(target)
+    return await asyncio.open_connection(*target)
+
+
+async def _start_server(handler, address: str):
+    kind, target = _parse_address(address)
+    if kind == "unix":
+        if os.path.exists(target):
+            os.unlink(target) # socket ค้างจาก worker ตัวก่อนที่ไม่ได้ปิดตามปกติ
+        return await asyncio.start_unix_server(handler, target)
+    return await asyncio.start_server(handler, *target)
+
+
+# --- ฝั่งบอท ---
+class Publisher:
+    """
+    ส่ง voice event ให้ worker ผ่านคิวในหน่วยความจำ + task เขียน socket (supervisor, restart='always')
+    publish() คืน False เมื่อยังต่อ worker ไม่ได้หรือคิวเต็ม ให้ Cog บันทึกเอง
+    event ที่ส่งแล้วแต่ worker ยังไม่ ack และที่ค้างในคิว ตอนการเชื่อมต่อหลุดหรือตอนปิดบอท
+    จะส่งให้ fallback (ตั้งโดย VoiceLoggingCog) แทน
+    """
+    def __init__(self, address: str = VOICE_WORKER_ADDRESS):
+        self.address = address
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=VOICE_WORKER_QUEUE)
+        self.unacked: Dict[int, Dict[str, Any]] = {} # seq -> event ที่เขียนลง socket แล้วแต่ยังไม่ได้ ack (เรียงตาม seq)
+        self.connected = False
+        self.fallback: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None
+        self._started = False
+        self._seq = itertools.count(1)
+
+    def start(self):
+        if self._started:
+            return
+        self._started = True
+        supervisor.spawn("voice_worker.publisher", self._run, restart="always", backoff=1.0)
+        shutdown.register("voice_worker_publisher", self._drain, deadline=5.0)
+        metrics.register_gauge_callback("voice_worker_queue", lambda: [({}, self.queue.qsize())])
+        metrics.register_gauge_callback("voice_worker_unacked", lambda: [({}, len(self.unacked))])
+
+    def publish(self, event: Dict[str, Any]) -> bool:
+        if self.connected:
+            try:
+                self.queue.put_nowait(event)
+                metrics.inc(PUBLISH_METRIC, outcome="sent")
+                return True
+            except asyncio.QueueFull:
+                pass
+        metrics.inc(PUBLISH_METRIC, outcome="fallback")
+        return False
+
+    async def _run(self):
+        delay = 1.0
+        while True:
+            try:
+                reader, writer = await _open_connection(self.address)
+            except OSError as e:
+                # worker ยังไม่ได้รันหรือกำลัง restart: บอทบันทึกเองไปก่อน แล้วลองต่อใหม่ (ถอยเวลาถึง 30s)
+                log.debug(f"ยังต่อ voice worker ที่ {self.address} ไม่ได้: {e} ลองใหม่ใน {delay:.0f}s")
+                await asyncio.sleep(delay)
+                delay = min(RECONNECT_MAX_DELAY, delay * 2)
+                continue
+            delay = 1.0
+            await self._pump(reader, writer)
+
+    async def _pump(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connected = True
+        log.info(f"เชื่อมต่อ voice worker ที่ {self.address} แล้ว")
+        acks = asyncio.ensure_future(self._read_acks(reader)) # จบเมื่อ worker ปิด socket
+        try:
+            while True:
+                get = asyncio.ensure_future(self.queue.get())
+                await asyncio.wait((get, acks), return_when=asyncio.FIRST_COMPLETED)
+                if acks.done():
+                    # worker ปิด socket ไปแล้ว (เช่นกำลัง restart): event ที่ยังไม่ ack และที่เหลือในคิวบันทึกเอง
+                    if get.done():
+                        self.queue.put_nowait(get.result()) # คิวเพิ่งมีที่ว่างจาก get จึงใส่คืนได้เสมอ
+                        self.queue.task_done()
+                    else:
+                        get.cancel()
+                    log.warning("voice worker ปิดการเชื่อมต่อ บันทึก voice log ใน process นี้จนกว่าจะต่อใหม่ได้")
+                    return
+                event = get.result()
+                seq = next(self._seq)
+                self.unacked[seq] = event
+                writer.write(json.dumps(dict(event, seq=seq), ensure_ascii=False).encode("utf-8") + b"\n")
+                self.queue.task_done()
+                await writer.drain() # socket เต็ม = worker ช้า: รอตรงนี้จนคิวเต็ม แล้ว publish() จะคืน False
+        except (ConnectionError, OSError) as e:
+            log.warning(f"การเชื่อมต่อ voice worker หลุด: {e} (event ที่ค้างในคิวจะบันทึกใน process นี้แทน)")
+        finally:
+            self.connected = False
+            acks.cancel()
+            writer.close()
+            await self._flush_to_fallback()
+
+    async def _read_acks(self, reader: asyncio.StreamReader):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    return
+                try:
+                    seq = json.loads(line)["ack"]
+                except (ValueError, KeyError, TypeError):
+                    log.error(f"ได้รับ ack ที่อ่านไม่ได้จาก voice worker ({len(line)} bytes) ข้าม")
+                    continue
+                self.unacked.pop(seq, None)
+        except (ConnectionError, OSError):
+            return
+
+    async def _flush_to_fallback(self):
+        if self.fallback is None:
+            return
+        if self.unacked:
+            log.warning(f"voice worker ยังไม่ ack {len(self.unacked)} event บันทึกใน process นี้แทน")
+        while self.unacked:
+            seq = next(iter(self.unacked))
+            await self.fallback(self.unacked.pop(seq))
+        while not self.queue.empty():
+            event = self.queue.get_nowait()
+            self.queue.task_done()
+            await self.fallback(event)
+
+    async def _drain(self):
+        """ตอนปิดบอท: รอให้ event ที่ค้างในคิวถูกส่งและ ack โดย worker (หรือบันทึกเองถ้าไม่ได้ต่อ worker อยู่/หลุดระหว่างรอ)"""
+        if self.connected:
+            await self.queue.join()
+            while self.unacked and self.connected:
+                await asyncio.sleep(0.05)
+        await self._flush_to_fallback()
+
+
+_publisher: Optional[Publisher] = None
+
+
+def get_publisher() -> Publisher:
+    """Publisher ตัวเดียวของ process (การเชื่อมต่อคงอยู่ข้าม !reload ของ VoiceLoggingCog)"""
+    global _publisher
+    if _publisher is None:
+        _publisher = Publisher()
+    _publisher.start()
+    return _publisher
+
+
+# --- ฝั่ง worker ---
+class VoiceWorker:
+    def __init__(self, client: discord.Client):
+        self.client = client
+        self.slots = asyncio.Semaphore(VOICE_WORKER_CONCURRENCY)
+        self.closed = asyncio.Event()
+        self.draining = False
+        self.server = None
+        self._tasks: Set[asyncio.Task] = set()
+        self._connections: Set[asyncio.StreamWriter] = set()
+
+    async def start(self, address: str = VOICE_WORKER_ADDRESS):
+        self.server = await _start_server(self._handle_connection, address)
+        log.info(f"Voice worker รอ event จากบอทที่ {address}")
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        log.info("บอทเชื่อมต่อเข้ามาแล้ว")
+        self._connections.add(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line or self.draining:
+                    break # กำลังปิด: event นี้ไม่ได้ ack บอทจึงบันทึกเอง
+                try:
+                    event = json.loads(line)
+                except json.JSONDecodeError:
+                    log.error(f"ได้รับข้อมูลที่ไม่ใช่ JSON จากบอท ({len(line)} bytes) ข้าม")
+                    continue
+                await self.slots.acquire() # ครบ VOICE_WORKER_CONCURRENCY แล้วหยุดอ่าน socket (backpressure)
+                task = asyncio.create_task(self._handle(event, writer))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+        except ConnectionError:
+            pass
+        finally:
+            self._connections.discard(writer)
+            writer.close()
+            log.info("บอทตัดการเชื่อมต่อ")
+
+    async def _handle(self, event: Dict[str, Any], writer: asyncio.StreamWriter):
+        started = time.perf_counter()
+        try:
+            await voice_events.write(event) # guild ที่ครบโควตาใน buffer รอตรงนี้ (VOICE_LOG_GUILD_BUFFER_MAX)
+            if event["action"]:
+                supervisor.spawn("voice_worker.notify", lambda: self._notify(event, started), group="notify")
+        except Exception:
+            log.exception(f"เกิดข้อผิดพลาดขณะประมวลผล voice event ของ user {event.get('user_id')}")
+        finally:
+            self.slots.release()
+            # ack แม้ error (log ไว้แล้ว) ไม่งั้นบอทจะบันทึกซ้ำเมื่อการเชื่อมต่อหลุด
+            if event.get("seq") is not None and not writer.is_closing():
+                writer.write(json.dumps({"ack": event["seq"]}).encode("utf-8") + b"\n")
+
+    async def _notify(self, event: Dict[str, Any], started: float):
+        embed = voice_events.build_embed(event)
+        for channel_id in bot_config.get().notification_channels(event["guild_id"]):
+            # ไม่มี cache ของ gateway: ส่งตรงด้วย channel id
+            await voice_events.send_embed(self.client.get_partial_messageable(channel_id), channel_id, embed)
+        metrics.observe(WORKER_HANDLE_METRIC, time.perf_counter() - started, action=event["action"])
+
+    async def drain(self):
+        """
+        หยุดรับการเชื่อมต่อและ event ใหม่ รอ event ที่รับมาแล้วเข้า buffer และ ack ให้บอท แล้วปิด socket
+        (บอทเห็น EOF แล้วบันทึก event ที่ยังไม่ได้ ack และ event ถัดไปเอง; แจ้งเตือนรอใน hook ของ supervisor)
+        """
+        self.draining = True
+        if self.server is not None:
+            self.server.close()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        for writer in list(self._connections):
+            writer.close()
+
+    async def close(self):
+        # shutdown.request() เรียกหลัง drain เสร็จ
+        self.closed.set()
+
+
+async def serve():
+    import log_setup
+    log_setup.configure()
+    token = os.getenv("DISCORD_BOT_TOKEN")
+    if not token:
+        log.critical("!!! ข้อผิดพลาด: ไม่พบ DISCORD_BOT_TOKEN ใน .env ไฟล์ (worker ใช้ส่งแจ้งเตือนผ่าน REST API)")
+        return
+    bot_config.load()
+
+    client = discord.Client(intents=discord.Intents.none())
+    worker = VoiceWorker(client)
+    try:
+        async with client:
+            await client.login(token) # HTTP เท่านั้น ไม่เปิด gateway connection
+            await db_manager.get_pool()
+            await metrics.start_server(port=VOICE_WORKER_METRICS_PORT)
+            await worker.start()
+            shutdown.register("voice_worker", worker.drain, deadline=8.0)
+            shutdown.install(worker) # SIGTERM/SIGINT: drain แล้ว worker.close()
+            await worker.closed.wait()
+    finally:
+        await db_manager.close_pool()
+        await metrics.stop_server()
+        log_setup.shutdown()
+
+
+if __name__ == "__main__":
+    import loop_runtime
+    loop_runtime.run(serve())